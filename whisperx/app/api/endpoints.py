@@ -1,194 +1,340 @@
-import os
+import json
 import time
+import hashlib
 import uuid
-import uuid
-import torch
 import asyncio
-import whisperx
+from contextlib import nullcontext
 from typing import Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 
 from app.core.config import (
-    DEVICE, COMPUTE_TYPE, BATCH_SIZE, MAX_CONCURRENT,
-    DEFAULT_QUALITY, ALLOW_DIARIZATION, ALIGN_CACHE_MAX, HF_TOKEN,
-    API_KEY, TIMEOUT_SECONDS, MAX_AUDIO_DURATION
+    DEVICE, MAX_CONCURRENT, DEFAULT_QUALITY, ALLOW_DIARIZATION, HF_TOKEN,
+    API_KEY, TIMEOUT_SECONDS, SERVER_TIMING,
 )
+from app.core.boot import cuda_available, oom_errors
 from app.core.logging import get_logger
-from app.core.security import validate_api_key
-from app.schemas import TranscriptionResponse, SegmentResponse
-from app.services.model_manager import get_model, get_align, _cuda_cleanup
-from app.services.audio import save_upload_to_tempfile, get_audio_duration
-from app.services.diarization import get_diarization_pipeline
+from app.core.metrics import RequestMetrics, render as render_metrics
+from app.core.security import validate_api_key, check_admin_key
+from app.core.tracing import profiling
+from app.schemas import TranscriptionResponse
+from app.services.model_manager import registry, _cuda_cleanup
+from app.services.audio import ingest_upload, IngestedAudio
+from app.services.transcription import stream_pipeline
+from app.services.result_cache import result_cache
+from app.services.responses import to_segment, transcribe_cached, realign_stored
+from app.services.serialization import LAYOUTS, dumps_json, encode, negotiate, shape
+from app.services.executor import load_snapshot
+from app.services.process_pool import cpu_pool
+from app.services.align_prefetch import prefetch_stats
+from app.services.batch_size import batch_size_snapshot
+from app.services.admission import admission
+from app.services.jobs import job_store
+from app.services.warmup import warmup
 
 router = APIRouter()
 logger = get_logger("whisperx-endpoints")
 
-# GPU safety: limit concurrent requests doing GPU work (usually 1 per GPU)
-_gpu_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-
-def _build_response(aligned: dict, enable_diarization: bool) -> TranscriptionResponse:
-    segments = []
-    full_parts = []
-
-    for seg in aligned.get("segments", []):
-        text = (seg.get("text") or "").strip()
-        if text:
-            full_parts.append(text)
-
-        segments.append(
-            SegmentResponse(
-                text=text,
-                startSeconds=float(seg.get("start") or 0.0),
-                endSeconds=float(seg.get("end") or 0.0),
-                speaker=seg.get("speaker") if enable_diarization else None,
-            )
-        )
-
-    return TranscriptionResponse(
-        fullTranscript=" ".join(full_parts),
-        detectedLanguage=aligned.get("language"),
-        segments=segments,
-        chapters=[],
-    )
-
 @router.get("/health")
 def health():
     return {
         "status": "ok",
         "device": DEVICE,
-        "cuda": torch.cuda.is_available(),
+        "cuda": cuda_available(),  # null until the first model load imports torch
         "max_concurrent": MAX_CONCURRENT,
+        "devices": load_snapshot(),
+        "cpu_pool": cpu_pool.stats(),
         "diarization_enabled": ALLOW_DIARIZATION and bool(HF_TOKEN),
         "auth_enabled": bool(API_KEY),
+        "result_cache": result_cache.stats(),
+        "align_prefetch": prefetch_stats(),
+        "batch_size": batch_size_snapshot(),
+        "admission": admission.stats(),
+        "jobs": job_store.counts(),
     }
 
+@router.get("/livez")
+def livez():
+    """Liveness: the process is up and serving; never waits on models."""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readyz():
+    """Readiness: 200 once the startup warm-up has loaded the Whisper models, else 503."""
+    body = {"status": "ready" if warmup.ready else "not ready", **warmup.snapshot()}
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=body)
+
+@router.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@router.get("/admin/models", dependencies=[Depends(validate_api_key)])
+def admin_models():
+    """Resident models with measured footprint, pins and the per-device budget."""
+    return registry.snapshot()
+
 @router.post("/transcribe", response_model=TranscriptionResponse, dependencies=[Depends(validate_api_key)])
 async def transcribe_endpoint(
     file: UploadFile = File(...),
     language: Optional[str] = Form(None),              # None = auto-detect
     quality: str = Form(DEFAULT_QUALITY),              # fast, balanced, accurate
     enable_diarization: bool = Form(False),
+    words: bool = Form(False),                         # per-word timestamps in each segment
+    response_format: str = Form("segments"),           # segments, columnar (parallel arrays)
+    accept: Optional[str] = Header(None),              # application/msgpack for MessagePack
+    debug: bool = Form(False),                         # per-stage timings in a "debug" field
+    profile: Optional[str] = Form(None),               # torch, cprofile (needs X-Admin-Key)
+    x_admin_key: Optional[str] = Header(None),
 ):
+    """
+    Transcript as JSON (or MessagePack via Accept). response_format=columnar returns
+    segments as parallel arrays with text offsets into fullTranscript instead of objects.
+    Per-stage wall times are sent in a Server-Timing header; debug=true adds the full
+    span list (wall, CPU, memory deltas). profile=torch|cprofile captures a profile of
+    this request to PROFILE_DIR and returns its path in debug.profile.
+    """
     req_id = str(uuid.uuid4())[:8]
     t0 = time.time()
-    tmp_path: Optional[str] = None
+    ingested: Optional[IngestedAudio] = None
+    metrics = RequestMetrics(quality)
+    status = "error"
 
     logger.info("[%s] === REQUEST RECEIVED === filename=%s language=%s quality=%s diarize=%s", 
                 req_id, file.filename, language, quality, enable_diarization)
 
-    # Limit GPU concurrency (prevents OOM / thrash)
-    async with _gpu_semaphore:
-        try:
-            logger.info("[%s] Saving upload to tempfile...", req_id)
-            tmp_path = await save_upload_to_tempfile(file)
-            logger.info("[%s] File saved to: %s", req_id, tmp_path)
-
-            # Check duration - fail fast (but after upload, alas)
-            logger.info("[%s] Getting audio duration...", req_id)
-            duration = await get_audio_duration(tmp_path)
-            logger.info("[%s] Audio duration: %.1fs", req_id, duration)
-            
-            if duration > MAX_AUDIO_DURATION:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Audio duration {duration:.1f}s exceeds limit of {MAX_AUDIO_DURATION}s"
-                )
-
-            # Define the heavy lifting as a coro
-            async def _process():
-                # Load audio (CPU)
-                logger.info("[%s] Loading audio with whisperx...", req_id)
-                audio = whisperx.load_audio(tmp_path)
-                logger.info("[%s] Audio loaded, shape=%s", req_id, audio.shape if hasattr(audio, 'shape') else 'unknown')
-
-                # Inference mode reduces overhead + helps memory
-                # Note: We can't strictly async/await inside torch.inference_mode context 
-                # unless we are careful. But load_model etc are blocking anyway.
-                # Ideally run_in_executor if we want true async, but GPU ops block CUDA stream anyway.
-                # For simplicity in this stack, we stick to sync calls inside this block.
-                
-                with torch.inference_mode():
-                    model = get_model(quality)
-
-                    # STEP 1: Transcribe
-                    if torch.cuda.is_available():
-                         mem = torch.cuda.memory_allocated() / 1024**2
-                         logger.info("[%s] GPU Mem before transcribe: %.2f MB", req_id, mem)
-
-                    logger.info("[%s] Transcribing quality=%s language=%s duration=%.1fs", req_id, quality, language or "auto", duration)
-                    transcribe_options = {"batch_size": BATCH_SIZE}
-                    if language:
-                        transcribe_options["language"] = language
-
-                    result = model.transcribe(audio, **transcribe_options)
-                    detected_language = result.get("language")
-                    logger.info("[%s] Transcription complete. Language detected: %s", req_id, detected_language)
-
-                    # STEP 2: Align
-                    if torch.cuda.is_available():
-                         mem = torch.cuda.memory_allocated() / 1024**2
-                         logger.info("[%s] GPU Mem before align: %.2f MB", req_id, mem)
-
-                    logger.info("[%s] Aligning detected_language=%s", req_id, detected_language)
-                    model_a, metadata = get_align(detected_language)
-
-                    aligned = whisperx.align(
-                        result["segments"],
-                        model_a,
-                        metadata,
-                        audio,
-                        DEVICE,
-                        return_char_alignments=False,
-                    )
-                    aligned["language"] = detected_language
-                    logger.info("[%s] Alignment complete", req_id)
+    if enable_diarization and not ALLOW_DIARIZATION:
+        raise HTTPException(status_code=400, detail="Diarization disabled on server.")
+    if response_format not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"response_format must be one of {', '.join(LAYOUTS)}")
+    media_type = negotiate(accept)
+    if profile is not None:
+        check_admin_key(x_admin_key)
+        debug = True
+
+    try:
+        # Upload + decode/probe don't touch the GPU; GPU slots are taken per stage in run_pipeline
+        logger.info("[%s] Ingesting upload...", req_id)
+        hasher = hashlib.sha256()
+        ingested = await ingest_upload(file, hasher=hasher, metrics=metrics)
+        logger.info("[%s] Audio duration: %.1fs", req_id, ingested.duration)
+
+        async with profiling(profile, metrics.trace, req_id) if profile is not None else nullcontext():
+            result = await transcribe_cached(
+                req_id, ingested.source, ingested.duration, hasher.hexdigest(),
+                quality, language, enable_diarization, metrics,
+            )
+        with metrics.stage("serialize"):
+            payload = shape(result, words=words, layout=response_format)
+            if debug:  # shape() may hand back the cached result itself
+                payload = {**payload, "debug": {"reqId": req_id, **metrics.trace.to_dict()}}
+            resp = encode(payload, media_type)
+        if SERVER_TIMING:
+            resp.headers["Server-Timing"] = metrics.trace.server_timing()
+        logger.info("[%s] Done in %.2fs (segments=%d, %d bytes %s)", req_id, time.time() - t0,
+                    len(result["segments"]), len(resp.body), media_type)
+        status = "ok"
+        return resp
+
+    except asyncio.TimeoutError:
+        status = "timeout"
+        logger.error("[%s] Request timed out after %.1fs", req_id, TIMEOUT_SECONDS)
+        raise HTTPException(status_code=504, detail="Processing timed out")
+
+    except HTTPException:
+        status = "rejected"
+        raise
+    except oom_errors():
+        status = "oom"
+        logger.exception("[%s] CUDA OOM during transcription", req_id)
+        _cuda_cleanup()
+        raise HTTPException(status_code=503, detail="GPU out of memory. Try again later.")
+    except Exception as e:
+        logger.exception("[%s] Transcription failed: %s", req_id, e)
+        raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+    finally:
+        # Cleanup temp file
+        if ingested is not None:
+            ingested.cleanup()
+        metrics.observe(status, ingested.duration if ingested is not None else 0.0)
+
+async def _rerun_stored(
+    kind: str,
+    file: UploadFile,
+    language: Optional[str],
+    quality: Optional[str],
+    enable_diarization: bool,
+    words: bool,
+    response_format: str,
+    accept: Optional[str],
+) -> Response:
+    """/realign and /rediarize: later stages on the stored segments of the same upload."""
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.time()
+    ingested: Optional[IngestedAudio] = None
+    metrics = RequestMetrics(quality)
+    status = "error"
 
-                    # STEP 3: Diarize (optional)
-                    if enable_diarization:
-                        if torch.cuda.is_available():
-                             mem = torch.cuda.memory_allocated() / 1024**2
-                             logger.info("[%s] GPU Mem before diarize: %.2f MB", req_id, mem)
+    logger.info("[%s] === %s REQUEST RECEIVED === filename=%s language=%s quality=%s diarize=%s",
+                req_id, kind.upper(), file.filename, language, quality or "latest", enable_diarization)
 
-                        if not ALLOW_DIARIZATION:
-                            raise HTTPException(status_code=400, detail="Diarization disabled on server.")
-                        logger.info("[%s] Diarizing", req_id)
-                        diarize_model = get_diarization_pipeline()
-                        diarize_segments = diarize_model(audio)
-                        aligned = whisperx.assign_word_speakers(diarize_segments, aligned)
-                        # Re-attach language if lost
-                        aligned["language"] = detected_language
-                        logger.info("[%s] Diarization complete", req_id)
+    if enable_diarization and not ALLOW_DIARIZATION:
+        raise HTTPException(status_code=400, detail="Diarization disabled on server.")
+    if response_format not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"response_format must be one of {', '.join(LAYOUTS)}")
+    media_type = negotiate(accept)
 
-                return _build_response(aligned, enable_diarization)
+    try:
+        hasher = hashlib.sha256()
+        ingested = await ingest_upload(file, hasher=hasher, metrics=metrics)
+        result = await realign_stored(
+            req_id, ingested.source, ingested.duration, hasher.hexdigest(),
+            quality, language, enable_diarization, metrics,
+        )
+        with metrics.stage("serialize"):
+            resp = encode(shape(result, words=words, layout=response_format), media_type)
+        if SERVER_TIMING:
+            resp.headers["Server-Timing"] = metrics.trace.server_timing()
+        logger.info("[%s] %s done in %.2fs (segments=%d)", req_id, kind, time.time() - t0, len(result["segments"]))
+        status = "ok"
+        return resp
+
+    except asyncio.TimeoutError:
+        status = "timeout"
+        logger.error("[%s] Request timed out after %.1fs", req_id, TIMEOUT_SECONDS)
+        raise HTTPException(status_code=504, detail="Processing timed out")
+    except HTTPException:
+        status = "rejected"
+        raise
+    except oom_errors():
+        status = "oom"
+        logger.exception("[%s] CUDA OOM during %s", req_id, kind)
+        _cuda_cleanup()
+        raise HTTPException(status_code=503, detail="GPU out of memory. Try again later.")
+    except Exception as e:
+        logger.exception("[%s] %s failed: %s", req_id, kind, e)
+        raise HTTPException(status_code=500, detail=f"{kind.capitalize()} failed: {str(e)}")
+    finally:
+        if ingested is not None:
+            ingested.cleanup()
+        metrics.observe(status, ingested.duration if ingested is not None else 0.0)
+
+@router.post("/realign", response_model=TranscriptionResponse, dependencies=[Depends(validate_api_key)])
+async def realign_endpoint(
+    file: UploadFile = File(...),
+    language: Optional[str] = Form(None),              # None = the language stored with the segments
+    quality: Optional[str] = Form(None),               # whose segments to use; None = the last run
+    enable_diarization: bool = Form(False),
+    words: bool = Form(False),
+    response_format: str = Form("segments"),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Re-align an earlier transcript of the same file (POST the same bytes again), e.g. in
+    another language, with no transcribe pass. Uses the raw Whisper segments kept from
+    /transcribe or a job for SEGMENT_STORE_TTL_SECONDS; 404 if there are none.
+    """
+    return await _rerun_stored("realign", file, language, quality, enable_diarization, words, response_format, accept)
+
+@router.post("/rediarize", response_model=TranscriptionResponse, dependencies=[Depends(validate_api_key)])
+async def rediarize_endpoint(
+    file: UploadFile = File(...),
+    quality: Optional[str] = Form(None),               # whose segments to use; None = the last run
+    words: bool = Form(False),
+    response_format: str = Form("segments"),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Add speakers to an earlier transcript of the same file: one diarization pass, with the
+    stored segments re-aligned alongside it, instead of the whole pipeline. 404 if no
+    segments are stored for the file.
+    """
+    return await _rerun_stored("rediarize", file, None, quality, True, words, response_format, accept)
+
+@router.post("/transcribe/stream", dependencies=[Depends(validate_api_key)])
+async def transcribe_stream_endpoint(
+    file: UploadFile = File(...),
+    language: Optional[str] = Form(None),              # None = auto-detect
+    quality: str = Form(DEFAULT_QUALITY),              # fast, balanced, accurate
+    words: bool = Form(False),                         # per-word timestamps in each segment
+    debug: bool = Form(False),                         # per-stage timings in the summary line
+):
+    """
+    NDJSON stream: one {"type": "segment", ...SegmentResponse} line per aligned segment
+    as each window finishes, then {"type": "summary", fullTranscript, detectedLanguage}.
+    Failures after the stream has started are reported as a final {"type": "error"} line.
+    Diarization needs the whole file, so it is only available on /transcribe.
+    Headers are sent before any work is done, so timings only come as summary.debug.
+    """
+    req_id = str(uuid.uuid4())[:8]
+    t0 = time.time()
 
-            # Run with timeout
-            resp = await asyncio.wait_for(_process(), timeout=TIMEOUT_SECONDS)
+    logger.info("[%s] === STREAM REQUEST RECEIVED === filename=%s language=%s quality=%s",
+                req_id, file.filename, language, quality)
 
-            logger.info("[%s] Done in %.2fs (segments=%d)", req_id, time.time() - t0, len(resp.segments))
-            return resp
+    metrics = RequestMetrics(quality)
+    ingested: Optional[IngestedAudio] = None
+    try:
+        ingested = await ingest_upload(file, metrics=metrics)
+        # Reject before the response starts; the wait for a turn happens inside the stream
+        ticket = admission.reserve(ingested.duration, quality)
+    except HTTPException:
+        if ingested is not None:
+            ingested.cleanup()
+        metrics.observe("rejected")
+        raise
+    logger.info("[%s] Audio duration: %.1fs", req_id, ingested.duration)
+
+    async def _events():
+        full_parts = []
+        detected_language = language
+        count = 0
+        status = "error"
+        windows = stream_pipeline(req_id, ingested.source, quality, language, ingested.duration, metrics)
+        deadline = t0 + TIMEOUT_SECONDS
+        try:
+            await asyncio.wait_for(ticket.acquire(), timeout=max(0.0, deadline - time.time()))
+            while True:
+                try:
+                    segments, detected_language = await asyncio.wait_for(
+                        windows.__anext__(), timeout=max(0.0, deadline - time.time())
+                    )
+                except StopAsyncIteration:
+                    break
+                for seg in segments:
+                    segment = to_segment(seg, enable_diarization=False, words=words)
+                    if segment["text"]:
+                        full_parts.append(segment["text"])
+                    count += 1
+                    yield dumps_json({"type": "segment", **segment}) + b"\n"
+
+            summary = {
+                "type": "summary",
+                "fullTranscript": " ".join(full_parts),
+                "detectedLanguage": detected_language,
+            }
+            if debug:
+                summary["debug"] = {"reqId": req_id, **metrics.trace.to_dict()}
+            yield json.dumps(summary) + "\n"
+            logger.info("[%s] Stream done in %.2fs (segments=%d)", req_id, time.time() - t0, count)
+            status = "ok"
 
         except asyncio.TimeoutError:
-            logger.error("[%s] Request timed out after %.1fs", req_id, TIMEOUT_SECONDS)
-            raise HTTPException(status_code=504, detail="Processing timed out")
-
-        except HTTPException:
-            raise
-        except torch.cuda.OutOfMemoryError:
-            logger.exception("[%s] CUDA OOM during transcription", req_id)
-            _cuda_cleanup()
-            raise HTTPException(status_code=503, detail="GPU out of memory. Try again later.")
+            status = "timeout"
+            logger.error("[%s] Stream timed out after %.1fs", req_id, TIMEOUT_SECONDS)
+            yield json.dumps({"type": "error", "status": 504, "detail": "Processing timed out"}) + "\n"
+        except oom_errors():
+            status = "oom"
+            logger.exception("[%s] CUDA OOM during streaming transcription", req_id)
+            yield json.dumps({"type": "error", "status": 503, "detail": "GPU out of memory. Try again later."}) + "\n"
         except Exception as e:
-            logger.exception("[%s] Transcription failed: %s", req_id, e)
-            raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+            logger.exception("[%s] Streaming transcription failed: %s", req_id, e)
+            yield json.dumps({"type": "error", "status": 500, "detail": f"Transcription failed: {str(e)}"}) + "\n"
         finally:
-            # Cleanup temp file
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                except OSError:
-                    logger.warning("[%s] Failed to remove temp file: %s", req_id, tmp_path)
+            ticket.release(ok=status == "ok")
+            await windows.aclose()
+            ingested.cleanup()
+            metrics.observe(status, ingested.duration)
 
-            # Single cleanup at end of request
-            _cuda_cleanup()
+    return StreamingResponse(_events(), media_type="application/x-ndjson")
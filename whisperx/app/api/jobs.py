@@ -0,0 +1,57 @@
+import asyncio
+import hashlib
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+
+from app.core.config import DEFAULT_QUALITY, ALLOW_DIARIZATION
+from app.core.logging import get_logger
+from app.core.security import validate_api_key, check_callback_url
+from app.schemas import JobResponse
+from app.services.audio import ingest_upload
+from app.services.jobs import job_store, job_workers, job_response
+
+router = APIRouter()
+logger = get_logger("whisperx-endpoints")
+
+@router.post("/jobs", response_model=JobResponse, status_code=202, dependencies=[Depends(validate_api_key)])
+async def create_job(
+    file: UploadFile = File(...),
+    language: Optional[str] = Form(None),              # None = auto-detect
+    quality: str = Form(DEFAULT_QUALITY),              # fast, balanced, accurate
+    enable_diarization: bool = Form(False),
+    callback_url: Optional[str] = Form(None),          # POSTed the final job when it finishes
+):
+    """
+    Queue a transcription and return its id right away; poll GET /jobs/{id} or pass
+    callback_url. Jobs survive restarts and are not bound by TIMEOUT_SECONDS.
+    """
+    if enable_diarization and not ALLOW_DIARIZATION:
+        raise HTTPException(status_code=400, detail="Diarization disabled on server.")
+    if callback_url:
+        try:
+            await asyncio.to_thread(check_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid callback_url: {e}.")
+
+    hasher = hashlib.sha256()
+    ingested = await ingest_upload(file, hasher=hasher, to_disk=True)
+    try:
+        job = await asyncio.to_thread(
+            job_store.submit, ingested.tmp_path, hasher.hexdigest(), ingested.duration,
+            quality, language, enable_diarization, callback_url,
+        )
+    except Exception:
+        ingested.cleanup()
+        raise
+    logger.info("[%s] Job queued filename=%s duration=%.1fs quality=%s diarize=%s",
+                job["id"], file.filename, ingested.duration, quality, enable_diarization)
+    job_workers.wake()
+    return job_response(job_store, job)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(validate_api_key)])
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job_store, job)
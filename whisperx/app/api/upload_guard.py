@@ -0,0 +1,151 @@
+import json
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from app.core.config import MAX_BYTES, MAX_UPLOAD_MB, UPLOAD_PRECHECK
+from app.core.logging import get_logger
+from app.core.metrics import UPLOAD_REJECTIONS
+from app.services.audio import check_header_duration
+from app.services.audio_headers import AudioHeader, parse_header
+
+logger = get_logger("whisperx-endpoints")
+
+# ----------------------------
+# Upload pre-check (ASGI middleware)
+# ----------------------------
+# File() parameters make FastAPI receive and spool the whole multipart body before the
+# endpoint runs, so size and duration checks in the endpoint come after the bandwidth and
+# disk are spent. This looks at Content-Length and at the first KB of the file part while
+# the body is still arriving, and answers 413/400 right away. Admission and device slots
+# are never involved. Everything it reads is replayed to the app unchanged.
+_MULTIPART_OVERHEAD = 64 * 1024  # part headers and form fields on top of the file bytes
+_MIN_HEAD_BYTES = 4 * 1024       # try parsing once this much of the file has arrived
+_MAX_HEAD_BYTES = 64 * 1024      # give up on a header after this much (ID3 art, big WAV chunks)
+_PEEK_LIMIT = 256 * 1024         # stop looking for the file part after this much body
+
+def _boundary(content_type: str) -> Optional[bytes]:
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+def _file_part(body: bytearray, boundary: bytes) -> Optional[Tuple[int, Optional[int]]]:
+    """(start, end) of the first file part's content in body; end is None while it continues."""
+    delimiter = b"--" + boundary
+    pos = body.find(delimiter)
+    while pos != -1:
+        headers_end = body.find(b"\r\n\r\n", pos)
+        if headers_end == -1:
+            return None
+        part_headers = bytes(body[pos + len(delimiter):headers_end]).lower()
+        start = headers_end + 4
+        end = body.find(b"\r\n" + delimiter, start)
+        if b"filename=" in part_headers:
+            return start, (end if end != -1 else None)
+        if end == -1:
+            return None
+        pos = end + 2
+    return None
+
+async def _reject(send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class UploadGuard:
+    """Reject oversized or overlong multipart uploads before their body is received."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not UPLOAD_PRECHECK or scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        content_type = headers.get("content-type", "")
+        boundary = _boundary(content_type) if content_type.lower().startswith("multipart/form-data") else None
+        if boundary is None:
+            return await self.app(scope, receive, send)
+
+        limit = MAX_BYTES + _MULTIPART_OVERHEAD
+        length = headers.get("content-length", "")
+        length = int(length) if length.isdigit() else None
+        if length is not None and length > limit:
+            UPLOAD_REJECTIONS.labels("size").inc()
+            logger.info("Rejected upload to %s: Content-Length %d", scope["path"], length)
+            return await _reject(send, 413, f"File too large (max {MAX_UPLOAD_MB} MB)")
+
+        messages, received, header = await self._peek(receive, boundary, length)
+        try:
+            check_header_duration(header)
+        except HTTPException as e:
+            UPLOAD_REJECTIONS.labels("duration").inc()
+            logger.info("Rejected upload to %s after %d bytes: %s %.1fs%s", scope["path"], received,
+                        header.container, header.duration, " (estimated)" if header.estimated else "")
+            return await _reject(send, e.status_code, e.detail)
+
+        responded = False
+
+        async def replay():
+            nonlocal received, responded
+            if messages:
+                return messages.pop(0)
+            message = await receive()
+            if message["type"] == "http.request" and not responded:
+                received += len(message.get("body", b""))
+                if received > limit:  # no (or a wrong) Content-Length
+                    responded = True
+                    UPLOAD_REJECTIONS.labels("size").inc()
+                    await _reject(send, 413, f"File too large (max {MAX_UPLOAD_MB} MB)")
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not responded:
+                await send(message)
+
+        try:
+            await self.app(scope, replay, guarded_send)
+        except Exception:
+            if not responded:
+                raise
+            # the app saw a disconnect after our 413 and gave up reading the form
+
+    async def _peek(self, receive, boundary: bytes, length: Optional[int]) -> Tuple[List[dict], int, Optional[AudioHeader]]:
+        """Receive until the file part's container header parses (or can't); returns what was read."""
+        messages: List[dict] = []
+        body = bytearray()
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                return messages, len(body), None
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+            part = _file_part(body, boundary)
+            if part is None:
+                if not more or len(body) > _PEEK_LIMIT:
+                    return messages, len(body), None
+                continue
+            start, end = part
+            available = (end if end is not None else len(body)) - start
+            if end is None and more and available < _MIN_HEAD_BYTES:
+                continue
+            if end is not None:
+                total_size = end - start
+            elif length is not None:
+                total_size = max(0, length - start - len(boundary) - 8)  # minus the closing delimiter
+            else:
+                total_size = None
+            head = bytes(body[start:start + min(available, _MAX_HEAD_BYTES)])
+            header = parse_header(head, total_size)
+            if header is not None or end is not None or not more or available >= _MAX_HEAD_BYTES:
+                return messages, len(body), header
@@ -1,6 +1,7 @@
 import os
-import torch
+import sys
 import logging
+import threading
 
 # -------------------------------------------------------------------------
 # Set env var for lightning_fabric / speechbrain / etc.
@@ -12,30 +13,59 @@ HAS_OMEGACONF = True
 
 logger = logging.getLogger("whisperx-boot")
 
+_fixes_lock = threading.Lock()
+_fixes_applied = False
+
 def apply_fixes():
     """
     Apply global fixes for compatibility.
+    Imports torch, so it runs on first model load (see ModelRegistry.acquire), not at
+    startup; safe to call more than once.
     """
+    global _fixes_applied
+    with _fixes_lock:
+        if _fixes_applied:
+            return
+        _fixes_applied = True
+        import torch
     # -------------------------------------------------------------------------
     # Fix for PyTorch 2.6+ weights_only=True default
     # -------------------------------------------------------------------------
-    # The previous attempt to conditionally set weights_only=False failed, 
-    # implying some libraries (like lightning_fabric) might be explicitly 
-    # passing weights_only=True. 
+    # The previous attempt to conditionally set weights_only=False failed,
+    # implying some libraries (like lightning_fabric) might be explicitly
+    # passing weights_only=True.
     #
     # We now AGGRESSIVELY override it to False.
-    
+
     try:
         original_load = torch.load
-        
+
         def patched_load(*args, **kwargs):
             # Aggressively disable weights_only security check
             # This mimics the behavior of older PyTorch versions (<2.6)
             kwargs['weights_only'] = False
             return original_load(*args, **kwargs)
-            
+
         torch.load = patched_load
         logger.info("Aggressively patched torch.load to force weights_only=False.")
-        
+
     except Exception as e:
         logger.warning(f"Failed to patch torch.load: {e}")
+
+# -------------------------------------------------------------------------
+# torch without importing it: importing torch + whisperx takes seconds, so health,
+# metrics and error handling only look at torch once something else has loaded it
+# -------------------------------------------------------------------------
+def loaded_torch():
+    """The torch module if it has been imported, else None."""
+    return sys.modules.get("torch")
+
+def cuda_available():
+    """torch.cuda.is_available(), or None while torch isn't loaded yet."""
+    torch = loaded_torch()
+    return torch.cuda.is_available() if torch is not None else None
+
+def oom_errors() -> tuple:
+    """For `except oom_errors():` - torch's CUDA OOM, or nothing if torch isn't loaded."""
+    torch = loaded_torch()
+    return (torch.cuda.OutOfMemoryError,) if torch is not None else ()
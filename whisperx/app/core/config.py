@@ -1,18 +1,80 @@
 import os
-import torch
+import tempfile
+from typing import Dict
 
 # ----------------------------
 # Config via env vars
 # ----------------------------
-DEVICE = os.getenv("DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+def _cuda_present() -> bool:
+    """
+    NVIDIA driver reports a visible GPU. Cheap stand-in for torch.cuda.is_available():
+    importing torch here would add seconds to every boot. Set DEVICE to override.
+    """
+    if os.getenv("CUDA_VISIBLE_DEVICES", None) in ("", "-1"):
+        return False
+    try:
+        return bool(os.listdir("/proc/driver/nvidia/gpus"))
+    except OSError:
+        return False
+
+DEVICE = os.getenv("DEVICE", "cuda" if _cuda_present() else "cpu")
 
 # Default compute_type: float16 on GPU, int8 on CPU (override via env)
 _default_compute = "float16" if DEVICE == "cuda" else "int8"
 COMPUTE_TYPE = os.getenv("COMPUTE_TYPE", _default_compute)
 
+def compute_type_for(device: str) -> str:
+    """COMPUTE_TYPE if set explicitly, else float16 on GPUs / int8 on CPUs (see device_profile for calibrated values)."""
+    return os.getenv("COMPUTE_TYPE") or ("float16" if device.startswith("cuda") else "int8")
+
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "4"))
+
+# Calibration: benchmark compute types x batch sizes per Whisper model and device
+# (calibrate.py, or at boot) and keep the fastest setting that fits in memory and matches
+# the reference transcript in CALIBRATION_PROFILE, which model loads and batch sizing use.
+# COMPUTE_TYPE / BATCH_SIZE set explicitly still win.
+CALIBRATION_PROFILE = os.getenv(
+    "CALIBRATION_PROFILE", os.path.join(tempfile.gettempdir(), "whisperx-calibration.json")
+)  # "" disables
+CALIBRATE_ON_BOOT = os.getenv("CALIBRATE_ON_BOOT", "false").lower() in ("1", "true", "yes")  # only missing entries
+CALIBRATION_AUDIO = os.getenv("CALIBRATION_AUDIO", "")  # speech clip for the quality guard; "" = synthetic
+CALIBRATION_SECONDS = float(os.getenv("CALIBRATION_SECONDS", "20"))
+CALIBRATION_LANGUAGE = os.getenv("CALIBRATION_LANGUAGE", "en")
+CALIBRATION_BATCH_SIZES = [int(b) for b in os.getenv("CALIBRATION_BATCH_SIZES", "1,2,4,8,16").split(",") if b.strip()]
+CALIBRATION_MAX_WER = float(os.getenv("CALIBRATION_MAX_WER", "0.1"))  # word error rate vs the reference
+CALIBRATION_MIN_FREE = float(os.getenv("CALIBRATION_MIN_FREE", "0.2"))  # GPU memory left free for align/diarization
+
+SAMPLE_RATE = 16000  # whisperx.audio.SAMPLE_RATE; every model in the pipeline runs at 16 kHz
+
+# Adaptive batch size: start at BATCH_SIZE (or the calibrated size), size each stage from free device memory,
+# model size and chunk count (up to MAX_BATCH_SIZE), halve on OOM and remember per model.
+# false = fixed BATCH_SIZE, OOM fails the request.
+ADAPTIVE_BATCH_SIZE = os.getenv("ADAPTIVE_BATCH_SIZE", "true").lower() in ("1", "true", "yes")
+MAX_BATCH_SIZE = max(BATCH_SIZE, int(os.getenv("MAX_BATCH_SIZE", "32")))
+
+# Cross-request batching: decode VAD chunks from concurrent requests in shared batches
+DYNAMIC_BATCHING = os.getenv("DYNAMIC_BATCHING", "false").lower() in ("1", "true", "yes")
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "20"))  # max wait to fill a batch
+
+# /transcribe/stream: VAD chunks (<=30s each) decoded + aligned per emitted window
+STREAM_WINDOW_CHUNKS = max(1, int(os.getenv("STREAM_WINDOW_CHUNKS", str(BATCH_SIZE))))
+
+# Silence trimming: cut silent stretches of SILENCE_MIN_SECONDS or more out of the decoded
+# audio before transcribe/align/diarize; timestamps are mapped back to the original
+TRIM_SILENCE = os.getenv("TRIM_SILENCE", "true").lower() in ("1", "true", "yes")
+SILENCE_THRESHOLD_DB = float(os.getenv("SILENCE_THRESHOLD_DB", "-45"))  # frame RMS, dBFS
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "2.0"))
+SILENCE_PAD_SECONDS = float(os.getenv("SILENCE_PAD_SECONDS", "0.25"))  # kept on each side of a cut
+
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "200"))
 MAX_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Reject multipart uploads from Content-Length and the first KB of the file part (container
+# header -> duration) before the body is received; false = only check after the upload
+UPLOAD_PRECHECK = os.getenv("UPLOAD_PRECHECK", "true").lower() in ("1", "true", "yes")
+
+# Upload ingest: "pipe" decodes the body through ffmpeg stdin while reading it,
+# "tempfile" writes it to disk first and runs ffprobe + ffmpeg on the file
+INGEST_MODE = os.getenv("INGEST_MODE", "pipe").lower()
 
 # GPU safety: limit concurrent requests doing GPU work (usually 1 per GPU)
 MAX_CONCURRENT = int(os.getenv("MAX_CONCURRENT", "1"))
@@ -22,6 +84,23 @@ HF_TOKEN = os.getenv("HF_TOKEN")  # for diarization pipeline
 # Cap alignment cache to avoid runaway memory usage if many languages appear
 ALIGN_CACHE_MAX = int(os.getenv("ALIGN_CACHE_MAX", "4"))
 
+# Start loading the alignment model as soon as the language is known (caller-supplied
+# or detected on the first 30s window), so it overlaps transcription
+ALIGN_PREFETCH = os.getenv("ALIGN_PREFETCH", "true").lower() in ("1", "true", "yes")
+# Alignment models loaded at startup, e.g. "en,de,fr" (bounded by ALIGN_CACHE_MAX)
+ALIGN_WARMUP_LANGUAGES = [lang.strip() for lang in os.getenv("ALIGN_WARMUP_LANGUAGES", "").split(",") if lang.strip()]
+
+# Startup warm-up runs in a background thread so the server listens (and /livez answers)
+# right away; /readyz turns 200 once it is done. Qualities to preload (default: DEFAULT_QUALITY),
+# and the diarization pipeline too if WARMUP_DIARIZATION (needs HF_TOKEN).
+WARMUP_BACKGROUND = os.getenv("WARMUP_BACKGROUND", "true").lower() in ("1", "true", "yes")
+WARMUP_QUALITIES = [q.strip().lower() for q in os.getenv("WARMUP_QUALITIES", "").split(",") if q.strip()]
+WARMUP_DIARIZATION = os.getenv("WARMUP_DIARIZATION", "false").lower() in ("1", "true", "yes")
+
+# Memory budget per device for all resident models (Whisper + align + diarization).
+# 0 = auto: 80% of GPU memory, or 50% of physical RAM on CPU.
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+
 # Model “quality” mapping
 MODEL_MAP = {
     "fast": "small",
@@ -36,10 +115,105 @@ ALLOW_DIARIZATION = os.getenv("ALLOW_DIARIZATION", "true").lower() in ("1", "tru
 # Optional: if you want to force diarization device to cpu (some setups do this)
 DIAR_DEVICE = os.getenv("DIAR_DEVICE", DEVICE)
 
+# ----------------------------
+# Device pool
+# ----------------------------
+# DEVICES="cuda:0,cuda:1" or with per-device slots "cuda:0=2,cuda:1=1" (default: MAX_CONCURRENT).
+# Each device gets its own slots, worker threads and model copies; repeated "cpu:N"
+# entries act as separate CPU devices. DIAR_DEVICES picks where diarization may run.
+def _parse_devices(spec: str) -> Dict[str, int]:
+    devices: Dict[str, int] = {}
+    for item in spec.split(","):
+        name, _, slots = item.strip().partition("=")
+        if name:
+            devices[name.strip()] = int(slots) if slots else MAX_CONCURRENT
+    return devices
+
+DEVICE_SLOTS = _parse_devices(os.getenv("DEVICES", DEVICE))
+DEVICES = list(DEVICE_SLOTS)
+_diar_devices = _parse_devices(os.getenv("DIAR_DEVICES", DIAR_DEVICE))
+DIAR_DEVICES = list(_diar_devices)
+for _name, _slots in _diar_devices.items():
+    DEVICE_SLOTS.setdefault(_name, _slots)
+
+# CPU process pool: stages on the "cpu" device run in CPU_PROCESSES spawned worker processes
+# (one slot each), each pinned to its own share of the cores with CPU_THREADS_PER_PROCESS
+# threads (0 = cores / processes). Every worker holds its own model copies, so RSS grows with
+# CPU_PROCESSES. Run a single uvicorn worker with this. 0 = threads in-process.
+CPU_PROCESSES = int(os.getenv("CPU_PROCESSES", "0"))
+_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+CPU_THREADS_PER_PROCESS = int(os.getenv("CPU_THREADS_PER_PROCESS", "0")) or max(1, _cores // max(1, CPU_PROCESSES))
+if CPU_PROCESSES > 0 and "cpu" in DEVICE_SLOTS:
+    DEVICE_SLOTS["cpu"] = CPU_PROCESSES
+
 # ----------------------------
 # Production / Security Config
 # ----------------------------
 API_KEY = os.getenv("API_KEY")  # If None, auth disabled (or enable by default? up to logic)
+# Admin-only request features (profile=torch|cprofile on /transcribe) need X-Admin-Key; unset = disabled
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "whisperx-profiles"))
+# Per-stage timings in a Server-Timing response header on /transcribe
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 MAX_AUDIO_DURATION = float(os.getenv("MAX_AUDIO_DURATION", "3600"))  # seconds
 TIMEOUT_SECONDS = float(os.getenv("TIMEOUT_SECONDS", "300"))
+
+# ----------------------------
+# Admission control / job scheduling
+# ----------------------------
+# Order for jobs waiting to start: "sjf" (shortest estimated job first), "wfq" (weighted-fair
+# across quality tiers) or "fifo". Aging: seconds of estimated cost forgiven per second waited.
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "sjf").lower()
+SCHEDULER_AGING = float(os.getenv("SCHEDULER_AGING", "0.05"))
+# Jobs running the pipeline at once (0 = 2x the device slots, so batches can fill)
+MAX_ACTIVE_JOBS = int(os.getenv("MAX_ACTIVE_JOBS", "0"))
+
+def _parse_weights(spec: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value:
+            weights[name.strip().lower()] = float(value)
+    return weights
+
+# Initial processing seconds per audio second per quality tier (refined from finished jobs)
+_default_rtf = "fast=0.03,balanced=0.06,accurate=0.12" if DEVICE.startswith("cuda") else "fast=0.3,balanced=0.8,accurate=1.5"
+QUALITY_RTF = _parse_weights(os.getenv("QUALITY_RTF", _default_rtf))
+# "wfq" share of processing time per quality tier
+QUALITY_WEIGHTS = _parse_weights(os.getenv("QUALITY_WEIGHTS", "fast=1,balanced=1,accurate=1"))
+
+# ----------------------------
+# Result cache (content hash of upload + model/language/quality/diarization)
+# ----------------------------
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "whisperx-result-cache"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))  # 0 disables the disk cache
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# ----------------------------
+# Checkpoints for long recordings: decode + align in windows of VAD chunks and save each
+# window, so a retry of the same upload (timeout, crash, job restart) resumes
+# ----------------------------
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "whisperx-checkpoints"))  # "" disables
+CHECKPOINT_MIN_SECONDS = float(os.getenv("CHECKPOINT_MIN_SECONDS", "600"))  # shorter audio runs in one pass
+CHECKPOINT_WINDOW_CHUNKS = max(1, int(os.getenv("CHECKPOINT_WINDOW_CHUNKS", "10")))  # ~5 min of speech per window
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))
+
+# ----------------------------
+# Raw Whisper segments (before alignment) per upload hash + model, so /realign and
+# /rediarize can redo the later stages on the same audio without transcribing it again
+# ----------------------------
+SEGMENT_STORE_DIR = os.getenv("SEGMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "whisperx-segments"))  # "" disables
+SEGMENT_STORE_TTL_SECONDS = float(os.getenv("SEGMENT_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# ----------------------------
+# Durable jobs API (POST /jobs, GET /jobs/{id})
+# ----------------------------
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "whisperx-jobs"))  # SQLite db + uploads
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # jobs pulled from the queue at once (0 = no workers)
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "3600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # restarts mid-job before it is marked failed
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # running job with no heartbeat this long is requeued
+# Hosts allowed to receive job callbacks (empty = any host that resolves only to public addresses)
+JOB_CALLBACK_HOSTS = [h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()]
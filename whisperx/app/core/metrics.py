@@ -0,0 +1,161 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from app.core.config import MODEL_MAP, DEFAULT_QUALITY
+from app.core.tracing import gpu_used_bytes, rss_bytes, span, start_trace
+
+# ----------------------------
+# Prometheus metrics (per-process; run a single uvicorn worker per GPU)
+# ----------------------------
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "whisperx_stage_seconds",
+    "Wall time per pipeline stage (upload, probe, decode, trim, language_id, transcribe, align, diarize, serialize)",
+    ["stage", "quality", "language"],
+    buckets=_STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "whisperx_request_seconds",
+    "End-to-end latency of /transcribe and /transcribe/stream",
+    ["quality", "status"],
+    buckets=_STAGE_BUCKETS,
+)
+REAL_TIME_FACTOR = Histogram(
+    "whisperx_real_time_factor",
+    "Processing time divided by audio duration",
+    ["quality"],
+    buckets=(0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5),
+)
+REQUEST_PEAK_MEMORY = Histogram(
+    "whisperx_request_peak_memory_bytes",
+    "Highest device memory seen at a stage boundary during the request",
+    ["memory"],  # "gpu" | "cpu"
+    buckets=tuple(2 ** i * 1024**2 for i in range(6, 16)),  # 64 MB .. 32 GB
+)
+GPU_SLOT_WAITERS = Gauge("whisperx_gpu_slot_waiters", "Stages waiting for a device slot", ["device"])
+GPU_SLOTS_IN_USE = Gauge("whisperx_gpu_slots_in_use", "Device slots currently held", ["device"])
+
+UPLOAD_REJECTIONS = Counter(
+    "whisperx_upload_rejections_total",
+    "Uploads rejected before the body was received: size (Content-Length or bytes streamed) or duration (header)",
+    ["reason"],
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge("whisperx_admission_queue_depth", "Jobs waiting to start the pipeline")
+ADMISSION_ACTIVE_JOBS = Gauge("whisperx_admission_active_jobs", "Jobs admitted and running the pipeline")
+ADMISSION_REJECTIONS = Counter("whisperx_admission_rejections_total", "Jobs rejected with 429", ["quality"])
+ADMISSION_WAIT_SECONDS = Histogram(
+    "whisperx_admission_wait_seconds",
+    "Time from admission request to start of the pipeline",
+    ["quality"],
+    buckets=_STAGE_BUCKETS,
+)
+
+MODEL_CACHE_HITS = Counter("whisperx_model_cache_hits_total", "Model registry hits", ["kind"])
+MODEL_CACHE_MISSES = Counter("whisperx_model_cache_misses_total", "Model registry misses", ["kind"])
+MODEL_CACHE_EVICTIONS = Counter("whisperx_model_cache_evictions_total", "Model registry evictions", ["kind"])
+MODEL_LOAD_SECONDS = Histogram(
+    "whisperx_model_load_seconds",
+    "Time to load a model on a cache miss",
+    ["kind"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+
+BATCH_SIZE_CURRENT = Gauge("whisperx_batch_size", "Remembered batch size per model and device", ["model", "device"])
+BATCH_SIZE_ADJUSTMENTS = Counter(
+    "whisperx_batch_size_adjustments_total",
+    "Batch size changes: down (OOM back-off) or up (recovery after a run of successes)",
+    ["model", "direction"],
+)
+
+CHECKPOINT_WINDOWS = Counter(
+    "whisperx_checkpoint_windows_total",
+    "Windows of long recordings: resumed (loaded from a checkpoint) or computed",
+    ["outcome"],
+)
+
+SILENCE_SKIPPED_SECONDS = Counter(
+    "whisperx_silence_skipped_seconds_total", "Audio seconds cut by silence trimming before inference"
+)
+SILENCE_SKIPPED_RATIO = Histogram(
+    "whisperx_silence_skipped_ratio",
+    "Fraction of each request's audio cut by silence trimming",
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9),
+)
+SILENCE_COMPUTE_SAVED_SECONDS = Counter(
+    "whisperx_silence_compute_saved_seconds_total",
+    "Estimated transcribe/align/diarize seconds saved by silence trimming (stage time x skipped/kept)",
+)
+
+ALIGN_PREFETCH_OUTCOMES = Counter(
+    "whisperx_align_prefetch_total",
+    "Alignment model readiness when alignment starts: ready (prefetch finished), waited "
+    "(prefetch still loading), wrong (prefetched another language), warm (already resident), cold",
+    ["outcome"],
+)
+
+def render() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class RequestMetrics:
+    """
+    Stage timings for one request. Durations are buffered and observed once at the
+    end, when the detected language is known; memory is sampled at stage boundaries.
+    Each stage is also a span in the request's trace (Server-Timing, debug output).
+    """
+
+    def __init__(self, quality: str):
+        q = (quality or DEFAULT_QUALITY).lower()
+        self.quality = q if q in MODEL_MAP else DEFAULT_QUALITY  # bounded label values
+        self.language = "unknown"
+        self.stages: Dict[str, float] = {}
+        self.peak_gpu_bytes = 0
+        self.peak_cpu_bytes = 0
+        self.skipped_seconds = 0.0  # silence trimmed before inference
+        self.kept_seconds = 0.0
+        self._t0 = time.perf_counter()
+        self.trace = start_trace()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t
+            self._sample_memory()
+
+    def _sample_memory(self) -> None:
+        self.peak_gpu_bytes = max(self.peak_gpu_bytes, gpu_used_bytes())
+        self.peak_cpu_bytes = max(self.peak_cpu_bytes, rss_bytes())
+
+    def record_trim(self, skipped_seconds: float, kept_seconds: float) -> None:
+        self.skipped_seconds = skipped_seconds
+        self.kept_seconds = kept_seconds
+
+    def compute_saved(self) -> float:
+        """Estimated inference seconds the trimmed audio would have cost (assumes linear cost)."""
+        if not self.skipped_seconds or not self.kept_seconds:
+            return 0.0
+        spent = sum(self.stages.get(name, 0.0) for name in ("transcribe", "align", "diarize"))
+        return spent * self.skipped_seconds / self.kept_seconds
+
+    def observe(self, status: str, audio_duration: float = 0.0) -> None:
+        elapsed = time.perf_counter() - self._t0
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.labels(name, self.quality, self.language or "unknown").observe(seconds)
+        REQUEST_SECONDS.labels(self.quality, status).observe(elapsed)
+        if status == "ok" and audio_duration > 0:
+            REAL_TIME_FACTOR.labels(self.quality).observe(elapsed / audio_duration)
+        if self.skipped_seconds:
+            SILENCE_SKIPPED_SECONDS.inc(self.skipped_seconds)
+            SILENCE_SKIPPED_RATIO.observe(self.skipped_seconds / (self.skipped_seconds + self.kept_seconds))
+            if status == "ok":
+                SILENCE_COMPUTE_SAVED_SECONDS.inc(self.compute_saved())
+        if self.peak_gpu_bytes:
+            REQUEST_PEAK_MEMORY.labels("gpu").observe(self.peak_gpu_bytes)
+        if self.peak_cpu_bytes:
+            REQUEST_PEAK_MEMORY.labels("cpu").observe(self.peak_cpu_bytes)
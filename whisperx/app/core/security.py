@@ -1,10 +1,15 @@
+import socket
 import secrets
+import ipaddress
+from urllib.parse import urlparse
 from fastapi import HTTPException, Security, status
 from fastapi.security import APIKeyHeader
-from app.core.config import API_KEY
+from typing import Optional
+from app.core.config import API_KEY, ADMIN_API_KEY, JOB_CALLBACK_HOSTS
 
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
+ADMIN_KEY_NAME = "X-Admin-Key"
 
 async def validate_api_key(api_key_header: str = Security(api_key_header)):
     if not API_KEY:
@@ -25,3 +30,43 @@ async def validate_api_key(api_key_header: str = Security(api_key_header)):
             detail="Invalid API Key",
         )
     return api_key_header
+
+def check_admin_key(admin_key: Optional[str]) -> None:
+    """Admin-only request features: ADMIN_API_KEY must be configured and match."""
+    if not ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin features are disabled (ADMIN_API_KEY not set)",
+        )
+    if not admin_key or not secrets.compare_digest(admin_key, ADMIN_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin key",
+        )
+
+def check_callback_url(url: str) -> None:
+    """
+    Blocking (resolves DNS): raise ValueError unless url is an http(s) URL on a
+    JOB_CALLBACK_HOSTS host or, with no allowlist, on a host whose every address is
+    public (no loopback, private, link-local / cloud metadata or reserved ranges).
+    Called at submit and again before each delivery, since DNS can change in between.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parsed.hostname.lower()
+    if JOB_CALLBACK_HOSTS:
+        if host not in JOB_CALLBACK_HOSTS:
+            raise ValueError(f"callback host {host} is not in JOB_CALLBACK_HOSTS")
+        return
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (ValueError, socket.gaierror) as e:
+        raise ValueError(f"callback host {host} does not resolve: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if getattr(address, "ipv4_mapped", None):
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"callback host {host} resolves to non-public address {address}")
@@ -0,0 +1,230 @@
+import asyncio
+import contextvars
+import cProfile
+import os
+import pstats
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from fastapi import HTTPException
+from app.core.boot import loaded_torch
+from app.core.config import PROFILE_DIR
+from app.core.logging import get_logger
+
+logger = get_logger("whisperx-server")
+
+# ----------------------------
+# Per-request tracing
+# ----------------------------
+# A Trace collects one Span per stage of a request (upload, decode, queue/slot waits,
+# model loads, transcribe, align, diarize, ...) with wall time, CPU time and memory deltas.
+# The current trace and span live in contextvars, so code deep in the pipeline (device
+# slots, the model registry) can open spans without being handed the request.
+# CPU time: the event loop thread is shared by all requests, so async spans are charged
+# only the worker-thread CPU of the work they hand off (run_inference, to_thread) plus
+# CPU-pool process time; sync spans (no awaits inside) also count their own thread.
+# Shared decode batches serve several requests at once and are not charged to any.
+# Memory: process RSS and device-wide GPU use, so concurrent requests show up too.
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("whisperx_trace", default=None)
+_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("whisperx_span", default=None)
+
+PROFILERS = ("torch", "cprofile")
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def gpu_used_bytes() -> int:
+    """Used memory on the current CUDA device (all processes, ctranslate2 included); 0 without CUDA."""
+    torch = loaded_torch()
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    free, total = torch.cuda.mem_get_info()
+    return total - free
+
+@dataclass
+class Span:
+    name: str
+    start: float                      # seconds since the trace started
+    parent: Optional["Span"] = None
+    wall: float = 0.0
+    cpu: float = 0.0
+    rss_delta: int = 0
+    gpu_delta: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent is not None else None,
+            "startMs": round(self.start * 1000, 1),
+            "wallMs": round(self.wall * 1000, 1),
+            "cpuMs": round(self.cpu * 1000, 1),
+            "rssDeltaMb": round(self.rss_delta / 1024**2, 1),
+            "gpuDeltaMb": round(self.gpu_delta / 1024**2, 1),
+        }
+
+class Trace:
+    """Spans of one request, in the order they finished."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.profile: Optional[str] = None   # "cprofile": worker-thread calls are profiled
+        self.profile_path: Optional[str] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def totals(self) -> Dict[str, float]:
+        """Wall seconds per span name (windows of a long file add up), in first-seen order."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in sorted(self.spans, key=lambda s: s.start):
+                totals[span.name] = totals.get(span.name, 0.0) + span.wall
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one metric per span name plus the total."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [s.to_dict() for s in sorted(self.spans, key=lambda s: s.start)]
+        return {
+            "totalMs": round(self.elapsed() * 1000, 1),
+            "spans": spans,
+            "profile": self.profile_path,
+        }
+
+def start_trace() -> Trace:
+    """New trace, current for the rest of this task (and tasks it creates)."""
+    trace = Trace()
+    _trace.set(trace)
+    _span.set(None)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+def add_cpu(seconds: float) -> None:
+    """Charge CPU seconds to the current span and the spans around it."""
+    trace, span = _trace.get(), _span.get()
+    if trace is None:
+        return
+    with trace._lock:
+        while span is not None:
+            span.cpu += seconds
+            span = span.parent
+
+@contextmanager
+def span(name: str, sync: bool = False) -> Iterator[Optional[Span]]:
+    """Record a span under the current one (no-op outside a trace); see the notes above on sync."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, trace.elapsed(), _span.get())
+    token = _span.set(current)
+    t, rss, gpu = time.perf_counter(), rss_bytes(), gpu_used_bytes()
+    cpu = time.thread_time() if sync else None
+    try:
+        yield current
+    finally:
+        current.wall = time.perf_counter() - t
+        current.rss_delta = rss_bytes() - rss
+        current.gpu_delta = gpu_used_bytes() - gpu
+        _span.reset(token)
+        with trace._lock:
+            if cpu is not None:
+                current.cpu += time.thread_time() - cpu
+            trace.spans.append(current)
+
+def traced_call(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run fn in this worker thread (inside the caller's copied context), charging its CPU
+    time to the current span, and under cProfile when the request is being profiled.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile() if trace.profile == "cprofile" else None
+    t = time.thread_time()
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:  # Python 3.12+: one profiler per process; a parallel stage has it
+            profiler = None
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            with trace._lock:
+                trace._profiles.append(profiler)
+        add_cpu(time.thread_time() - t)
+
+async def to_thread(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """asyncio.to_thread, with the thread's CPU time charged to the current span."""
+    return await asyncio.to_thread(traced_call, fn, *args, **kwargs)
+
+# ----------------------------
+# On-demand profiling of a single request (admin only, see endpoints)
+# ----------------------------
+# "torch": torch.profiler over the whole request, saved as a Chrome trace (open in
+# Perfetto / chrome://tracing). It is process-wide, so other requests running at the
+# same time show up as well. "cprofile": the request's own worker-thread calls only,
+# saved as pstats (snakeviz, `python -m pstats`). CPU-pool stages run in other
+# processes and are not profiled. One profiled request at a time.
+_profiling = asyncio.Lock()
+
+@asynccontextmanager
+async def profiling(kind: str, trace: Trace, name: str) -> AsyncIterator[None]:
+    if kind not in PROFILERS:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {', '.join(PROFILERS)}")
+    if _profiling.locked():
+        raise HTTPException(status_code=409, detail="Another request is being profiled")
+    async with _profiling:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if kind == "cprofile":
+            trace.profile = "cprofile"
+            try:
+                yield
+            finally:
+                trace.profile = None
+                trace.profile_path = os.path.join(PROFILE_DIR, f"{stamp}-{name}.pstats")
+                await asyncio.to_thread(_dump_pstats, list(trace._profiles), trace.profile_path)
+                trace._profiles.clear()
+                logger.info("Saved cProfile capture to %s", trace.profile_path)
+            return
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            trace.profile_path = os.path.join(PROFILE_DIR, f"{stamp}-{name}.trace.json")
+            await asyncio.to_thread(profiler.export_chrome_trace, trace.profile_path)
+            logger.info("Saved torch.profiler trace to %s", trace.profile_path)
+
+def _dump_pstats(profiles: List[cProfile.Profile], path: str) -> None:
+    if not profiles:
+        open(path, "wb").close()  # nothing ran on a worker thread (e.g. a result cache hit)
+        return
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(path)
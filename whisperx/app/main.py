@@ -1,13 +1,14 @@
-from app.core.boot import apply_fixes, HAS_OMEGACONF
-# Apply fixes before any other logic that might trigger torch operations
-apply_fixes()
-
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import router
-from app.core.config import DEFAULT_QUALITY, CORS_ORIGINS
-from app.services.model_manager import get_model
+from app.api.jobs import router as jobs_router
+from app.api.upload_guard import UploadGuard
+from app.core.config import CORS_ORIGINS, WARMUP_BACKGROUND
+from app.services.executor import shutdown_executors
+from app.services.process_pool import cpu_pool
+from app.services.jobs import job_workers
+from app.services.warmup import warmup
 from app.core.logging import get_logger
 
 logger = get_logger("whisperx-server")
@@ -15,6 +16,9 @@ logger = get_logger("whisperx-server")
 def create_app() -> FastAPI:
     app = FastAPI(title="WhisperX Server", version="1.1.0")
     
+    # Size/duration pre-check while the upload arrives (inside CORS so rejections carry its headers)
+    app.add_middleware(UploadGuard)
+
     # CORS
     app.add_middleware(
         CORSMiddleware,
@@ -25,12 +29,24 @@ def create_app() -> FastAPI:
     )
     
     app.include_router(router)
+    app.include_router(jobs_router)
     
     @app.on_event("startup")
     def _startup():
         logger.info("Starting WhisperX Server")
-        # Optional preload to reduce cold start
-        get_model(DEFAULT_QUALITY)
+        # Before serving, so no "cpu" stage runs in-process while the pool comes up
+        cpu_pool.start()
+        # Preload to reduce cold start; in the background unless WARMUP_BACKGROUND=false
+        warmup.start(background=WARMUP_BACKGROUND)
+
+    @app.on_event("startup")
+    async def _start_job_workers():
+        job_workers.start()
+
+    @app.on_event("shutdown")
+    async def _shutdown():
+        await job_workers.stop()
+        shutdown_executors()
 
     @app.exception_handler(Exception)
     async def unhandled_exception_handler(request: Request, exc: Exception):
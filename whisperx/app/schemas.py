@@ -1,11 +1,20 @@
 from typing import Optional, List, Any
 from pydantic import BaseModel, Field
 
+class WordResponse(BaseModel):
+    word: str
+    startSeconds: Optional[float] = None
+    endSeconds: Optional[float] = None
+    score: Optional[float] = None
+    speaker: Optional[str] = None
+
+
 class SegmentResponse(BaseModel):
     text: str
     startSeconds: float
     endSeconds: float
     speaker: Optional[str] = None
+    words: Optional[List[WordResponse]] = None  # only with words=true
 
 
 class TranscriptionResponse(BaseModel):
@@ -13,3 +22,17 @@ class TranscriptionResponse(BaseModel):
     detectedLanguage: Optional[str] = None
     segments: List[SegmentResponse]
     chapters: List[Any] = Field(default_factory=list)
+    debug: Optional[dict] = None             # only with debug=true: per-stage spans
+
+
+class JobResponse(BaseModel):
+    id: str
+    status: str                              # queued, running, done, failed
+    stage: Optional[str] = None              # current pipeline stage while running
+    progress: float = 0.0                    # 0..1
+    queuePosition: Optional[int] = None      # jobs ahead while queued
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[TranscriptionResponse] = None
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import math
+import time
+from typing import Dict, Tuple
+from fastapi import HTTPException
+from app.core.config import (
+    DEVICES, DEVICE_SLOTS, MAX_ACTIVE_JOBS, SCHEDULER_POLICY, SCHEDULER_AGING,
+    QUALITY_RTF, QUALITY_WEIGHTS, TIMEOUT_SECONDS, MODEL_MAP, DEFAULT_QUALITY,
+)
+from app.core.logging import get_logger
+from app.core.tracing import span
+from app.core.metrics import (
+    ADMISSION_QUEUE_DEPTH, ADMISSION_ACTIVE_JOBS, ADMISSION_REJECTIONS, ADMISSION_WAIT_SECONDS,
+)
+from app.services.scheduling import Job, SchedulingQueue
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Admission controller
+# ----------------------------
+class Ticket:
+    """A reserved place in line: `async with ticket:` waits for the turn and frees it after."""
+
+    def __init__(self, controller: "AdmissionController", job: Job):
+        self._controller = controller
+        self.job = job
+
+    async def acquire(self) -> None:
+        with span("queue_wait"):
+            await self._controller._acquire(self.job)
+
+    def release(self, ok: bool = False) -> None:
+        self._controller._release(self.job, ok)
+
+    async def __aenter__(self) -> "Ticket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release(ok=exc_type is None)
+
+class AdmissionController:
+    """
+    Caps jobs running the pipeline at once and orders the rest with a SchedulingQueue.
+    Cost = audio duration x processing-seconds-per-audio-second of the quality tier, learned
+    from finished jobs. Jobs whose estimated wait exceeds TIMEOUT_SECONDS get a 429 up front.
+    """
+
+    def __init__(self, max_active: int, parallelism: int, queue: SchedulingQueue,
+                 rtf: Dict[str, float], timeout: float):
+        self.max_active = max(1, max_active)
+        self.parallelism = max(1, parallelism)
+        self.queue = queue
+        self.timeout = timeout
+        self.admitted = 0
+        self.rejected = 0
+        self._rtf = dict(rtf)
+        self._active: Dict[int, Tuple[Job, float, int]] = {}  # seq -> (job, started_at, active_at_start)
+        self._seq = itertools.count()
+
+    @staticmethod
+    def _tier(quality: str) -> str:
+        q = (quality or DEFAULT_QUALITY).lower()
+        return q if q in MODEL_MAP else DEFAULT_QUALITY
+
+    def estimate(self, duration: float, quality: str) -> float:
+        rtf = self._rtf.get(quality) or max(self._rtf.values(), default=0.1)
+        return max(0.1, duration * rtf)
+
+    def estimated_wait(self, cost: float, quality: str, now: float) -> float:
+        if len(self._active) < self.max_active and self.queue.depth == 0:
+            return 0.0
+        running = sum(max(0.0, job.cost - (now - started)) for job, started, _ in self._active.values())
+        return (running + self.queue.cost_ahead(cost, quality, now)) / self.parallelism
+
+    def reserve(self, duration: float, quality: str, reject: bool = True) -> Ticket:
+        """
+        Place in line for one job, or HTTPException(429) with Retry-After if the wait is too
+        long. reject=False always queues (jobs API: the caller is not holding a connection).
+        """
+        tier = self._tier(quality)
+        now = time.monotonic()
+        cost = self.estimate(duration, tier)
+        wait = self.estimated_wait(cost, tier, now)
+        if reject and wait > self.timeout:
+            self.rejected += 1
+            ADMISSION_REJECTIONS.labels(tier).inc()
+            retry_after = max(1, math.ceil(wait - self.timeout))
+            logger.warning("Rejecting job quality=%s duration=%.1fs: estimated wait %.0fs (queued=%d)",
+                           tier, duration, wait, self.queue.depth)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server busy: estimated wait {wait:.0f}s exceeds {self.timeout:.0f}s",
+                headers={"Retry-After": str(retry_after)},
+            )
+        return Ticket(self, Job(cost=cost, quality=tier, duration=duration, enqueued_at=now, seq=next(self._seq)))
+
+    async def _acquire(self, job: Job) -> None:
+        job.future = asyncio.get_running_loop().create_future()
+        self.queue.push(job)
+        self._dispatch()
+        try:
+            await job.future
+        except asyncio.CancelledError:
+            if job.seq in self._active:
+                self._release(job, ok=False)  # admitted just as we were cancelled
+            else:
+                self.queue.remove(job)
+                self._update_gauges()
+            raise
+        ADMISSION_WAIT_SECONDS.labels(job.quality).observe(time.monotonic() - job.enqueued_at)
+
+    def _dispatch(self) -> None:
+        while len(self._active) < self.max_active:
+            job = self.queue.pop()
+            if job is None:
+                break
+            if job.future is None or job.future.done():
+                continue  # cancelled between wake-up and pop
+            self._active[job.seq] = (job, time.monotonic(), len(self._active) + 1)
+            self.admitted += 1
+            job.future.set_result(None)
+        self._update_gauges()
+
+    def _release(self, job: Job, ok: bool) -> None:
+        entry = self._active.pop(job.seq, None)
+        if entry is None:
+            return
+        _, started, active_at_start = entry
+        if ok and job.duration > 0:
+            # Wall time is shared with the other jobs that ran alongside; scale to one lane
+            concurrency = max(self.parallelism, (active_at_start + len(self._active) + 1) / 2)
+            rtf = (time.monotonic() - started) * self.parallelism / concurrency / job.duration
+            self._rtf[job.quality] = 0.8 * self._rtf.get(job.quality, rtf) + 0.2 * rtf
+        self._dispatch()
+
+    def _update_gauges(self) -> None:
+        ADMISSION_QUEUE_DEPTH.set(self.queue.depth)
+        ADMISSION_ACTIVE_JOBS.set(len(self._active))
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.queue.policy,
+            "active": len(self._active),
+            "max_active": self.max_active,
+            "queued": self.queue.depth,
+            "queued_cost_seconds": round(self.queue.queued_cost, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "rtf": {q: round(v, 4) for q, v in self._rtf.items()},
+        }
+
+_parallelism = sum(DEVICE_SLOTS[d] for d in DEVICES)
+admission = AdmissionController(
+    max_active=MAX_ACTIVE_JOBS or 2 * _parallelism,
+    parallelism=_parallelism,
+    queue=SchedulingQueue(SCHEDULER_POLICY, SCHEDULER_AGING, QUALITY_WEIGHTS),
+    rtf=QUALITY_RTF,
+    timeout=TIMEOUT_SECONDS,
+)
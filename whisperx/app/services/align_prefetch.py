@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from app.core.config import ALIGN_PREFETCH
+from app.core.logging import get_logger
+from app.core.metrics import ALIGN_PREFETCH_OUTCOMES
+from app.services.model_manager import registry, get_align
+from app.services.process_pool import cpu_pool
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Alignment model prefetch
+# ----------------------------
+# The aligner is picked by language, which used to be known only after transcription.
+# Once the language is known early, its model loads here while transcription runs;
+# the registry's per-key load lock makes a late use_align() wait for this same load.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="align-prefetch")
+
+_OUTCOMES = ("ready", "waited", "wrong", "warm", "cold")
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {outcome: 0 for outcome in _OUTCOMES}
+
+def _load(language: str, device: str) -> None:
+    try:
+        get_align(language, device)
+    except Exception as e:
+        # No aligner for this language, OOM, ...: alignment raises it again in the request
+        logger.warning("Align prefetch failed language=%s device=%s: %s", language, device, e)
+
+class AlignPrefetch:
+    """Per-request handle: start loading the aligner for a language, then record how the guess fared."""
+
+    def __init__(self, device: str):
+        self.device = device
+        self.language: Optional[str] = None
+        self._future: Optional[Future] = None
+
+    @property
+    def active(self) -> bool:
+        """False when start() never loads anything on this device."""
+        # With the pool, aligners load inside the worker processes; one here would not be shared
+        return ALIGN_PREFETCH and not cpu_pool.serves(self.device)
+
+    def start(self, language: Optional[str]) -> None:
+        """Idempotent; only the first language given is prefetched."""
+        if not self.active or not language or self.language is not None:
+            return
+        self.language = language
+        if not registry.is_resident(("align", language, self.device)):
+            self._future = _executor.submit(_load, language, self.device)
+
+    def finish(self, language: str) -> str:
+        """Call right before aligning with the final language."""
+        if self.language is None:
+            outcome = "warm" if registry.is_resident(("align", language, self.device)) else "cold"
+        elif self.language != language:
+            outcome = "wrong"
+        elif self._future is None:
+            outcome = "warm"
+        else:
+            outcome = "ready" if self._future.done() else "waited"
+        with _stats_lock:
+            _stats[outcome] += 1
+        ALIGN_PREFETCH_OUTCOMES.labels(outcome).inc()
+        return outcome
+
+def prefetch_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    prefetched = stats["ready"] + stats["waited"] + stats["wrong"]
+    stats["enabled"] = ALIGN_PREFETCH
+    stats["guess_rate"] = round((stats["ready"] + stats["waited"]) / prefetched, 3) if prefetched else None
+    return stats
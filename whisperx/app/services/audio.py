@@ -1,9 +1,34 @@
+import io
 import os
 import tempfile
 import asyncio
 import subprocess
+import numpy as np
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Optional, Any, Union
 from fastapi import UploadFile, HTTPException
-from app.core.config import MAX_BYTES, MAX_UPLOAD_MB, MAX_AUDIO_DURATION
+from app.core.config import SAMPLE_RATE, MAX_BYTES, MAX_UPLOAD_MB, MAX_AUDIO_DURATION, INGEST_MODE
+from app.core.logging import get_logger
+from app.core.metrics import RequestMetrics
+from app.core import tracing
+from app.services.audio_headers import AudioHeader, parse_header
+
+try:
+    import soundfile  # FLAC fast path; comes with pyannote.audio
+except ImportError:
+    soundfile = None
+
+logger = get_logger("whisperx-services")
+
+# Containers whose index may sit at the end of the file (MP4 "moov"); ffmpeg needs to seek
+_SEEKABLE_ONLY_SUFFIXES = {".mp4", ".m4a", ".m4b", ".mov", ".3gp", ".m4v"}
+# ...recognized by content too, whatever the filename says: ISO-BMFF/QuickTime top-level boxes
+_SEEKABLE_ONLY_BOXES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"}
+_PIPE_READ_BYTES = 1024 * 1024
+_SNIFF_BYTES = 64 * 1024
+# Headerless little-endian float32, 16 kHz mono
+_RAW_FLOAT_SUFFIXES = {".f32"}
 
 async def get_audio_duration(path: str) -> float:
     """Get audio duration using ffprobe."""
@@ -36,8 +61,8 @@ async def get_audio_duration(path: str) -> float:
         # For production readiness, let's assume ffprobe is available (whisperx needs it).
         raise HTTPException(status_code=400, detail=f"Could not determine audio duration: {str(e)}")
 
-async def save_upload_to_tempfile(file: UploadFile) -> str:
-    """Stream upload to disk."""
+async def save_upload_to_tempfile(file: UploadFile, hasher: Optional[Any] = None) -> str:
+    """Stream upload to disk, feeding each chunk to `hasher` (hashlib object) if given."""
     suffix = os.path.splitext(file.filename or "")[1]
     
     # Use delete=False so we can read it, but we MUST ensure cleanup
@@ -56,6 +81,8 @@ async def save_upload_to_tempfile(file: UploadFile) -> str:
                 os.remove(tmp_path)
                 raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_MB} MB)")
             tmp.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
     except Exception:
         tmp.close()
         if os.path.exists(tmp_path):
@@ -65,3 +92,239 @@ async def save_upload_to_tempfile(file: UploadFile) -> str:
         tmp.close()
         
     return tmp_path
+
+def _duration_error(duration: float) -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"Audio duration {duration:.1f}s exceeds limit of {MAX_AUDIO_DURATION}s"
+    )
+
+# Bitrate x size estimates (CBR MP3 without a Xing header, Ogg Vorbis) only reject this far
+# past the limit; the decoder enforces the exact limit on everything else
+_ESTIMATE_MARGIN = 1.25
+
+def check_header_duration(header: Optional[AudioHeader]) -> None:
+    """Raise the 400 for MAX_AUDIO_DURATION if the container header already says it's too long."""
+    if header is None or not header.duration:
+        return
+    limit = MAX_AUDIO_DURATION * (_ESTIMATE_MARGIN if header.estimated else 1.0)
+    if header.duration > limit:
+        raise _duration_error(header.duration)
+
+async def decode_upload_stream(file: UploadFile, hasher: Optional[Any] = None) -> np.ndarray:
+    """
+    Feed the upload straight into one ffmpeg process and collect 16 kHz mono PCM.
+    Same ffmpeg arguments and int16 -> float32 scaling as whisperx.load_audio, so the
+    samples are identical; stops as soon as the decoded audio passes MAX_AUDIO_DURATION.
+    """
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not start ffmpeg: {str(e)}")
+
+    # np.empty only reserves address space; pages are committed as samples arrive
+    max_samples = int(MAX_AUDIO_DURATION * SAMPLE_RATE)
+    samples = np.empty(max_samples + 1, dtype=np.int16)
+    view = samples.view(np.uint8)
+
+    async def _feed():
+        total = 0
+        try:
+            while True:
+                chunk = await file.read(_PIPE_READ_BYTES)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_MB} MB)")
+                if hasher is not None:
+                    hasher.update(chunk)
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg gave up or we stopped reading; the return code tells us why
+        finally:
+            if not process.stdin.is_closing():
+                process.stdin.close()
+
+    feeder = asyncio.create_task(_feed())
+    stderr_reader = asyncio.create_task(process.stderr.read())
+    filled = 0
+    try:
+        while True:
+            data = await process.stdout.read(_PIPE_READ_BYTES)
+            if not data:
+                break
+            end = min(filled + len(data), view.nbytes)
+            view[filled:end] = np.frombuffer(data, dtype=np.uint8, count=end - filled)
+            filled = end
+            if filled >= view.nbytes:
+                raise _duration_error(filled / 2 / SAMPLE_RATE)
+
+        await feeder
+        await process.wait()
+        stderr = await stderr_reader
+        if process.returncode != 0:
+            raise HTTPException(status_code=400, detail=f"Could not decode audio: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        for task in (feeder, stderr_reader):
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # already surfaced above, or superseded by our own error
+
+    n = filled // 2
+    return samples[:n].astype(np.float32) / 32768.0
+
+@dataclass
+class IngestedAudio:
+    """Decoded samples (pipe ingest) or a temp file path for whisperx.load_audio."""
+    source: Union[str, np.ndarray]
+    duration: float
+    tmp_path: Optional[str] = None
+
+    def cleanup(self) -> None:
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                logger.warning("Failed to remove temp file: %s", self.tmp_path)
+
+# ----------------------------
+# Zero-subprocess fast path (16 kHz mono/stereo PCM WAV / FLAC, raw float32)
+# ----------------------------
+# The upload is read into memory (it is capped at MAX_BYTES) and viewed with numpy, not
+# memory-mapped. Anything needing resampling, or a downmix other than stereo, goes to ffmpeg.
+def _fast_path_eligible(header: AudioHeader) -> bool:
+    """Only inputs ffmpeg would not resample: 16 kHz, mono or stereo (downmixed below)."""
+    if header.container not in ("wav", "flac"):
+        return False
+    if header.sample_rate != SAMPLE_RATE or header.channels not in (1, 2):
+        return False
+    if header.container == "flac":
+        return soundfile is not None and header.bits_per_sample == 16
+    return (header.sample_format, header.bits_per_sample) in (("int", 16), ("float", 32))
+
+def _downmix(pcm: np.ndarray) -> np.ndarray:
+    """
+    Stereo to mono as swresample's default -ac 1 matrix does it: 0.5 L + 0.5 R, in float
+    for float input and in its Q15 integer path for int16 ((L + R + 1) >> 1).
+    """
+    if pcm.ndim == 1:
+        return pcm
+    if pcm.dtype == np.int16:
+        return ((pcm[:, 0].astype(np.int32) + pcm[:, 1] + 1) >> 1).astype(np.int16)
+    return pcm[:, 0] * np.float32(0.5) + pcm[:, 1] * np.float32(0.5)
+
+def _to_whisper_samples(pcm: np.ndarray) -> np.ndarray:
+    """
+    Match ffmpeg -f s16le -ac 1 + whisperx.load_audio sample for sample: stereo is downmixed
+    first, float input is quantized like swresample (clip(lrintf(x * 32768))), then
+    scaled by 1/32768.
+    """
+    pcm = _downmix(pcm)
+    if pcm.dtype != np.int16:
+        pcm = np.clip(np.rint(pcm.astype(np.float32) * np.float32(32768.0)), -32768, 32767).astype(np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+def _decode_pcm(data: bytearray, header: Optional[AudioHeader]) -> np.ndarray:
+    if header is None:  # raw float32
+        pcm = np.frombuffer(data, dtype="<f4", count=len(data) // 4)
+    elif header.container == "flac":
+        pcm, _ = soundfile.read(io.BytesIO(data), dtype="int16", always_2d=False)
+    else:
+        dtype = np.dtype("<f4" if header.sample_format == "float" else "<i2")
+        frames = (len(data) - header.data_offset) // (dtype.itemsize * header.channels)
+        if header.total_samples:
+            frames = min(frames, header.total_samples)
+        pcm = np.frombuffer(data, dtype=dtype, count=frames * header.channels, offset=header.data_offset)
+        if header.channels > 1:
+            pcm = pcm.reshape(frames, header.channels)
+    return _to_whisper_samples(pcm)
+
+async def _read_upload(file: UploadFile, hasher: Optional[Any] = None) -> bytearray:
+    data = bytearray()
+    while True:
+        chunk = await file.read(_PIPE_READ_BYTES)
+        if not chunk:
+            break
+        if len(data) + len(chunk) > MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_MB} MB)")
+        if hasher is not None:
+            hasher.update(chunk)
+        data += chunk
+    return data
+
+async def ingest_upload(
+    file: UploadFile,
+    hasher: Optional[Any] = None,
+    metrics: Optional[RequestMetrics] = None,
+    to_disk: bool = False,
+) -> IngestedAudio:
+    """
+    Receive the upload and enforce MAX_AUDIO_DURATION.
+    to_disk=True always keeps the bytes in a temp file (jobs API: decoded later, maybe after a restart).
+    16 kHz mono or stereo PCM WAV/FLAC and raw .f32 are decoded in-process with no subprocess;
+    other WAV/FLAC, MP3 with a Xing/VBRI frame count and faststart MP4 still get their
+    duration from the header. INGEST_MODE=pipe decodes
+    everything else while reading (no temp file, no ffprobe); containers that need
+    seeking (by extension or content), and INGEST_MODE=tempfile, use the temp file path.
+    With pipe ingest, upload time is folded into the "decode" stage.
+    """
+    stage = metrics.stage if metrics is not None else (lambda name: nullcontext())
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    head = await file.read(_SNIFF_BYTES)
+    await file.seek(0)
+    header = parse_header(head, getattr(file, "size", None))
+    check_header_duration(header)
+
+    fast_path = suffix in _RAW_FLOAT_SUFFIXES or (header is not None and _fast_path_eligible(header))
+    if fast_path and not to_disk:
+        with stage("upload"):
+            data = await _read_upload(file, hasher=hasher)
+        with stage("decode"):
+            audio = await tracing.to_thread(_decode_pcm, data, None if suffix in _RAW_FLOAT_SUFFIXES else header)
+        duration = len(audio) / SAMPLE_RATE
+        if duration > MAX_AUDIO_DURATION:
+            raise _duration_error(duration)
+        return IngestedAudio(source=audio, duration=duration)
+
+    needs_seeking = (
+        suffix in _SEEKABLE_ONLY_SUFFIXES
+        or head[4:8] in _SEEKABLE_ONLY_BOXES
+        or (header is not None and header.container == "mp4")
+    )
+    if INGEST_MODE == "pipe" and not needs_seeking and not to_disk:
+        with stage("decode"):
+            audio = await decode_upload_stream(file, hasher=hasher)
+        return IngestedAudio(source=audio, duration=len(audio) / SAMPLE_RATE)
+
+    with stage("upload"):
+        tmp_path = await save_upload_to_tempfile(file, hasher=hasher)
+    ingested = IngestedAudio(source=tmp_path, duration=0.0, tmp_path=tmp_path)
+    try:
+        if header is not None and header.duration and not header.estimated:
+            ingested.duration = header.duration
+        else:
+            with stage("probe"):
+                ingested.duration = await get_audio_duration(tmp_path)
+        if ingested.duration > MAX_AUDIO_DURATION:
+            raise _duration_error(ingested.duration)
+    except Exception:
+        ingested.cleanup()
+        raise
+    return ingested
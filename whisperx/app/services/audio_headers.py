@@ -0,0 +1,236 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+# ----------------------------
+# Container header parsing (no subprocess)
+# ----------------------------
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+@dataclass
+class AudioHeader:
+    """What the first bytes of an upload say about its stream."""
+    container: str                    # "wav" | "flac" | "mp3" | "mp4" | "ogg"
+    sample_rate: int                  # 0 if the header doesn't say (mp4)
+    channels: int
+    bits_per_sample: int              # 0 for compressed formats
+    sample_format: str                # "int" | "float" | "compressed"
+    total_samples: Optional[int]      # per channel; None if the header doesn't say
+    data_offset: Optional[int] = None  # WAV: start of the PCM "data" chunk
+    seconds: Optional[float] = None   # container-level duration (mp4 mvhd, bitrate estimates)
+    estimated: bool = False           # duration derived from bitrate and file size, not counted
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.seconds:
+            return self.seconds
+        if not self.total_samples or not self.sample_rate:
+            return None
+        return self.total_samples / self.sample_rate
+
+def parse_wav_header(head: bytes, total_size: Optional[int] = None) -> Optional[AudioHeader]:
+    """RIFF/WAVE: walk chunks up to "data". Needs "fmt " and the "data" header inside `head`."""
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    pos = 12
+    fmt = None
+    while pos + 8 <= len(head):
+        chunk_id = head[pos:pos + 4]
+        size = struct.unpack_from("<I", head, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            if body + 16 > len(head):
+                return None
+            tag, channels, rate, _, block_align, bits = struct.unpack_from("<HHIIHH", head, body)
+            if tag == _WAVE_FORMAT_EXTENSIBLE and size >= 26 and body + 26 <= len(head):
+                tag = struct.unpack_from("<H", head, body + 24)[0]  # first 2 bytes of SubFormat GUID
+            fmt = (tag, channels, rate, block_align, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            tag, channels, rate, block_align, bits = fmt
+            if tag not in (_WAVE_FORMAT_PCM, _WAVE_FORMAT_IEEE_FLOAT) or not block_align:
+                return None
+            # Streamed WAVs write 0 / 0xFFFFFFFF as the data size; fall back to the file size
+            if size in (0, 0xFFFFFFFF) and total_size is not None:
+                size = total_size - body
+            total = size // block_align if size not in (0, 0xFFFFFFFF) else None
+            return AudioHeader(
+                container="wav",
+                sample_rate=rate,
+                channels=channels,
+                bits_per_sample=bits,
+                sample_format="float" if tag == _WAVE_FORMAT_IEEE_FLOAT else "int",
+                total_samples=total,
+                data_offset=body,
+            )
+        pos = body + size + (size & 1)
+    return None
+
+def parse_flac_header(head: bytes) -> Optional[AudioHeader]:
+    """FLAC: the mandatory first metadata block is STREAMINFO."""
+    if len(head) < 42 or head[:4] != b"fLaC" or (head[4] & 0x7F) != 0:
+        return None
+    packed = int.from_bytes(head[18:26], "big")  # sr:20 | channels-1:3 | bps-1:5 | total:36
+    return AudioHeader(
+        container="flac",
+        sample_rate=packed >> 44,
+        channels=((packed >> 41) & 0x7) + 1,
+        bits_per_sample=((packed >> 36) & 0x1F) + 1,
+        sample_format="int",
+        total_samples=(packed & ((1 << 36) - 1)) or None,
+    )
+
+# MPEG audio frame header tables, indexed by the header's version bits (3 = MPEG-1,
+# 2 = MPEG-2, 0 = MPEG-2.5) and layer bits (3 = Layer I, 2 = Layer II, 1 = Layer III)
+_MPEG_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_MPEG1_KBPS = {
+    3: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+}
+_MPEG2_KBPS = {
+    3: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    1: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SYNC_SEARCH = 4096  # junk/padding tolerated between the ID3 tag and the first frame
+
+def _mpeg_frame(head: bytes, pos: int) -> Optional[tuple]:
+    """(version, layer, kbps, sample_rate, channels, samples_per_frame, frame_bytes) at pos."""
+    if pos + 4 > len(head) or head[pos] != 0xFF or (head[pos + 1] & 0xE0) != 0xE0:
+        return None
+    version = (head[pos + 1] >> 3) & 0x3
+    layer = (head[pos + 1] >> 1) & 0x3
+    bitrate_index = head[pos + 2] >> 4
+    rate_index = (head[pos + 2] >> 2) & 0x3
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # reserved, or free-format bitrate
+    kbps = (_MPEG1_KBPS if version == 3 else _MPEG2_KBPS)[layer][bitrate_index]
+    rate = _MPEG_RATES[version][rate_index]
+    padding = (head[pos + 2] >> 1) & 0x1
+    channels = 1 if (head[pos + 3] >> 6) == 3 else 2
+    if layer == 3:
+        samples, size = 384, (12 * kbps * 1000 // rate + padding) * 4
+    else:
+        samples = 576 if (layer == 1 and version != 3) else 1152
+        size = samples // 8 * kbps * 1000 // rate + padding
+    return version, layer, kbps, rate, channels, samples, size
+
+def parse_mp3_header(head: bytes, total_size: Optional[int] = None) -> Optional[AudioHeader]:
+    """
+    MP3: skip an ID3v2 tag, find the first frame (checked against the next frame's sync)
+    and read the frame count from a Xing/Info or VBRI header. CBR files without one get a
+    bitrate x size estimate.
+    """
+    start = 0
+    if head[:3] == b"ID3" and len(head) >= 10:
+        size = 0
+        for byte in head[6:10]:
+            size = (size << 7) | (byte & 0x7F)  # syncsafe
+        start = 10 + size + (10 if head[5] & 0x10 else 0)
+    elif not head[:2] or head[0] != 0xFF:
+        return None
+    for pos in range(start, min(len(head) - 4, start + _MP3_SYNC_SEARCH)):
+        frame = _mpeg_frame(head, pos)
+        if frame is None:
+            continue
+        nxt = pos + frame[6]
+        if nxt + 4 <= len(head) and _mpeg_frame(head, nxt) is None:
+            continue  # false sync inside other data
+        break
+    else:
+        return None
+    version, layer, kbps, rate, channels, samples, _ = frame
+    header = AudioHeader(container="mp3", sample_rate=rate, channels=channels, bits_per_sample=0,
+                         sample_format="compressed", total_samples=None)
+    if layer == 1:
+        side_info = (32 if channels == 2 else 17) if version == 3 else (17 if channels == 2 else 9)
+        xing = pos + 4 + side_info
+        if head[xing:xing + 4] in (b"Xing", b"Info") and xing + 12 <= len(head):
+            flags = struct.unpack_from(">I", head, xing + 4)[0]
+            if flags & 0x1:
+                header.total_samples = struct.unpack_from(">I", head, xing + 8)[0] * samples
+                return header
+        vbri = pos + 36
+        if head[vbri:vbri + 4] == b"VBRI" and vbri + 18 <= len(head):
+            header.total_samples = struct.unpack_from(">I", head, vbri + 14)[0] * samples
+            return header
+    if total_size is not None and kbps:
+        header.seconds = (total_size - pos) * 8 / (kbps * 1000)
+        header.estimated = True
+    return header
+
+def _mp4_boxes(data: bytes, pos: int, end: int):
+    """(type, body_start, body_end) of each box in data[pos:end]; stops at a truncated header."""
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        body = pos + 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            body = pos + 16
+        elif size == 0:
+            size = end - pos
+        if size < body - pos:
+            return
+        yield kind, body, pos + size
+        pos += size
+
+def parse_mp4_header(head: bytes) -> Optional[AudioHeader]:
+    """
+    MP4/M4A/MOV: duration from moov/mvhd when the index comes before the media data
+    ("faststart"). Without it the container is still identified, with no duration.
+    """
+    if len(head) < 12 or head[4:8] != b"ftyp":
+        return None
+    header = AudioHeader(container="mp4", sample_rate=0, channels=0, bits_per_sample=0,
+                         sample_format="compressed", total_samples=None)
+    for kind, body, box_end in _mp4_boxes(head, 0, len(head)):
+        if kind == b"mdat":
+            break  # moov is after the media data
+        if kind != b"moov":
+            continue
+        for child, child_body, _ in _mp4_boxes(head, body, min(box_end, len(head))):
+            if child != b"mvhd" or child_body + 32 > len(head):
+                continue
+            if head[child_body] == 1:
+                timescale, duration = struct.unpack_from(">IQ", head, child_body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", head, child_body + 12)
+            if timescale and duration not in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                header.seconds = duration / timescale
+            break
+        break
+    return header
+
+def parse_ogg_header(head: bytes, total_size: Optional[int] = None) -> Optional[AudioHeader]:
+    """
+    Ogg Vorbis/Opus: stream parameters from the identification packet on the first page.
+    The exact length is only in the last page, so Vorbis gets a nominal-bitrate estimate.
+    """
+    if len(head) < 28 or head[:4] != b"OggS":
+        return None
+    packet = 27 + head[26]
+    if head[packet:packet + 7] == b"\x01vorbis" and packet + 28 <= len(head):
+        channels = head[packet + 11]
+        rate, _, nominal = struct.unpack_from("<Iii", head, packet + 12)
+        header = AudioHeader(container="ogg", sample_rate=rate, channels=channels, bits_per_sample=0,
+                             sample_format="compressed", total_samples=None)
+        if total_size is not None and nominal > 0:
+            header.seconds = total_size * 8 / nominal
+            header.estimated = True
+        return header
+    if head[packet:packet + 8] == b"OpusHead" and packet + 19 <= len(head):
+        return AudioHeader(container="ogg", sample_rate=48000, channels=head[packet + 9], bits_per_sample=0,
+                           sample_format="compressed", total_samples=None)
+    return None
+
+def parse_header(head: bytes, total_size: Optional[int] = None) -> Optional[AudioHeader]:
+    return (
+        parse_wav_header(head, total_size) or parse_flac_header(head) or parse_mp4_header(head)
+        or parse_ogg_header(head, total_size) or parse_mp3_header(head, total_size)
+    )
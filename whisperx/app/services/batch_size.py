@@ -0,0 +1,117 @@
+import threading
+from typing import Dict, Tuple
+from app.core.boot import oom_errors
+from app.core.config import ADAPTIVE_BATCH_SIZE, MAX_BATCH_SIZE
+from app.core.logging import get_logger
+from app.core.metrics import BATCH_SIZE_CURRENT, BATCH_SIZE_ADJUSTMENTS
+from app.services.device_profile import calibrated_batch_size
+from app.services.model_manager import registry, _cuda_cleanup
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Adaptive batch size (per model + device)
+# ----------------------------
+# Rough activation memory per in-flight 30s chunk, as a fraction of the model's
+# resident footprint (encoder activations scale with model width).
+_ITEM_FRACTION = 0.125
+_MIN_ITEM_BYTES = 64 * 1024**2
+# Successful runs at the remembered size before trying twice as large again
+_GROW_AFTER = 50
+
+def is_oom(exc: BaseException) -> bool:
+    """torch OOM, or ctranslate2's RuntimeError("... out of memory")."""
+    if isinstance(exc, oom_errors()):
+        return True
+    return isinstance(exc, RuntimeError) and "out of memory" in str(exc).lower()
+
+class _Sizer:
+    def __init__(self, model_name: str, device: str):
+        self.model_name = model_name
+        self.device = device
+        self.remembered = calibrated_batch_size(model_name, device)
+        self.ceiling = MAX_BATCH_SIZE
+        self.successes = 0
+        BATCH_SIZE_CURRENT.labels(model_name, device).set(self.remembered)
+
+    def _memory_cap(self, kind: str) -> int:
+        import torch
+        if not (self.device.startswith("cuda") and torch.cuda.is_available()):
+            return self.ceiling
+        free, _ = torch.cuda.mem_get_info(torch.device(self.device))
+        model_bytes = registry.size_bytes((kind, self.model_name, self.device))
+        per_item = max(_MIN_ITEM_BYTES, int(model_bytes * _ITEM_FRACTION))
+        return max(1, free // per_item)
+
+    def choose(self, n_items: int, kind: str) -> int:
+        return max(1, min(self.remembered, self.ceiling, n_items, self._memory_cap(kind)))
+
+    def succeeded(self, batch_size: int) -> None:
+        if batch_size < self.remembered:
+            return  # limited by chunk count or free memory, says nothing about the model
+        self.successes += 1
+        if self.successes >= _GROW_AFTER and self.remembered < self.ceiling:
+            self._set(min(self.ceiling, self.remembered * 2), "up")
+
+    def failed(self, batch_size: int) -> int:
+        """OOM at batch_size: remember half of it and return the size to retry with."""
+        smaller = max(1, batch_size // 2)
+        if smaller < self.remembered:
+            self._set(smaller, "down")
+        return smaller
+
+    def _set(self, value: int, direction: str) -> None:
+        logger.warning("Batch size model=%s device=%s %d -> %d", self.model_name, self.device, self.remembered, value)
+        self.remembered = value
+        self.successes = 0
+        BATCH_SIZE_CURRENT.labels(self.model_name, self.device).set(value)
+        BATCH_SIZE_ADJUSTMENTS.labels(self.model_name, direction).inc()
+
+_lock = threading.Lock()
+_sizers: Dict[Tuple[str, str], _Sizer] = {}
+
+def _sizer(model_name: str, device: str) -> _Sizer:
+    with _lock:
+        key = (model_name, device)
+        if key not in _sizers:
+            _sizers[key] = _Sizer(model_name, device)
+        return _sizers[key]
+
+def target_batch_size(model_name: str, device: str) -> int:
+    """Chunks worth collecting before a shared decode (the remembered size)."""
+    if not ADAPTIVE_BATCH_SIZE:
+        return calibrated_batch_size(model_name, device)
+    return _sizer(model_name, device).remembered
+
+def run_with_backoff(model_name: str, device: str, n_items: int, fn, kind: str = "whisper"):
+    """
+    Blocking: call fn(batch_size), halving batch_size on OOM until it fits or reaches 1.
+    fn must be safe to call again after an OOM (resume or restart its work).
+    A final OOM is re-raised as torch.cuda.OutOfMemoryError.
+    """
+    if not ADAPTIVE_BATCH_SIZE:
+        return fn(calibrated_batch_size(model_name, device))
+    sizer = _sizer(model_name, device)
+    with _lock:
+        batch_size = sizer.choose(n_items, kind)
+    while True:
+        try:
+            result = fn(batch_size)
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            _cuda_cleanup()
+            if batch_size == 1:
+                import torch
+                raise e if isinstance(e, torch.cuda.OutOfMemoryError) else torch.cuda.OutOfMemoryError(str(e))
+            with _lock:
+                batch_size = sizer.failed(batch_size)
+            logger.warning("OOM model=%s device=%s; retrying at batch_size=%d", model_name, device, batch_size)
+            continue
+        with _lock:
+            sizer.succeeded(batch_size)
+        return result
+
+def batch_size_snapshot() -> Dict[str, int]:
+    with _lock:
+        return {f"{k[0]}@{k[1]}": s.remembered for k, s in _sizers.items()}
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import contextvars
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from app.core.config import SAMPLE_RATE, BATCH_WAIT_MS
+from app.core.logging import get_logger
+from app.services.executor import run_inference, gpu_slot
+from app.services.model_manager import inference_mode, use_whisper
+from app.services.batch_size import run_with_backoff, target_batch_size
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Cross-request dynamic batching
+# ----------------------------
+# FasterWhisperPipeline.transcribe() runs VAD and then decodes the VAD chunks of a
+# single file in batches of BATCH_SIZE. Short clips only fill part of a batch, so
+# here the decode step is pulled out: each request contributes its VAD chunks, and
+# one scheduler per model decodes chunks from all waiting requests together.
+# transcribe() swaps the model's tokenizer and suppress_tokens in place for the length of
+# the call; the decode here builds its own per call instead, so batches in different
+# languages (and a windowed decode running beside them) can share one model. Whatever
+# still goes through transcribe() holds whisper_lock(model).
+
+@dataclass
+class _PendingChunks:
+    language: str
+    chunks: List[Any]
+    future: "asyncio.Future[List[str]]"
+
+def vad_segments(model, audio, chunk_size: int = 30) -> List[dict]:
+    """Same VAD + merge step FasterWhisperPipeline.transcribe() uses."""
+    import torch
+    from whisperx.vad import merge_chunks
+
+    segments = model.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
+    return merge_chunks(
+        segments,
+        chunk_size,
+        onset=model._vad_params["vad_onset"],
+        offset=model._vad_params["vad_offset"],
+    )
+
+_locks: "weakref.WeakKeyDictionary[Any, threading.Lock]" = weakref.WeakKeyDictionary()
+_locks_guard = threading.Lock()
+
+def whisper_lock(model) -> threading.Lock:
+    """Held around transcribe() and while reading the options it swaps, per model object."""
+    with _locks_guard:
+        lock = _locks.get(model)
+        if lock is None:
+            lock = _locks[model] = threading.Lock()
+        return lock
+
+def _decode_options(model, language: str) -> Tuple[Any, Any]:
+    """(tokenizer, options) transcribe() would decode language with, without touching the model."""
+    from faster_whisper.tokenizer import Tokenizer
+    from whisperx.asr import find_numeral_symbol_tokens
+
+    with whisper_lock(model):
+        options = model.options
+    tokenizer = Tokenizer(
+        model.model.hf_tokenizer,
+        model.model.model.is_multilingual,
+        task="transcribe",
+        language=language,
+    )
+    if model.suppress_numerals:
+        suppress = list(set(find_numeral_symbol_tokens(tokenizer) + options.suppress_tokens))
+        options = options._replace(suppress_tokens=suppress)
+    return tokenizer, options
+
+def _iter_texts(model, tokenizer, options, chunks: List[Any], batch_size: int) -> Iterator[str]:
+    """
+    Blocking: Whisper's text for each chunk in order, batch_size chunks per forward pass.
+    The pipeline's own preprocess and generate call, with this call's tokenizer and options.
+    """
+    import torch
+
+    batch_size = max(1, batch_size)
+    for start in range(0, len(chunks), batch_size):
+        features = torch.stack([model.preprocess({"inputs": c})["inputs"] for c in chunks[start:start + batch_size]])
+        yield from model.model.generate_segment_batched(features, tokenizer, options)
+
+def decode_chunks(model_name: str, device: str, language: str, chunks: List[Any]) -> List[str]:
+    """Blocking: decode a list of audio chunks in adaptively sized batches."""
+    with inference_mode(), use_whisper(model_name, device) as model:
+        tokenizer, options = _decode_options(model, language)
+        texts: List[str] = []
+
+        def _run(batch_size: int) -> List[str]:
+            # After an OOM, resume with the chunks not decoded yet
+            for text in _iter_texts(model, tokenizer, options, chunks[len(texts):], batch_size):
+                texts.append(text)
+            return texts
+
+        return run_with_backoff(model_name, device, len(chunks), _run)
+
+class BatchScheduler:
+    """Collects VAD chunks for one Whisper model on one device and decodes them in shared batches."""
+
+    def __init__(self, model_name: str, device: str):
+        self.model_name = model_name
+        self.device = device
+        self._queue: "asyncio.Queue[_PendingChunks]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def decode(self, audio, segments: List[dict], language: str) -> List[str]:
+        """Submit one request's VAD chunks; resolves with one text per chunk, in order."""
+        if not segments:
+            return []
+        chunks = [audio[int(s["start"] * SAMPLE_RATE):int(s["end"] * SAMPLE_RATE)] for s in segments]
+        future = asyncio.get_running_loop().create_future()
+        if self._task is None or self._task.done():
+            # Own empty context: batches serve many requests, not the one that started the loop
+            self._task = contextvars.Context().run(asyncio.create_task, self._run())
+        await self._queue.put(_PendingChunks(language=language, chunks=chunks, future=future))
+        return await future
+
+    async def _gather(self) -> List[_PendingChunks]:
+        """Wait for one item, then keep collecting until a batch is full or BATCH_WAIT_MS passes."""
+        loop = asyncio.get_running_loop()
+        pending = [await self._queue.get()]
+        count = len(pending[0].chunks)
+        deadline = loop.time() + BATCH_WAIT_MS / 1000.0
+        target = target_batch_size(self.model_name, self.device)
+        while count < target:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            count += len(item.chunks)
+        # Anything else already queued rides along for free
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        return pending
+
+    async def _run(self) -> None:
+        while True:
+            pending = await self._gather()
+
+            # Tokenizer (and so the decode prompt) is per-language
+            by_language: Dict[str, List[_PendingChunks]] = {}
+            for item in pending:
+                if not item.future.cancelled():
+                    by_language.setdefault(item.language, []).append(item)
+
+            for language, items in by_language.items():
+                chunks = [c for item in items for c in item.chunks]
+                logger.info(
+                    "Batch decode model=%s device=%s language=%s requests=%d chunks=%d",
+                    self.model_name, self.device, language, len(items), len(chunks),
+                )
+                try:
+                    async with gpu_slot(self.device):
+                        texts = await run_inference(
+                            decode_chunks, self.model_name, self.device, language, chunks, device=self.device
+                        )
+                except Exception as e:
+                    for item in items:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+
+                offset = 0
+                for item in items:
+                    n = len(item.chunks)
+                    if not item.future.done():
+                        item.future.set_result(texts[offset:offset + n])
+                    offset += n
+
+_schedulers: Dict[Tuple[str, str], BatchScheduler] = {}
+
+def get_scheduler(model_name: str, device: str) -> BatchScheduler:
+    key = (model_name, device)
+    if key not in _schedulers:
+        _schedulers[key] = BatchScheduler(model_name, device)
+    return _schedulers[key]
@@ -0,0 +1,206 @@
+import re
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from app.core.config import (
+    SAMPLE_RATE, MODEL_MAP, DEVICES, MAX_BATCH_SIZE, CPU_PROCESSES, CPU_THREADS_PER_PROCESS,
+    CALIBRATION_AUDIO, CALIBRATION_SECONDS, CALIBRATION_LANGUAGE, CALIBRATION_BATCH_SIZES,
+    CALIBRATION_MAX_WER, CALIBRATION_MIN_FREE,
+)
+from app.core.boot import apply_fixes
+from app.core.logging import get_logger
+from app.services.batching import _decode_options, _iter_texts
+from app.services.batch_size import is_oom
+from app.services.device_profile import device_profile, fingerprint, profile_device
+from app.services.model_manager import inference_mode, _cuda_cleanup, _ctranslate2_device
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Compute type + batch size calibration (calibrate.py, CALIBRATE_ON_BOOT)
+# ----------------------------
+# For each Whisper model and device: load the model once per compute type the device
+# supports, decode copies of one clip at growing batch sizes, and keep the setting with
+# the lowest time per chunk. A setting is rejected when it runs out of memory, leaves
+# less than CALIBRATION_MIN_FREE of the GPU free, or transcribes the clip further than
+# CALIBRATION_MAX_WER from the reference (the most precise compute type that runs, at
+# batch size 1). The synthetic default clip only shows that settings agree with each
+# other; set CALIBRATION_AUDIO to a real speech clip for a meaningful quality guard.
+COMPUTE_TYPES = ("float32", "float16", "int8_float16", "int8")  # most precise first
+
+def synthetic_clip(seconds: float, seed: int = 0) -> np.ndarray:
+    """Speech-like test signal: voiced harmonics under a syllable-rate envelope, with pauses."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)   # ~4 per second
+    phrases = np.sin(2 * np.pi * 0.25 * t) > -0.6             # a pause every 4 s
+    audio = 0.3 * voiced / np.abs(voiced).max() * syllables * phrases + rng.normal(0, 0.01, len(t))
+    return audio.astype(np.float32)
+
+def load_clip() -> np.ndarray:
+    """CALIBRATION_SECONDS of CALIBRATION_AUDIO, or of the synthetic signal."""
+    if CALIBRATION_AUDIO:
+        import whisperx
+        return whisperx.load_audio(CALIBRATION_AUDIO)[:int(CALIBRATION_SECONDS * SAMPLE_RATE)]
+    return synthetic_clip(CALIBRATION_SECONDS)
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[\w']+", text.lower())
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance over the reference length; 1.0 if only the reference is empty."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def _supported(device: str) -> List[str]:
+    import ctranslate2
+    kind, index = _ctranslate2_device(device)
+    supported = ctranslate2.get_supported_compute_types(kind, index)
+    return [c for c in COMPUTE_TYPES if c in supported]
+
+def _load(model_name: str, device: str, compute_type: str):
+    """Like model_manager._load_whisper, but outside the registry and with the given compute type."""
+    import whisperx
+    kind, index = _ctranslate2_device(device)
+    if CPU_PROCESSES and device == "cpu":
+        return whisperx.load_model(model_name, kind, device_index=index, compute_type=compute_type,
+                                   threads=CPU_THREADS_PER_PROCESS)
+    return whisperx.load_model(model_name, kind, device_index=index, compute_type=compute_type)
+
+def _free_fraction(device: str) -> Optional[float]:
+    if not device.startswith("cuda"):
+        return None
+    import torch
+    free, total = torch.cuda.mem_get_info(torch.device(device))
+    return free / total
+
+def _sweep(model, decode: tuple, device: str, compute_type: str, clip: np.ndarray, reference: str,
+           sizes: List[int], candidates: List[dict]) -> None:
+    """Blocking: time growing batch sizes for one loaded model, appending a candidate per size."""
+    previous = None
+    for batch_size in sizes:
+        chunks = [clip] * max(2, batch_size)
+        try:
+            t0 = time.perf_counter()
+            texts = list(_iter_texts(model, *decode, chunks, batch_size))
+            per_chunk = (time.perf_counter() - t0) / len(chunks)
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            _cuda_cleanup()
+            candidates.append({"compute_type": compute_type, "batch_size": batch_size, "status": "oom"})
+            return
+        wer = max(word_error_rate(reference, text) for text in texts)
+        free = _free_fraction(device)
+        status = "ok"
+        if wer > CALIBRATION_MAX_WER:
+            status = "quality"
+        elif free is not None and free < CALIBRATION_MIN_FREE:
+            status = "memory"
+        candidates.append({
+            "compute_type": compute_type,
+            "batch_size": batch_size,
+            "status": status,
+            "seconds_per_chunk": round(per_chunk, 4),
+            "wer": round(wer, 3),
+            "free_fraction": round(free, 3) if free is not None else None,
+        })
+        logger.info("Calibration %s compute_type=%s batch_size=%d: %.3fs/chunk wer=%.3f %s",
+                    device, compute_type, batch_size, per_chunk, wer, status)
+        if status != "ok" or (previous is not None and per_chunk >= previous):
+            return  # larger batches won't fit, won't fix the output, or stopped paying off
+        previous = per_chunk
+
+def calibrate_model(model_name: str, device: str, clip: np.ndarray) -> Optional[dict]:
+    """Blocking: benchmark one model on one device; the chosen setting (with every candidate) or None."""
+    sizes = sorted({b for b in CALIBRATION_BATCH_SIZES if 1 <= b <= MAX_BATCH_SIZE}) or [1]
+    reference: Optional[str] = None
+    reference_type: Optional[str] = None
+    candidates: List[dict] = []
+    for compute_type in _supported(device):
+        try:
+            model = _load(model_name, device, compute_type)
+        except Exception as e:
+            logger.warning("Calibration %s: loading %s as %s failed: %s", device, model_name, compute_type, e)
+            candidates.append({"compute_type": compute_type, "batch_size": None,
+                               "status": "oom" if is_oom(e) else "error"})
+            _cuda_cleanup()
+            continue
+        try:
+            with inference_mode():
+                decode = _decode_options(model, CALIBRATION_LANGUAGE)
+                # Untimed first pass: kernel setup and allocator growth; also the reference output
+                first = next(_iter_texts(model, *decode, [clip], 1))
+                if reference is None:
+                    reference, reference_type = first, compute_type
+                _sweep(model, decode, device, compute_type, clip, reference, sizes, candidates)
+        except Exception as e:
+            logger.warning("Calibration %s: %s as %s failed: %s", device, model_name, compute_type, e)
+            candidates.append({"compute_type": compute_type, "batch_size": None,
+                               "status": "oom" if is_oom(e) else "error"})
+        finally:
+            del model
+            _cuda_cleanup()
+
+    usable = [c for c in candidates if c["status"] == "ok"]
+    if not usable:
+        return None
+    best = min(usable, key=lambda c: (c["seconds_per_chunk"], c["batch_size"]))
+    return {
+        "compute_type": best["compute_type"],
+        "batch_size": best["batch_size"],
+        "seconds_per_chunk": best["seconds_per_chunk"],
+        "reference_compute_type": reference_type,
+        "reference_text": reference,
+        "clip": CALIBRATION_AUDIO or "synthetic",
+        "clip_seconds": round(len(clip) / SAMPLE_RATE, 2),
+        "calibrated_at": time.time(),
+        "candidates": candidates,
+    }
+
+def calibrate(models: Optional[List[str]] = None, devices: Optional[List[str]] = None,
+              force: bool = False) -> Dict[str, Dict[str, Optional[dict]]]:
+    """
+    Blocking: calibrate each model (default: all of MODEL_MAP) on each device (default:
+    DEVICES, one per physical device) that has no entry for this hardware yet, or all of
+    them with force; each result is saved to the profile as soon as it is chosen.
+    Returns {device: {model: entry or None}}.
+    """
+    apply_fixes()
+    models = models or list(dict.fromkeys(MODEL_MAP.values()))
+    physical: Dict[str, str] = {}
+    for device in devices or DEVICES:
+        physical.setdefault(profile_device(device), device)
+    clip = load_clip()
+
+    results: Dict[str, Dict[str, Optional[dict]]] = {}
+    for key, device in physical.items():
+        logger.info("Calibrating %s (%s) for %s", key, fingerprint(device), ", ".join(models))
+        results[key] = {}
+        for model_name in models:
+            existing = None if force else device_profile.get(model_name, device)
+            if existing is not None:
+                results[key][model_name] = existing
+                continue
+            t0 = time.perf_counter()
+            entry = calibrate_model(model_name, device, clip)
+            results[key][model_name] = entry
+            if entry is None:
+                logger.warning("Calibration %s model=%s: no setting passed; keeping the defaults", key, model_name)
+                continue
+            device_profile.put(model_name, device, entry)
+            logger.info("Calibration %s model=%s: compute_type=%s batch_size=%d (%.3fs/chunk) in %.0fs",
+                        key, model_name, entry["compute_type"], entry["batch_size"],
+                        entry["seconds_per_chunk"], time.perf_counter() - t0)
+    return results
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import Optional, List, Tuple
+from app.core.config import CHECKPOINT_DIR, CHECKPOINT_TTL_SECONDS
+from app.core.logging import get_logger
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Per-window checkpoints for long recordings
+# ----------------------------
+# A run is keyed by the upload hash + model/language/window size; each window of VAD
+# chunks is stored as <dir>/<key>/<index>.json once it has been decoded and aligned,
+# with the decoded (pre-alignment) segments alongside for the segment store.
+def make_key(content_sha256: str, model_name: str, language: Optional[str], window_chunks: int) -> str:
+    raw = "|".join([content_sha256, model_name, language or "auto", str(window_chunks)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _json_default(value):
+    return float(value)  # numpy scalars in align output
+
+class CheckpointStore:
+    """Raw + aligned output per window, written atomically; whole runs expire after ttl_seconds."""
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.enabled = bool(directory)
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._purge_expired()
+
+    def _path(self, key: str, index: int) -> str:
+        return os.path.join(self.directory, key, f"{index}.json")
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load(self, key: str, index: int, bounds: List[float]) -> Optional[Tuple[List[dict], dict]]:
+        """Blocking: the window's (raw segments, aligned output), if saved for the same chunk boundaries."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(key, index), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable checkpoint %s/%d", key, index)
+            return None
+        if saved.get("bounds") != bounds or "raw" not in saved:
+            return None
+        return saved["raw"], saved["aligned"]
+
+    def save(self, key: str, index: int, bounds: List[float], raw: List[dict], aligned: dict) -> None:
+        """Blocking."""
+        if not self.enabled:
+            return
+        path = self._path(key, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"bounds": bounds, "raw": raw, "aligned": aligned}, f, default=_json_default)
+        os.replace(tmp, path)
+
+    def clear(self, key: str) -> None:
+        """Blocking: drop a finished run (its result lives in the result cache)."""
+        if self.enabled:
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+checkpoints = CheckpointStore(CHECKPOINT_DIR, CHECKPOINT_TTL_SECONDS)
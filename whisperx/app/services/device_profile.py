@@ -0,0 +1,133 @@
+import os
+import json
+import threading
+from typing import Dict, Optional, Set
+from app.core.config import (
+    CALIBRATION_PROFILE, BATCH_SIZE, MAX_BATCH_SIZE, CPU_PROCESSES, CPU_THREADS_PER_PROCESS, compute_type_for,
+)
+from app.core.logging import get_logger
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Calibrated settings per device (written by calibration.py)
+# ----------------------------
+# CALIBRATION_PROFILE maps each device to the hardware it was measured on and, per
+# Whisper model, the chosen compute type and batch size. Entries measured on other
+# hardware (another GPU behind cuda:0, another CPU or thread count, another
+# CTranslate2 build) are ignored, so a profile can't follow the image to the wrong box.
+_fingerprints: Dict[str, str] = {}
+_fingerprints_lock = threading.Lock()
+
+def profile_device(device: str) -> str:
+    """Simulated "cpu:N" devices share one CPU entry; GPUs are keyed by index."""
+    kind, _, index = device.partition(":")
+    return "cpu" if kind != "cuda" else f"cuda:{index or 0}"
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return "unknown cpu"
+
+def fingerprint(device: str) -> str:
+    """Hardware + CTranslate2 version behind device (imports torch for GPUs)."""
+    key = profile_device(device)
+    with _fingerprints_lock:
+        if key in _fingerprints:
+            return _fingerprints[key]
+    try:
+        import ctranslate2
+        ct2 = ctranslate2.__version__
+    except ImportError:
+        ct2 = "unknown"
+    if key == "cpu":
+        threads = CPU_THREADS_PER_PROCESS if CPU_PROCESSES else os.cpu_count()
+        hardware = f"{_cpu_model()} x{threads} threads"
+    else:
+        import torch
+        props = torch.cuda.get_device_properties(int(key.split(":")[1]))
+        hardware = f"{props.name} {props.total_memory // 1024**2} MB"
+    value = f"{hardware} | ctranslate2 {ct2}"
+    with _fingerprints_lock:
+        _fingerprints[key] = value
+    return value
+
+class DeviceProfile:
+    """The calibration profile file, read lazily and rewritten atomically on every update."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.enabled = bool(path)
+        self._lock = threading.Lock()
+        self._data: Optional[dict] = None
+        self._mismatched: Set[str] = set()  # devices already warned about
+
+    def _load_locked(self) -> dict:
+        if self._data is None:
+            self._data = {"devices": {}}
+            if self.enabled:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._data = json.load(f)
+                    logger.info("Calibration profile %s: %s", self.path, ", ".join(self._data.get("devices", {})) or "empty")
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError) as e:
+                    logger.warning("Ignoring unreadable calibration profile %s: %s", self.path, e)
+        return self._data
+
+    def get(self, model_name: str, device: str) -> Optional[dict]:
+        """Calibrated {"compute_type", "batch_size", ...} for this hardware, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._load_locked().get("devices", {}).get(profile_device(device))
+        if entry is None or model_name not in entry.get("models", {}):
+            return None
+        if entry.get("fingerprint") != fingerprint(device):
+            if profile_device(device) not in self._mismatched:
+                self._mismatched.add(profile_device(device))
+                logger.warning("Calibration for %s was measured on %s, not %s; ignoring it",
+                               profile_device(device), entry.get("fingerprint"), fingerprint(device))
+            return None
+        return entry["models"][model_name]
+
+    def put(self, model_name: str, device: str, result: dict) -> None:
+        """Blocking: store one model's calibration for device and write the file."""
+        if not self.enabled:
+            return
+        hardware = fingerprint(device)
+        with self._lock:
+            data = self._load_locked()
+            entry = data.setdefault("devices", {}).get(profile_device(device))
+            if entry is None or entry.get("fingerprint") != hardware:
+                entry = data["devices"][profile_device(device)] = {"fingerprint": hardware, "models": {}}
+            entry["models"][model_name] = result
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, self.path)
+
+device_profile = DeviceProfile(CALIBRATION_PROFILE)
+
+def calibrated_compute_type(model_name: str, device: str) -> str:
+    """COMPUTE_TYPE if set explicitly, else the calibrated one, else float16 on GPUs / int8 on CPUs."""
+    if os.getenv("COMPUTE_TYPE"):
+        return compute_type_for(device)
+    entry = device_profile.get(model_name, device)
+    return entry["compute_type"] if entry is not None else compute_type_for(device)
+
+def calibrated_batch_size(model_name: str, device: str) -> int:
+    """BATCH_SIZE if set explicitly, else the calibrated one (up to MAX_BATCH_SIZE), else BATCH_SIZE."""
+    if os.getenv("BATCH_SIZE"):
+        return BATCH_SIZE
+    entry = device_profile.get(model_name, device)
+    return min(entry["batch_size"], MAX_BATCH_SIZE) if entry is not None else BATCH_SIZE
@@ -1,22 +1,30 @@
-from typing import Optional
-from whisperx.diarize import DiarizationPipeline
-from app.core.config import ALLOW_DIARIZATION, HF_TOKEN, DIAR_DEVICE
+from contextlib import contextmanager
+from typing import Any, Iterator
+from app.core.config import ALLOW_DIARIZATION, HF_TOKEN, DIAR_DEVICES
 from app.core.logging import get_logger
+from app.services.model_manager import registry, torch_device
 
 logger = get_logger("whisperx-services")
 
-_diarize_pipeline: Optional[DiarizationPipeline] = None
+DIARIZATION_MODEL = "pyannote"
 
-def get_diarization_pipeline() -> DiarizationPipeline:
-    """Create diarization pipeline lazily. Requires HF_TOKEN."""
-    global _diarize_pipeline
+def _load_pipeline(device: str) -> Any:
+    from whisperx.diarize import DiarizationPipeline
+    logger.info("Initializing diarization pipeline (device=%s)", device)
+    return DiarizationPipeline(use_auth_token=HF_TOKEN, device=torch_device(device))
 
+@contextmanager
+def use_diarization_pipeline(device: str = DIAR_DEVICES[0]) -> Iterator[Any]:
+    """Diarization pipeline from the model registry, pinned for the block. Requires HF_TOKEN."""
     if not ALLOW_DIARIZATION:
         raise RuntimeError("Diarization is disabled on this server.")
+    if not HF_TOKEN:
+        raise RuntimeError("Diarization requested but HF_TOKEN is not set.")
 
-    if _diarize_pipeline is None:
-        if not HF_TOKEN:
-            raise RuntimeError("Diarization requested but HF_TOKEN is not set.")
-        logger.info("Initializing diarization pipeline (device=%s)", DIAR_DEVICE)
-        _diarize_pipeline = DiarizationPipeline(use_auth_token=HF_TOKEN, device=DIAR_DEVICE)
-    return _diarize_pipeline
+    with registry.use(("diarize", DIARIZATION_MODEL, device), lambda: _load_pipeline(device)) as pipeline:
+        yield pipeline
+
+def get_diarization_pipeline(device: str = DIAR_DEVICES[0]) -> Any:
+    """Create diarization pipeline lazily (unpinned; use use_diarization_pipeline() while running)."""
+    with use_diarization_pipeline(device) as pipeline:
+        return pipeline
@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Callable, Any, AsyncIterator, List
+from app.core.config import DEVICES, DEVICE_SLOTS, MAX_CONCURRENT
+from app.core.logging import get_logger
+from app.core.metrics import GPU_SLOT_WAITERS, GPU_SLOTS_IN_USE
+from app.core.tracing import span, traced_call
+from app.services.process_pool import cpu_pool
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Inference executors and slots (per-process, one per device)
+# ----------------------------
+# Blocking model calls (transcribe, align, diarize) run here so the
+# event loop stays free for /health and new uploads while a job is on the GPU.
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+# GPU safety: limit concurrent stages per device (usually 1 per GPU)
+_slots: Dict[str, asyncio.Semaphore] = {}
+_in_use: Dict[str, int] = {}
+_waiting: Dict[str, int] = {}
+
+def device_slots(device: str) -> int:
+    return DEVICE_SLOTS.get(device, MAX_CONCURRENT)
+
+@asynccontextmanager
+async def gpu_slot(device: str = DEVICES[0]) -> AsyncIterator[None]:
+    """Hold one slot on device, tracking waiters/holders for scheduling and /metrics."""
+    if device not in _slots:
+        _slots[device] = asyncio.Semaphore(device_slots(device))
+    _waiting[device] = _waiting.get(device, 0) + 1
+    GPU_SLOT_WAITERS.labels(device).inc()
+    try:
+        with span("slot_wait"):
+            await _slots[device].acquire()
+    finally:
+        _waiting[device] -= 1
+        GPU_SLOT_WAITERS.labels(device).dec()
+    _in_use[device] = _in_use.get(device, 0) + 1
+    GPU_SLOTS_IN_USE.labels(device).inc()
+    try:
+        yield
+    finally:
+        _in_use[device] -= 1
+        GPU_SLOTS_IN_USE.labels(device).dec()
+        _slots[device].release()
+
+def device_load(device: str) -> float:
+    """Held + waiting stages per slot."""
+    return (_in_use.get(device, 0) + _waiting.get(device, 0)) / max(1, device_slots(device))
+
+def pick_device(candidates: List[str], has_model: Callable[[str], bool]) -> str:
+    """
+    Prefer a device that already holds the model, unless it is busier than the
+    least-loaded device by a full slot's worth of work; otherwise the least loaded.
+    """
+    least_loaded = min(candidates, key=device_load)
+    warm = [d for d in candidates if has_model(d)]
+    if warm:
+        best_warm = min(warm, key=device_load)
+        if device_load(best_warm) < device_load(least_loaded) + 1.0:
+            return best_warm
+    return least_loaded
+
+def load_snapshot() -> Dict[str, dict]:
+    return {
+        d: {"slots": device_slots(d), "in_use": _in_use.get(d, 0), "waiting": _waiting.get(d, 0)}
+        for d in DEVICE_SLOTS
+    }
+
+def get_executor(device: str = DEVICES[0]) -> ThreadPoolExecutor:
+    """Dedicated worker threads for one device, sized to its concurrency slots."""
+    if device not in _executors:
+        workers = device_slots(device)
+        logger.info("Starting inference executor device=%s workers=%d", device, workers)
+        _executors[device] = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix=f"infer-{device.replace(':', '')}",
+        )
+    return _executors[device]
+
+async def run_inference(fn: Callable[..., Any], *args, device: str = DEVICES[0], **kwargs) -> Any:
+    """
+    Run one blocking pipeline stage on the device executor.
+    Cancelling the awaiting coroutine (e.g. via asyncio.wait_for) lets the current
+    stage finish in its thread but prevents any later stage from being scheduled.
+    With the CPU process pool, the executor thread hands the stage to a worker process.
+    The stage runs in a copy of the caller's context, so its CPU time and any model loads
+    land in the request's trace.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    if cpu_pool.serves(device):
+        call = functools.partial(traced_call, cpu_pool.call, fn, args, kwargs)
+    else:
+        call = functools.partial(traced_call, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(device), context.run, call)
+
+def shutdown_executors() -> None:
+    cpu_pool.stop()
+    for device, executor in list(_executors.items()):
+        logger.info("Stopping inference executor device=%s", device)
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
@@ -0,0 +1,416 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, Set
+import requests
+from fastapi.encoders import jsonable_encoder
+from app.core.config import (
+    JOBS_DIR, JOB_WORKERS, JOB_TIMEOUT_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETENTION_SECONDS, JOB_LEASE_SECONDS,
+)
+from app.core.boot import oom_errors
+from app.core.logging import get_logger
+from app.core.security import check_callback_url
+from app.core.metrics import RequestMetrics
+from app.schemas import JobResponse, TranscriptionResponse
+from app.services.model_manager import _cuda_cleanup
+from app.services.responses import transcribe_cached
+from app.services.serialization import shape
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Durable job queue (SQLite)
+# ----------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,              -- queued, running, done, failed
+    quality TEXT NOT NULL,
+    language TEXT,
+    diarize INTEGER NOT NULL,
+    upload_path TEXT NOT NULL,
+    content_sha256 TEXT NOT NULL,
+    duration REAL NOT NULL,
+    callback_url TEXT,
+    callback_status TEXT,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,                       -- TranscriptionResponse JSON
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,                        -- process running it: host:boot_id:pid:start_ticks
+    heartbeat_at REAL                  -- refreshed by the owner every JOB_LEASE_SECONDS / 3
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+# Columns added after the first release; older databases get them on open
+_ADDED_COLUMNS = {"owner": "TEXT", "heartbeat_at": "REAL"}
+
+# ----------------------------
+# Job ownership
+# ----------------------------
+# Several processes (uvicorn workers, replicas on a shared volume) may serve one JOBS_DIR,
+# so a 'running' row is only taken back when its owner is gone: on the same host and boot,
+# the owner's pid no longer exists or was reused (its start time differs); anywhere else,
+# its heartbeat is older than JOB_LEASE_SECONDS.
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def _start_ticks(pid: int) -> str:
+    """Process start time in clock ticks since boot ("" if the pid doesn't exist)."""
+    stat = _read(f"/proc/{pid}/stat")
+    # Field 22; the command name (field 2) may contain spaces, so count from its closing ")"
+    fields = stat.rpartition(")")[2].split()
+    return fields[19] if len(fields) > 19 else ""
+
+def _host() -> str:
+    return f"{socket.gethostname()}:{_read('/proc/sys/kernel/random/boot_id') or 'unknown'}"
+
+def process_owner() -> str:
+    pid = os.getpid()
+    return f"{_host()}:{pid}:{_start_ticks(pid)}"
+
+def _owner_dead(owner: Optional[str]) -> bool:
+    """True when owner is provably gone; False when it's alive or lives elsewhere (lease decides)."""
+    if not owner:
+        return True  # claimed before owners were recorded
+    parts = owner.split(":")  # hostnames and boot ids have no ":"
+    if len(parts) != 4 or ":".join(parts[:2]) != _host() or not parts[3]:
+        return False
+    return _start_ticks(int(parts[2])) != parts[3]
+
+class JobStore:
+    """
+    Jobs and their uploads under JOBS_DIR. One connection in WAL mode, shared under a lock.
+    Statements are short, but a write can wait on another process's write lock, so the
+    workers' loops call the store through asyncio.to_thread.
+    """
+
+    def __init__(self, directory: str):
+        self.upload_dir = os.path.join(directory, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "jobs.db"), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in _ADDED_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self.owner = process_owner()
+
+    def submit(self, tmp_path: str, content_sha256: str, duration: float, quality: str,
+               language: Optional[str], diarize: bool, callback_url: Optional[str]) -> Dict[str, Any]:
+        """Move the upload into the job directory and queue it."""
+        job_id = uuid.uuid4().hex
+        upload_path = os.path.join(self.upload_dir, job_id + os.path.splitext(tmp_path)[1])
+        shutil.move(tmp_path, upload_path)
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, quality, language, diarize, upload_path, content_sha256,"
+                    " duration, callback_url, created_at) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, quality, language, int(diarize), upload_path, content_sha256, duration,
+                     callback_url, time.time()),
+                )
+        except Exception:
+            _remove(upload_path)
+            raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def queue_position(self, job: Dict[str, Any]) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+            ).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Oldest queued job, atomically marked running by this process."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1,"
+                        " owner = ?, heartbeat_at = ? WHERE id = ?",
+                        (now, self.owner, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["owner"] = self.owner
+        job["heartbeat_at"] = now
+        return job
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self) -> None:
+        """Extend the lease on every job this process is running."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?", (time.time(), self.owner)
+            )
+
+    def recover(self) -> int:
+        """
+        Requeue running jobs whose owner died (or whose lease expired), or fail them once out
+        of attempts. Jobs held by live processes, this one included, are left alone.
+        Returns the number requeued.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, attempts, owner, heartbeat_at FROM jobs WHERE status = 'running'"
+                ).fetchall()
+                orphaned = [
+                    row for row in rows
+                    if row["owner"] != self.owner and (
+                        _owner_dead(row["owner"]) or (row["heartbeat_at"] or 0) < now - JOB_LEASE_SECONDS
+                    )
+                ]
+                failed = [(now, row["id"]) for row in orphaned if row["attempts"] >= JOB_MAX_ATTEMPTS]
+                requeued = [(row["id"],) for row in orphaned if row["attempts"] < JOB_MAX_ATTEMPTS]
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restarts', finished_at = ?"
+                    " WHERE id = ?", failed,
+                )
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0, owner = NULL, heartbeat_at = NULL"
+                    " WHERE id = ?", requeued,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if orphaned:
+            logger.info("Recovered interrupted jobs: requeued=%d failed=%d", len(requeued), len(failed))
+        return len(requeued)
+
+    def purge(self, older_than: float) -> None:
+        """Drop finished jobs (and any leftover upload) older than older_than seconds."""
+        cutoff = time.time() - older_than
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_path FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,))
+        for row in rows:
+            _remove(row["upload_path"])
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+def _remove(path: str) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning("Failed to remove job upload: %s", path)
+
+def job_response(store: JobStore, job: Dict[str, Any]) -> JobResponse:
+    return JobResponse(
+        id=job["id"],
+        status=job["status"],
+        stage=job["stage"],
+        progress=job["progress"],
+        queuePosition=store.queue_position(job) if job["status"] == "queued" else None,
+        createdAt=job["created_at"],
+        startedAt=job["started_at"],
+        finishedAt=job["finished_at"],
+        error=job["error"],
+        result=TranscriptionResponse(**shape(json.loads(job["result"]))) if job["result"] else None,
+    )
+
+# ----------------------------
+# Workers
+# ----------------------------
+# Stage entry -> progress; diarization runs alongside transcription, so it doesn't move it
+_STAGE_PROGRESS = {"decode": 0.05, "transcribe": 0.1, "align": 0.8, "serialize": 0.95}
+_POLL_SECONDS = 5.0
+_PURGE_SECONDS = 3600.0
+_CALLBACK_ATTEMPTS = 3
+
+class _JobMetrics(RequestMetrics):
+    """RequestMetrics that also records the current stage and progress on the job row."""
+
+    def __init__(self, quality: str, store: JobStore, job_id: str):
+        super().__init__(quality)
+        self._store = store
+        self._job_id = job_id
+        self._progress = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        progress = _STAGE_PROGRESS.get(name)
+        if progress is not None and progress > self._progress:
+            self._progress = progress
+            self._store.update(self._job_id, stage=name, progress=progress)
+        with super().stage(name):
+            yield
+
+class JobWorkers:
+    """Pull jobs from the store and run them; accepting uploads never waits on the GPU."""
+
+    def __init__(self, store: JobStore, concurrency: int):
+        self.store = store
+        self.concurrency = concurrency
+        self._wake = asyncio.Event()
+        self._tasks: Set[asyncio.Task] = set()
+        self._callbacks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self.store.recover()
+        self.store.purge(JOB_RETENTION_SECONDS)
+        for i in range(self.concurrency):
+            self._tasks.add(asyncio.create_task(self._loop(), name=f"job-worker-{i}"))
+        self._tasks.add(asyncio.create_task(self._lease(), name="job-lease"))
+        logger.info("Job workers started: %d (dir=%s)", self.concurrency, JOBS_DIR)
+
+    async def stop(self) -> None:
+        """Running jobs stay 'running'; recover() requeues them once this process is gone."""
+        for task in self._tasks | self._callbacks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._callbacks, return_exceptions=True)
+        self._tasks.clear()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def _lease(self) -> None:
+        """
+        Keep this process's jobs leased, take back jobs whose owner has gone away, and drop
+        finished jobs past JOB_RETENTION_SECONDS. Store calls run off the event loop: they
+        can wait on SQLite's write lock held by another process.
+        """
+        purged_at = time.monotonic()
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+                if await asyncio.to_thread(self.store.recover):
+                    self.wake()
+                if time.monotonic() - purged_at >= _PURGE_SECONDS:
+                    purged_at = time.monotonic()
+                    await asyncio.to_thread(self.store.purge, JOB_RETENTION_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning("Job lease pass failed: %s", e)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        metrics = _JobMetrics(job["quality"], self.store, job_id)
+        status = "error"
+        logger.info("[%s] Job started attempt=%d duration=%.1fs quality=%s",
+                    job_id, job["attempts"], job["duration"], job["quality"])
+        try:
+            result = await transcribe_cached(
+                job_id, job["upload_path"], job["duration"], job["content_sha256"],
+                job["quality"], job["language"], bool(job["diarize"]), metrics,
+                timeout=JOB_TIMEOUT_SECONDS, reject=False,
+            )
+            await asyncio.to_thread(self.store.update, job_id, status="done", stage=None, progress=1.0,
+                                    result=json.dumps(result), finished_at=time.time())
+            status = "ok"
+            logger.info("[%s] Job done", job_id)
+        except asyncio.CancelledError:
+            status = "cancelled"  # shutdown; requeued on restart
+            raise
+        except asyncio.TimeoutError:
+            status = "timeout"
+            await self._fail(job_id, "Processing timed out")
+        except oom_errors():
+            status = "oom"
+            _cuda_cleanup()
+            await self._fail(job_id, "GPU out of memory")
+        except Exception as e:
+            logger.exception("[%s] Job failed: %s", job_id, e)
+            await self._fail(job_id, f"Transcription failed: {str(e)}")
+        finally:
+            if status != "cancelled":
+                metrics.observe(status, job["duration"])
+                _remove(job["upload_path"])
+                if job["callback_url"]:
+                    task = asyncio.create_task(self._notify(job_id, job["callback_url"]))
+                    self._callbacks.add(task)
+                    task.add_done_callback(self._callbacks.discard)
+
+    async def _fail(self, job_id: str, error: str) -> None:
+        logger.error("[%s] Job failed: %s", job_id, error)
+        await asyncio.to_thread(self.store.update, job_id, status="failed", stage=None, error=error,
+                                finished_at=time.time())
+
+    async def _notify(self, job_id: str, url: str) -> None:
+        """POST the final job (same body as GET /jobs/{id}) to the callback URL, with retries."""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        body = jsonable_encoder(await asyncio.to_thread(job_response, self.store, job))
+        outcome = "failed"
+        for attempt in range(_CALLBACK_ATTEMPTS):
+            try:
+                # Re-checked on every attempt (DNS may have changed since submit); no
+                # redirects, since they would reach hosts check_callback_url never saw
+                await asyncio.to_thread(check_callback_url, url)
+                resp = await asyncio.to_thread(requests.post, url, json=body, timeout=10, allow_redirects=False)
+                if resp.status_code < 300:
+                    outcome = "delivered"
+                    break
+                outcome = f"failed: HTTP {resp.status_code}"
+            except requests.RequestException as e:
+                outcome = f"failed: {e}"
+            except ValueError as e:
+                outcome = f"blocked: {e}"
+            if attempt + 1 < _CALLBACK_ATTEMPTS:
+                await asyncio.sleep(4 ** attempt)
+        logger.info("[%s] Callback %s: %s", job_id, url, outcome)
+        await asyncio.to_thread(self.store.update, job_id, callback_status=outcome)
+
+job_store = JobStore(JOBS_DIR)
+job_workers = JobWorkers(job_store, JOB_WORKERS)
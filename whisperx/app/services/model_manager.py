@@ -1,65 +1,341 @@
 import gc
-import torch
-import whisperx
-from typing import Optional, Dict, Tuple, Any
-from collections import OrderedDict
+import os
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Dict, Tuple, Any, Callable, Iterator, List
 from app.core.config import (
-    MODEL_MAP, DEFAULT_QUALITY, BATCH_SIZE, DEVICE, COMPUTE_TYPE, ALIGN_CACHE_MAX
+    MODEL_MAP, DEFAULT_QUALITY, DEVICES, DEVICE_SLOTS, ALIGN_CACHE_MAX, MODEL_MEMORY_BUDGET_MB,
+    CPU_PROCESSES, CPU_THREADS_PER_PROCESS,
 )
+from app.core.boot import apply_fixes, loaded_torch
 from app.core.logging import get_logger
+from app.core.tracing import span
+from app.services.device_profile import calibrated_compute_type
+from app.core.metrics import MODEL_CACHE_HITS, MODEL_CACHE_MISSES, MODEL_CACHE_EVICTIONS, MODEL_LOAD_SECONDS
 
 logger = get_logger("whisperx-services")
 
-# ----------------------------
-# Caches (per-process)
-# ----------------------------
-_loaded_models: Dict[str, Any] = {}
-_align_cache: "OrderedDict[str, Tuple[Any, Any]]" = OrderedDict()  # lang -> (align_model, metadata)
-
 def _cuda_cleanup() -> None:
     """Conservative cleanup."""
     gc.collect()
-    if torch.cuda.is_available():
+    torch = loaded_torch()
+    if torch is not None and torch.cuda.is_available():
         torch.cuda.empty_cache()
 
+def inference_mode():
+    """torch.inference_mode(), importing torch on first use."""
+    import torch
+    return torch.inference_mode()
+
 def _model_name_from_quality(quality: Optional[str]) -> str:
     q = (quality or DEFAULT_QUALITY).lower()
     return MODEL_MAP.get(q, MODEL_MAP[DEFAULT_QUALITY])
 
-def get_model(quality: Optional[str]):
-    """Load WhisperX model with caching."""
-    model_name = _model_name_from_quality(quality)
-    if model_name not in _loaded_models:
-        logger.info("Loading WhisperX model=%s device=%s compute_type=%s", model_name, DEVICE, COMPUTE_TYPE)
-        _loaded_models[model_name] = whisperx.load_model(
-            model_name,
-            DEVICE,
-            compute_type=COMPUTE_TYPE,
-        )
-    return _loaded_models[model_name]
-
-def get_align(language_code: str):
-    """Load/cached alignment model (LRU-capped)."""
-    if not language_code:
-        raise ValueError("language_code missing; cannot load alignment model")
+# ----------------------------
+# Memory accounting
+# ----------------------------
+def _used_bytes(device: str) -> int:
+    """Device-wide used memory: CUDA free/total for GPUs (sees ctranslate2 too), RSS for CPU."""
+    if device.startswith("cuda"):
+        import torch
+        if torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info(torch.device(device))
+            return total - free
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _tensor_bytes(value: Any, depth: int = 4) -> int:
+    """
+    Bytes held by the torch parameters and buffers reachable from value (through tuples,
+    lists, dicts and object attributes, up to depth levels down); 0 if none are found.
+    Shared tensors are counted once.
+    """
+    torch = loaded_torch()
+    if torch is None:
+        return 0
+    seen: Dict[int, int] = {}
+    visited = set()
+
+    def _walk(obj: Any, level: int) -> None:
+        if id(obj) in visited or level > depth:
+            return
+        visited.add(id(obj))
+        if isinstance(obj, torch.nn.Module):
+            for t in (*obj.parameters(), *obj.buffers()):
+                seen[t.data_ptr()] = t.numel() * t.element_size()
+        elif isinstance(obj, (tuple, list, dict)):
+            for item in (obj.values() if isinstance(obj, dict) else obj):
+                _walk(item, level + 1)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            for item in vars(obj).values():
+                _walk(item, level + 1)
+
+    _walk(value, 0)
+    return sum(seen.values())
+
+def _budget_bytes(device: str) -> int:
+    """MODEL_MEMORY_BUDGET_MB if set, else 80% of GPU memory / 50% of physical RAM."""
+    if MODEL_MEMORY_BUDGET_MB > 0:
+        return MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    if device.startswith("cuda"):
+        import torch
+        if torch.cuda.is_available():
+            return int(torch.cuda.get_device_properties(torch.device(device)).total_memory * 0.8)
+    try:
+        return int(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") * 0.5)
+    except (OSError, ValueError):
+        return 0
+
+# ----------------------------
+# Model registry (per-process): Whisper, alignment and diarization models
+# ----------------------------
+ModelKey = Tuple[str, str, str]  # (kind, name, device)
+
+@dataclass
+class _Entry:
+    value: Any
+    size_bytes: int
+    load_seconds: float
+    last_used: float
+    pins: int = 0
+
+class ModelRegistry:
+    """
+    One cache for every model, evicting under a per-device memory budget.
+    Footprint is the size of a model's torch parameters and buffers (alignment,
+    diarization). CTranslate2's Whisper weights are invisible to torch, so for those it
+    is the device memory delta around the load, taken while no other load runs on the
+    device and kept at the smallest value seen, since concurrent inference only inflates
+    it. Pinned entries (in use by a running stage) are never evicted; among the rest, the
+    entry that is largest, idlest and cheapest to reload goes first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[ModelKey, _Entry] = {}
+        self._load_locks: Dict[ModelKey, threading.Lock] = {}
+        self._device_locks: Dict[str, threading.Lock] = {}
+        self._known_sizes: Dict[ModelKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_seconds_total = 0.0
+
+    def _pin_locked(self, key: ModelKey) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry.pins += 1
+        entry.last_used = time.monotonic()
+        return entry.value
+
+    def acquire(self, key: ModelKey, loader: Callable[[], Any]) -> Any:
+        """Return the model for key (loading it on a miss) with one pin held."""
+        with self._lock:
+            value = self._pin_locked(key)
+            if value is not None:
+                self.hits += 1
+                MODEL_CACHE_HITS.labels(key[0]).inc()
+                return value
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                value = self._pin_locked(key)
+                if value is not None:
+                    self.hits += 1
+                    MODEL_CACHE_HITS.labels(key[0]).inc()
+                    return value
+                self.misses += 1
+                MODEL_CACHE_MISSES.labels(key[0]).inc()
+                # Make room up front when we've seen this model before
+                evicted = self._evict_locked(key[2], self._known_sizes.get(key, 0), exclude=key)
+                # Simulated cpu:N devices share one process's memory, so one lock
+                device_lock = self._device_locks.setdefault(torch_device(key[2]), threading.Lock())
+            if evicted:
+                _cuda_cleanup()
 
-    # hit
-    if language_code in _align_cache:
-        _align_cache.move_to_end(language_code)
-        return _align_cache[language_code]
+            _, name, device = key
+            apply_fixes()  # first load imports torch; patch torch.load before any model file is read
+            with device_lock:  # one load per device, so the memory delta is this model's alone
+                before = _used_bytes(device)
+                t0 = time.perf_counter()
+                with span("model_load", sync=True):
+                    value = loader()
+                load_seconds = time.perf_counter() - t0
+                delta = max(0, _used_bytes(device) - before)
+            size = _tensor_bytes(value) if key[0] != "whisper" else 0
+            if not size:
+                with self._lock:
+                    known = self._known_sizes.get(key, 0)
+                size = min(delta, known) if delta and known else delta or known
+            MODEL_LOAD_SECONDS.labels(key[0]).observe(load_seconds)
 
-    # miss -> load
-    logger.info("Loading align model language=%s device=%s", language_code, DEVICE)
-    model_a, metadata = whisperx.load_align_model(language_code=language_code, device=DEVICE)
-    _align_cache[language_code] = (model_a, metadata)
+            with self._lock:
+                self._entries[key] = _Entry(value, size, load_seconds, time.monotonic(), pins=1)
+                self._known_sizes[key] = size
+                self.load_seconds_total += load_seconds
+                evicted = self._evict_locked(device, 0, exclude=key)
+            if evicted:
+                _cuda_cleanup()
+            logger.info("Loaded %s model=%s device=%s size=%.0f MB in %.1fs", key[0], name, device, size / 1024**2, load_seconds)
+            return value
 
-    # evict oldest
-    while len(_align_cache) > ALIGN_CACHE_MAX:
-        old_lang, (old_model, _) = _align_cache.popitem(last=False)
-        logger.info("Evicting align model language=%s", old_lang)
+    def is_resident(self, key: ModelKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def size_bytes(self, key: ModelKey) -> int:
+        """Measured footprint of a model (0 if never loaded)."""
+        with self._lock:
+            return self._known_sizes.get(key, 0)
+
+    def release(self, key: ModelKey) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+                entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, key: ModelKey, loader: Callable[[], Any]) -> Iterator[Any]:
+        value = self.acquire(key, loader)
         try:
-            del old_model
-        except Exception:
-            pass
+            yield value
+        finally:
+            self.release(key)
+
+    def _evict_locked(self, device: str, incoming: int, exclude: ModelKey) -> bool:
+        """Drop entries until device fits; True if any went (call _cuda_cleanup() once unlocked)."""
+        budget = _budget_bytes(device)
+        align_keys = [k for k in self._entries if k[0] == "align" and k[2] == device]
+        evicted = False
+        while True:
+            resident = sum(e.size_bytes for k, e in self._entries.items() if k[2] == device)
+            over_budget = budget > 0 and resident + incoming > budget
+            over_align = len(align_keys) > ALIGN_CACHE_MAX
+            if not (over_budget or over_align):
+                break
+            candidates = [
+                k for k, e in self._entries.items()
+                if k[2] == device and k != exclude and e.pins == 0 and (over_budget or k[0] == "align")
+            ]
+            if not candidates:
+                if over_budget:
+                    logger.warning("Model memory over budget on %s (%.0f/%.0f MB) but everything is pinned",
+                                   device, (resident + incoming) / 1024**2, budget / 1024**2)
+                break
+            now = time.monotonic()
+            victim = max(
+                candidates,
+                key=lambda k: (now - self._entries[k].last_used + 1.0) * (self._entries[k].size_bytes + 1)
+                / (self._entries[k].load_seconds + 1.0),
+            )
+            entry = self._entries.pop(victim)
+            if victim in align_keys:
+                align_keys.remove(victim)
+            logger.info("Evicting %s model=%s device=%s size=%.0f MB", victim[0], victim[1], victim[2], entry.size_bytes / 1024**2)
+            del entry
+            self.evictions += 1
+            MODEL_CACHE_EVICTIONS.labels(victim[0]).inc()
+            evicted = True
+        return evicted
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            devices = sorted({k[2] for k in self._entries} | set(DEVICE_SLOTS))
+            models: List[dict] = [
+                {
+                    "kind": k[0],
+                    "name": k[1],
+                    "device": k[2],
+                    "size_mb": round(e.size_bytes / 1024**2, 1),
+                    "load_seconds": round(e.load_seconds, 2),
+                    "idle_seconds": round(now - e.last_used, 1),
+                    "pins": e.pins,
+                }
+                for k, e in self._entries.items()
+            ]
+            return {
+                "budget_mb": {d: round(_budget_bytes(d) / 1024**2, 1) for d in devices},
+                "resident_mb": {
+                    d: round(sum(e.size_bytes for k, e in self._entries.items() if k[2] == d) / 1024**2, 1)
+                    for d in devices
+                },
+                "models": models,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_seconds_total": round(self.load_seconds_total, 2),
+            }
+
+registry = ModelRegistry()
+
+# ----------------------------
+# Device strings
+# ----------------------------
+def torch_device(device: str) -> str:
+    """"cuda:1" stays as is; simulated "cpu:N" devices are all plain "cpu" to torch."""
+    return "cpu" if device.startswith("cpu") else device
+
+def _ctranslate2_device(device: str) -> Tuple[str, int]:
+    kind, _, index = device.partition(":")
+    if kind != "cuda":
+        return "cpu", 0
+    return "cuda", int(index or 0)
+
+# ----------------------------
+# Whisper + alignment models
+# ----------------------------
+def _load_whisper(model_name: str, device: str):
+    import whisperx
+    kind, index = _ctranslate2_device(device)
+    compute_type = calibrated_compute_type(model_name, device)
+    logger.info("Loading WhisperX model=%s device=%s compute_type=%s", model_name, device, compute_type)
+    if CPU_PROCESSES and device == "cpu":
+        # Inside a pool worker: CTranslate2 threads match the worker's core share
+        return whisperx.load_model(model_name, kind, device_index=index, compute_type=compute_type,
+                                   threads=CPU_THREADS_PER_PROCESS)
+    return whisperx.load_model(model_name, kind, device_index=index, compute_type=compute_type)
+
+@contextmanager
+def use_whisper(model_name: str, device: str = DEVICES[0]) -> Iterator[Any]:
+    """WhisperX model by name, pinned for the duration of the block."""
+    with registry.use(("whisper", model_name, device), lambda: _load_whisper(model_name, device)) as model:
+        yield model
+
+@contextmanager
+def use_model(quality: Optional[str], device: str = DEVICES[0]) -> Iterator[Any]:
+    """WhisperX model for quality, pinned for the duration of the block."""
+    with use_whisper(_model_name_from_quality(quality), device) as model:
+        yield model
+
+def get_model(quality: Optional[str], device: str = DEVICES[0]):
+    """Load WhisperX model with caching (unpinned; use use_model() while running inference)."""
+    with use_model(quality, device) as model:
+        return model
+
+@contextmanager
+def use_align(language_code: str, device: str = DEVICES[0]) -> Iterator[Tuple[Any, Any]]:
+    """(align_model, metadata) for language, pinned for the duration of the block."""
+    if not language_code:
+        raise ValueError("language_code missing; cannot load alignment model")
+
+    def _load():
+        import whisperx
+        logger.info("Loading align model language=%s device=%s", language_code, device)
+        return whisperx.load_align_model(language_code=language_code, device=torch_device(device))
+
+    with registry.use(("align", language_code, device), _load) as loaded:
+        yield loaded
 
-    return model_a, metadata
+def get_align(language_code: str, device: str = DEVICES[0]):
+    """Load/cached alignment model (unpinned; use use_align() while aligning)."""
+    with use_align(language_code, device) as loaded:
+        return loaded
@@ -0,0 +1,219 @@
+import os
+import time
+import queue
+import multiprocessing as mp
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from app.core.config import CPU_PROCESSES, CPU_THREADS_PER_PROCESS, DEVICES
+from app.core.logging import get_logger
+from app.core.tracing import add_cpu
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# CPU inference process pool
+# ----------------------------
+# One process with one model copy only keeps a few cores busy on CPU nodes. Here the
+# "cpu" device's stages run in CPU_PROCESSES worker processes, each pinned to its own
+# cores. Workers are spawned, not forked: by the time the app starts, the parent already
+# has threads (executors, logging, torch) whose locks a forked child could inherit held.
+# Each worker loads its own copy of every model it runs, so memory grows with
+# CPU_PROCESSES; the trade is throughput across cores for RSS (CPU_PROCESSES=0 keeps one
+# copy in-process).
+# Audio goes to the workers through shared memory; only stage results are pickled.
+POOL_DEVICE = "cpu"
+_SHARE_MIN_BYTES = 64 * 1024  # smaller arrays are cheaper to pickle
+
+@dataclass
+class _SharedArray:
+    """Picklable handle to a numpy array placed in shared memory by the parent."""
+    name: str
+    shape: tuple
+    dtype: str
+
+def _to_shared(value: Any, owned: List[shared_memory.SharedMemory]) -> Any:
+    """Copy large arrays (also inside lists/tuples/dicts) into shared memory segments."""
+    if isinstance(value, np.ndarray) and value.nbytes >= _SHARE_MIN_BYTES:
+        shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+        owned.append(shm)
+        np.ndarray(value.shape, value.dtype, buffer=shm.buf)[...] = value
+        return _SharedArray(shm.name, value.shape, value.dtype.str)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_shared(v, owned) for v in value)
+    if isinstance(value, dict):
+        return {k: _to_shared(v, owned) for k, v in value.items()}
+    return value
+
+def _attach(value: Any, attached: List[shared_memory.SharedMemory]) -> Any:
+    """Worker side of _to_shared: zero-copy read-only views over the parent's segments."""
+    if isinstance(value, _SharedArray):
+        shm = shared_memory.SharedMemory(name=value.name)
+        attached.append(shm)
+        array = np.ndarray(value.shape, np.dtype(value.dtype), buffer=shm.buf)
+        array.flags.writeable = False
+        return array
+    if isinstance(value, (list, tuple)):
+        return type(value)(_attach(v, attached) for v in value)
+    if isinstance(value, dict):
+        return {k: _attach(v, attached) for k, v in value.items()}
+    return value
+
+def _worker_main(index: int, cores: List[int], threads: int, conn: Connection) -> None:
+    """Worker loop: (fn, args, kwargs) in, (ok, result-or-exception, cpu seconds) out; None or EOF stops it."""
+    if cores:
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(threads)
+    logger.info("CPU worker %d started pid=%d cores=%s threads=%d", index, os.getpid(), cores, threads)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        fn, args, kwargs = message
+        attached: List[shared_memory.SharedMemory] = []
+        cpu = time.process_time()
+        try:
+            call_args = _attach(args, attached)
+            reply = (True, fn(*call_args, **kwargs), time.process_time() - cpu)
+        except Exception as e:
+            reply = (False, e, time.process_time() - cpu)
+        finally:
+            call_args = None
+            for shm in attached:
+                try:
+                    shm.close()
+                except BufferError:
+                    pass  # a view outlived the call; the mapping goes with it
+        try:
+            conn.send(reply)
+        except Exception as e:  # unpicklable result or exception
+            conn.send((False, RuntimeError(f"CPU worker {index} could not return result: {e}"), reply[2]))
+
+@dataclass
+class _Worker:
+    index: int
+    cores: List[int]
+    process: Any
+    conn: Connection
+
+class CpuProcessPool:
+    """Worker processes for the "cpu" device; one stage per worker at a time."""
+
+    def __init__(self, processes: int, threads: int):
+        self.processes = processes
+        self.threads = threads
+        self.respawned = 0
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: Dict[int, _Worker] = {}
+        self._ctx = mp.get_context("spawn")
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0 and POOL_DEVICE in DEVICES
+
+    def serves(self, device: str) -> bool:
+        return device == POOL_DEVICE and bool(self._workers)
+
+    def start(self) -> None:
+        """
+        Start the workers. Called from app startup, before the server takes requests, so
+        every "cpu" stage runs in the pool; workers load their models on the first stage
+        or on warm(). Returns once the processes are started, not loaded.
+        """
+        if not self.enabled or self._workers:
+            return
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        per_worker = max(1, len(cores) // self.processes) if cores else 0
+        # Workers must share the parent's tracker: segments they attach are then unregistered
+        # once, by the parent's unlink, instead of being reported as leaked by their own tracker
+        resource_tracker.ensure_running()
+        for i in range(self.processes):
+            worker_cores = cores[i * per_worker:(i + 1) * per_worker] if len(cores) >= self.processes else cores
+            self._idle.put(self._spawn(i, worker_cores))
+        logger.info("CPU process pool started: processes=%d threads=%d", self.processes, self.threads)
+
+    def _spawn(self, index: int, cores: List[int]) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(index, cores, self.threads, child_conn),
+            name=f"whisperx-cpu-{index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(index, cores, process, parent_conn)
+        self._workers[index] = worker
+        return worker
+
+    def call(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        """Blocking (runs on the device executor): fn(*args, **kwargs) in an idle worker."""
+        worker = self._idle.get()
+        owned: List[shared_memory.SharedMemory] = []
+        try:
+            worker.conn.send((fn, _to_shared(args, owned), kwargs))
+            ok, value, cpu = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            logger.error("CPU worker %d died (exit code %s): %s", worker.index, worker.process.exitcode, e)
+            worker = self._replace(worker)
+            raise RuntimeError("CPU inference process exited during the stage") from e
+        finally:
+            for shm in owned:
+                shm.close()
+                shm.unlink()
+            self._idle.put(worker)
+        add_cpu(cpu)  # the worker's CPU time goes to the request's current span
+        if not ok:
+            raise value
+        return value
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        """Start a fresh worker on the dead one's cores; it loads its models on first use."""
+        worker.conn.close()
+        worker.process.join(timeout=1)
+        self.respawned += 1
+        return self._spawn(worker.index, worker.cores)
+
+    def warm(self, fn: Callable[..., Any], *args: Any) -> None:
+        """Run a model loader (module-level, picklable) in every worker, in parallel."""
+        workers = [self._idle.get() for _ in range(self.processes)]
+        try:
+            for worker in workers:
+                worker.conn.send((fn, args, {}))
+            for worker in workers:
+                ok, value, _ = worker.conn.recv()
+                if not ok:
+                    logger.warning("CPU worker %d warm-up failed: %s", worker.index, value)
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def stop(self) -> None:
+        for worker in self._workers.values():
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers.values():
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers.clear()
+
+    def stats(self) -> Optional[dict]:
+        if not self._workers:
+            return None
+        return {
+            "processes": self.processes,
+            "threads_per_process": self.threads,
+            "alive": sum(1 for w in self._workers.values() if w.process.is_alive()),
+            "idle": self._idle.qsize(),
+            "respawned": self.respawned,
+            "cores": {w.index: w.cores for w in self._workers.values()},
+        }
+
+cpu_pool = CpuProcessPool(CPU_PROCESSES, CPU_THREADS_PER_PROCESS)
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Optional, Union, Any
+from fastapi import HTTPException
+from app.core.config import TIMEOUT_SECONDS
+from app.core.metrics import RequestMetrics
+from app.services.admission import admission
+from app.services.model_manager import _model_name_from_quality
+from app.services.result_cache import result_cache, make_key
+from app.services.segment_store import segment_store
+from app.services.transcription import run_pipeline, realign_pipeline
+
+# ----------------------------
+# Pipeline output -> API response
+# ----------------------------
+# Plain dicts in the TranscriptionResponse shape: building one pydantic model per
+# segment and validating it again on the way out dominated serialization for long audio.
+def _seconds(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+def to_segment(seg: dict, enable_diarization: bool, words: bool = True) -> dict:
+    segment = {
+        "text": (seg.get("text") or "").strip(),
+        "startSeconds": float(seg.get("start") or 0.0),
+        "endSeconds": float(seg.get("end") or 0.0),
+        "speaker": seg.get("speaker") if enable_diarization else None,
+    }
+    if words:
+        # Inlined: long transcripts have ~10x more words than segments.
+        # Times are None for tokens the aligner couldn't place.
+        segment["words"] = [
+            {
+                "word": w.get("word", ""),
+                "startSeconds": _seconds(w.get("start")),
+                "endSeconds": _seconds(w.get("end")),
+                "score": _seconds(w.get("score")),
+                "speaker": w.get("speaker") if enable_diarization else None,
+            }
+            for w in seg.get("words") or ()
+        ]
+    return segment
+
+def build_response(aligned: dict, enable_diarization: bool) -> dict:
+    """JSON-ready TranscriptionResponse, words included (serialization.shape() drops them)."""
+    segments = [to_segment(seg, enable_diarization) for seg in aligned.get("segments", [])]
+    return {
+        "fullTranscript": " ".join(seg["text"] for seg in segments if seg["text"]),
+        "detectedLanguage": aligned.get("language"),
+        "segments": segments,
+        "chapters": [],
+    }
+
+async def transcribe_cached(
+    req_id: str,
+    source: Union[str, Any],
+    duration: float,
+    content_sha256: str,
+    quality: str,
+    language: Optional[str],
+    enable_diarization: bool,
+    metrics: RequestMetrics,
+    timeout: float = TIMEOUT_SECONDS,
+    reject: bool = True,
+) -> dict:
+    """
+    JSON-ready TranscriptionResponse (with words) for one upload. Identical uploads (same bytes + options)
+    are served from the result cache or share one run; a run waits for admission (429 up
+    front when reject and the queue ahead would outlast the timeout) and is bounded by timeout.
+    The timeout is this caller's own, whether it runs the pipeline or waits on another run
+    (and maybe takes it over, see ResultCache.get_or_compute).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    async def _compute() -> dict:
+        ticket = admission.reserve(duration, quality, reject=reject)
+
+        async def _admitted() -> dict:
+            async with ticket:
+                return await run_pipeline(
+                    req_id, source, quality, language, enable_diarization, duration, metrics, content_sha256
+                )
+
+        # Run with timeout (queue wait included); stages run on the inference executor so this can actually fire
+        aligned = await asyncio.wait_for(_admitted(), timeout=max(0.0, deadline - loop.time()))
+        with metrics.stage("serialize"):
+            return build_response(aligned, enable_diarization)
+
+    cache_key = make_key(content_sha256, _model_name_from_quality(quality), language, quality, enable_diarization)
+    return await result_cache.get_or_compute(cache_key, _compute, timeout=timeout)
+
+async def realign_stored(
+    req_id: str,
+    source: Union[str, Any],
+    duration: float,
+    content_sha256: str,
+    quality: Optional[str],
+    language: Optional[str],
+    enable_diarization: bool,
+    metrics: RequestMetrics,
+    timeout: float = TIMEOUT_SECONDS,
+) -> dict:
+    """
+    JSON-ready TranscriptionResponse (with words) from the upload's stored raw segments: those
+    of quality's model, or of the model that ran last when quality is None. Re-aligned (and
+    diarized if asked) without a transcribe pass; 404 when nothing is stored. Admitted and
+    bounded by timeout like transcribe_cached, but not cached: a later run replaces the segments.
+    """
+    model_name = _model_name_from_quality(quality) if quality else None
+    stored = await asyncio.to_thread(segment_store.load, content_sha256, model_name)
+    if stored is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No stored segments for this audio; transcribe it first (kept for SEGMENT_STORE_TTL_SECONDS)",
+        )
+    ticket = admission.reserve(duration, metrics.quality)
+
+    async def _admitted() -> dict:
+        async with ticket:
+            return await realign_pipeline(req_id, source, stored, language, enable_diarization, metrics)
+
+    aligned = await asyncio.wait_for(_admitted(), timeout=timeout)
+    with metrics.stage("serialize"):
+        return build_response(aligned, enable_diarization)
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Callable, Awaitable
+from fastapi import HTTPException
+from app.core.config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB, RESULT_CACHE_TTL_SECONDS
+from app.core.logging import get_logger
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Content-addressed result cache (disk-backed LRU + single-flight)
+# ----------------------------
+_PAYLOAD_VERSION = "2"  # bump when the stored response layout changes (2: word timestamps)
+
+def make_key(content_sha256: str, model_name: str, language: Optional[str], quality: str, diarize: bool) -> str:
+    raw = "|".join([_PAYLOAD_VERSION, content_sha256, model_name, language or "auto", quality.lower(), str(bool(diarize))])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class ResultCache:
+    """
+    Stores finished TranscriptionResponse payloads as <key>.json, capped by total size and TTL.
+    Concurrent requests for the same key share one computation.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = max_bytes > 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()  # key -> (size, stored_at)
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        if self.enabled:
+            self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self) -> None:
+        """Rebuild the index from disk, oldest write (mtime) first."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            st = os.stat(os.path.join(self.directory, name))
+            entries.append((st.st_mtime, name[:-5], st.st_size))
+        for stored_at, key, size in sorted(entries):
+            self._index[key] = (size, stored_at)
+            self._total_bytes += size
+        logger.info("Result cache dir=%s entries=%d size=%.1f MB", self.directory, len(self._index), self._total_bytes / 1024**2)
+
+    def _remove_locked(self, key: str) -> None:
+        size, _ = self._index.pop(key)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[dict]:
+        """Blocking: cached payload or None. Expired entries count as misses."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                self._remove_locked(key)
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Dropping unreadable result cache entry %s", key)
+            with self._lock:
+                if key in self._index:
+                    self._remove_locked(key)
+            return None
+
+    def put(self, key: str, payload: dict) -> None:
+        """Blocking: write payload atomically, then evict LRU entries over the size cap."""
+        if not self.enabled:
+            return
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)[0]
+            self._index[key] = (len(data), time.time())
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and self._index:
+                old_key = next(iter(self._index))
+                self._remove_locked(old_key)
+                self.evictions += 1
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[dict]], timeout: Optional[float] = None
+    ) -> dict:
+        """
+        Return the cached payload, join an identical in-flight computation, or run compute().
+        Callers differ in budget (a /transcribe request vs a job), so a follower waits at most
+        its own timeout (compute() must bound itself the same way), and when the run it joined
+        ends for the leader's own reasons - its timeout, an admission 429, cancellation - the
+        follower takes over (or joins whoever did) instead of inheriting that failure.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                cached = await asyncio.to_thread(self.get, key)
+                if cached is not None:
+                    return cached
+                inflight = self._inflight.get(key)  # may have started while we read the disk
+            if inflight is None:
+                return await self._lead(key, compute)
+
+            self.coalesced += 1
+            remaining = max(0.0, deadline - loop.time()) if deadline is not None else None
+            try:
+                return await asyncio.wait_for(asyncio.shield(inflight), timeout=remaining)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # we were cancelled, not the leader
+            except asyncio.TimeoutError:
+                if not inflight.done():
+                    raise  # our own budget ran out; the leader carries on
+            except HTTPException as e:
+                if e.status_code != 429:
+                    raise
+            logger.info("Result cache %s: leader gave up; taking over", key[:12])
+
+    async def _lead(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            payload = await compute()
+            future.set_result(payload)
+            try:
+                await asyncio.to_thread(self.put, key, payload)
+            except OSError as e:
+                logger.warning("Failed to store result cache entry %s: %s", key, e)
+            return payload
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                future.exception()  # mark retrieved; followers (if any) re-raise it
+            raise
+        finally:
+            # Stays registered until the entry is on disk, so late arrivals never recompute
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+            }
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024, RESULT_CACHE_TTL_SECONDS)
@@ -0,0 +1,182 @@
+import heapq
+import random
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# ----------------------------
+# Scheduling queue (pure: time, costs and weights are passed in, so traces can be
+# replayed offline without config, torch or the web stack)
+# ----------------------------
+POLICIES = ("sjf", "wfq", "fifo")
+
+@dataclass
+class Job:
+    cost: float          # estimated processing seconds
+    quality: str
+    duration: float      # audio seconds
+    enqueued_at: float
+    seq: int
+    start_tag: float = 0.0  # wfq virtual start time
+    queued: bool = False
+    future: Optional["asyncio.Future[None]"] = None
+
+class SchedulingQueue:
+    """
+    Jobs waiting to start, ordered by policy. Aging subtracts SCHEDULER_AGING * waited
+    seconds from every job's rank; all jobs age at the same rate, so the heap key is the
+    static `rank + aging * enqueued_at`.
+    """
+
+    def __init__(self, policy: str, aging: float, weights: Dict[str, float]):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduler policy {policy!r}; expected one of {POLICIES}")
+        self.policy = policy
+        self.aging = aging
+        self.weights = weights
+        self.depth = 0
+        self.queued_cost = 0.0
+        self._heap: List[Tuple[float, int, Job]] = []
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+    def _key(self, cost: float, quality: str, now: float) -> Tuple[float, float]:
+        """(heap key, wfq start tag) for a job arriving now."""
+        if self.policy == "fifo":
+            return now, 0.0
+        if self.policy == "sjf":
+            return cost + self.aging * now, 0.0
+        start = max(self._virtual_time, self._last_finish.get(quality, 0.0))
+        finish = start + cost / self.weights.get(quality, 1.0)
+        return finish + self.aging * now, start
+
+    def push(self, job: Job) -> None:
+        key, job.start_tag = self._key(job.cost, job.quality, job.enqueued_at)
+        if self.policy == "wfq":
+            self._last_finish[job.quality] = job.start_tag + job.cost / self.weights.get(job.quality, 1.0)
+        job.queued = True
+        self.depth += 1
+        self.queued_cost += job.cost
+        heapq.heappush(self._heap, (key, job.seq, job))
+
+    def pop(self) -> Optional[Job]:
+        while self._heap:
+            _, _, job = heapq.heappop(self._heap)
+            if not job.queued:
+                continue  # removed while waiting
+            self._unqueue(job)
+            self._virtual_time = max(self._virtual_time, job.start_tag)
+            return job
+        return None
+
+    def remove(self, job: Job) -> None:
+        """Drop a waiting job (lazily; the heap entry is skipped on pop). No-op if already popped."""
+        if job.queued:
+            self._unqueue(job)
+
+    def _unqueue(self, job: Job) -> None:
+        job.queued = False
+        self.depth -= 1
+        self.queued_cost -= job.cost
+
+    def cost_ahead(self, cost: float, quality: str, now: float) -> float:
+        """Estimated seconds of queued work that would run before a job arriving now."""
+        key, _ = self._key(cost, quality, now)
+        return sum(j.cost for k, _, j in self._heap if j.queued and k <= key)
+
+# ----------------------------
+# Trace replay (simulate_scheduler.py, tests)
+# ----------------------------
+# Jobs are a mix of short clips and long recordings across quality tiers, arriving as a
+# Poisson process at a fraction of capacity. Service time is the cost estimate with
+# lognormal noise, so the queue orders by an imperfect guess just as in production.
+SHORT_MAX_SECONDS = 120.0
+TIERS = (("fast", 0.3), ("balanced", 0.5), ("accurate", 0.2))
+
+def make_trace(n: int, load: float, slots: int, long_fraction: float, seed: int,
+               rtf: Dict[str, float]) -> List[Tuple[float, Job, float]]:
+    """[(arrival, job, actual_service_seconds)] in arrival order."""
+    rng = random.Random(seed)
+    jobs = []
+    for seq in range(n):
+        quality = rng.choices([t for t, _ in TIERS], weights=[w for _, w in TIERS])[0]
+        if rng.random() < long_fraction:
+            duration = rng.uniform(600, 3600)
+        else:
+            duration = min(SHORT_MAX_SECONDS, max(2.0, rng.lognormvariate(3.0, 0.8)))
+        cost = duration * rtf.get(quality, 0.1)
+        jobs.append((Job(cost=cost, quality=quality, duration=duration, enqueued_at=0.0, seq=seq),
+                     cost * rng.lognormvariate(0.0, 0.25)))
+
+    mean_service = sum(actual for _, actual in jobs) / n
+    rate = load * slots / mean_service
+    t = 0.0
+    trace = []
+    for job, actual in jobs:
+        t += rng.expovariate(rate)
+        job.enqueued_at = t
+        trace.append((t, job, actual))
+    return trace
+
+def simulate(trace: List[Tuple[float, Job, float]], policy: str, slots: int, aging: float,
+             timeout: float, weights: Dict[str, float]) -> Dict[str, object]:
+    """
+    Run a trace through a SchedulingQueue with `slots` jobs in parallel; latency percentiles
+    (arrival -> finish), jobs rejected up front (429) and admitted jobs finishing after timeout.
+    Replays copies, so one trace can be run under every policy.
+    """
+    trace = [(arrival, Job(job.cost, job.quality, job.duration, job.enqueued_at, job.seq), service)
+             for arrival, job, service in trace]
+    queue = SchedulingQueue(policy, aging, weights)
+    actual = {job.seq: service for _, job, service in trace}
+    running: List[Tuple[float, int, Job, float]] = []  # (finish, seq, job, started)
+    latencies: Dict[int, float] = {}
+    rejected = 0
+
+    def dispatch(now: float) -> None:
+        while len(running) < slots:
+            job = queue.pop()
+            if job is None:
+                return
+            heapq.heappush(running, (now + actual[job.seq], job.seq, job, now))
+
+    i = 0
+    while i < len(trace) or running:
+        next_arrival = trace[i][0] if i < len(trace) else float("inf")
+        if running and running[0][0] <= next_arrival:
+            finish, _, job, _ = heapq.heappop(running)
+            latencies[job.seq] = finish - job.enqueued_at
+            dispatch(finish)
+            continue
+
+        now, job, _ = trace[i]
+        i += 1
+        # Same estimate AdmissionController.estimated_wait() makes
+        if timeout > 0 and (len(running) >= slots or queue.depth):
+            backlog = sum(max(0.0, j.cost - (now - started)) for _, _, j, started in running)
+            if (backlog + queue.cost_ahead(job.cost, job.quality, now)) / slots > timeout:
+                rejected += 1
+                continue
+        queue.push(job)
+        dispatch(now)
+
+    by_seq = {job.seq: job for _, job, _ in trace}
+    short = [lat for seq, lat in latencies.items() if by_seq[seq].duration <= SHORT_MAX_SECONDS]
+    long_ = [lat for seq, lat in latencies.items() if by_seq[seq].duration > SHORT_MAX_SECONDS]
+    return {
+        "policy": policy,
+        "done": len(latencies),
+        "rejected": rejected,
+        "late": sum(1 for lat in latencies.values() if timeout > 0 and lat > timeout),
+        "p50": percentile(list(latencies.values()), 50),
+        "p95": percentile(list(latencies.values()), 95),
+        "short_p95": percentile(short, 95),
+        "long_p95": percentile(long_, 95),
+        "max": max(latencies.values(), default=0.0),
+    }
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import shutil
+import threading
+from typing import Optional, List
+from app.core.config import SEGMENT_STORE_DIR, SEGMENT_STORE_TTL_SECONDS
+from app.core.logging import get_logger
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Raw Whisper segments per upload
+# ----------------------------
+# model.transcribe is the expensive stage; align and diarization only need its segments
+# (text + start/end) and the audio. Each run stores them, in original time, as
+# <dir>/<content sha256>/<model name>.json; a later run of the same model replaces them.
+def _json_default(value):
+    return float(value)  # numpy scalars in segment times
+
+class SegmentStore:
+    """Latest raw segments + language per (upload, model), written atomically; expire after ttl_seconds."""
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.enabled = bool(directory)
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+            self._purge_expired()
+
+    def _dir(self, content_sha256: str) -> str:
+        return os.path.join(self.directory, content_sha256)
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def save(self, content_sha256: str, model_name: str, segments: List[dict], language: Optional[str]) -> None:
+        """Blocking."""
+        if not self.enabled:
+            return
+        directory = self._dir(content_sha256)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{model_name}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        payload = {"model": model_name, "language": language, "segments": segments, "stored_at": time.time()}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=_json_default)
+        os.replace(tmp, path)
+        os.utime(directory)  # the directory's mtime drives expiry of the whole upload
+
+    def load(self, content_sha256: str, model_name: Optional[str] = None) -> Optional[dict]:
+        """
+        Blocking: {"model", "language", "segments", "stored_at"} for model_name, or the most
+        recently stored model when None; None if nothing unexpired is stored.
+        """
+        if not self.enabled:
+            return None
+        directory = self._dir(content_sha256)
+        if model_name is not None:
+            names = [f"{model_name}.json"]
+        else:
+            try:
+                names = [n for n in os.listdir(directory) if n.endswith(".json")]
+            except FileNotFoundError:
+                return None
+        newest: Optional[dict] = None
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError):
+                logger.warning("Ignoring unreadable stored segments %s", path)
+                continue
+            if time.time() - saved.get("stored_at", 0) > self.ttl_seconds:
+                continue
+            if newest is None or saved["stored_at"] > newest["stored_at"]:
+                newest = saved
+        return newest
+
+segment_store = SegmentStore(SEGMENT_STORE_DIR, SEGMENT_STORE_TTL_SECONDS)
@@ -0,0 +1,113 @@
+import json
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:  # optional: ~5-10x faster JSON encoding
+    import orjson
+except ImportError:
+    orjson = None
+try:  # optional: Accept: application/msgpack
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# ----------------------------
+# Response encodings and layouts
+# ----------------------------
+JSON_MEDIA = "application/json"
+MSGPACK_MEDIA = "application/msgpack"
+_MSGPACK_ALIASES = (MSGPACK_MEDIA, "application/x-msgpack", "application/vnd.msgpack")
+LAYOUTS = ("segments", "columnar")
+
+def dumps_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=float).encode()
+
+def negotiate(accept: Optional[str]) -> str:
+    """JSON or MessagePack from an Accept header (highest q wins, JSON on ties and by default)."""
+    best, best_q = JSON_MEDIA, 0.0
+    for item in (accept or "").split(","):
+        media, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media = media.strip().lower()
+        if media in _MSGPACK_ALIASES and q > best_q:
+            best, best_q = MSGPACK_MEDIA, q
+        elif media in (JSON_MEDIA, "application/*", "*/*") and q >= best_q and q > 0:
+            best, best_q = JSON_MEDIA, q
+    return best
+
+def encode(payload, media_type: str) -> Response:
+    """Response with the payload already encoded (FastAPI skips response_model validation)."""
+    if media_type == MSGPACK_MEDIA:
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="MessagePack is not available on this server")
+        return Response(content=msgpack.packb(payload, use_bin_type=True), media_type=MSGPACK_MEDIA)
+    return Response(content=dumps_json(payload), media_type=JSON_MEDIA)
+
+def shape(result: dict, words: bool = False, layout: str = "segments") -> dict:
+    """
+    A stored response (segments with words) in the requested shape: words dropped unless
+    asked for, or re-laid out as parallel arrays.
+    """
+    if layout == "columnar":
+        return to_columnar(result, words)
+    if words:
+        return result
+    return {**result, "segments": [{k: v for k, v in seg.items() if k != "words"} for seg in result["segments"]]}
+
+def _text_offsets(texts: List[str]) -> Tuple[List[int], List[int]]:
+    """[start, end) of each text in " ".join(non-empty texts), in code points."""
+    starts, ends = [], []
+    position = 0
+    for text in texts:
+        if text:
+            starts.append(position)
+            ends.append(position + len(text))
+            position += len(text) + 1
+        else:
+            starts.append(position)
+            ends.append(position)
+    return starts, ends
+
+def to_columnar(result: dict, words: bool = False) -> dict:
+    """
+    Segments as parallel arrays: start/end seconds, speaker (null without diarization) and
+    each segment's text as [textStart, textEnd) offsets into fullTranscript. With words,
+    a second table of parallel arrays keyed by segment index.
+    """
+    segments = result["segments"]
+    text_start, text_end = _text_offsets([seg["text"] for seg in segments])
+    speakers = [seg.get("speaker") for seg in segments]
+    columnar = {
+        "layout": "columnar",
+        "fullTranscript": result["fullTranscript"],
+        "detectedLanguage": result.get("detectedLanguage"),
+        "segments": {
+            "startSeconds": [seg["startSeconds"] for seg in segments],
+            "endSeconds": [seg["endSeconds"] for seg in segments],
+            "speaker": speakers if any(s is not None for s in speakers) else None,
+            "textStart": text_start,
+            "textEnd": text_end,
+        },
+        "chapters": result.get("chapters", []),
+    }
+    if words:
+        table = {"segment": [], "word": [], "startSeconds": [], "endSeconds": [], "score": [], "speaker": []}
+        for index, seg in enumerate(segments):
+            for word in seg.get("words") or []:
+                table["segment"].append(index)
+                for name in ("word", "startSeconds", "endSeconds", "score", "speaker"):
+                    table[name].append(word.get(name))
+        if not any(s is not None for s in table["speaker"]):
+            table["speaker"] = None
+        columnar["words"] = table
+    return columnar
@@ -0,0 +1,85 @@
+import bisect
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import numpy as np
+from app.core.config import SAMPLE_RATE, SILENCE_THRESHOLD_DB, SILENCE_MIN_SECONDS, SILENCE_PAD_SECONDS
+
+# ----------------------------
+# Silence trimming pre-stage
+# ----------------------------
+# Long silent stretches are cut out of the decoded array before transcription, alignment
+# and diarization; an OffsetMap takes timestamps in the trimmed audio back to the original.
+_FRAME = int(SAMPLE_RATE * 0.03)  # 30 ms energy frames
+# A frame is silent below SILENCE_THRESHOLD_DB, or below the loud end of the file minus
+# this much if that is lower (keeps quiet speakers in quiet recordings)
+_RELATIVE_DB = 30.0
+
+@dataclass
+class OffsetMap:
+    """Kept spans as parallel lists: start in trimmed time -> start in original time (seconds)."""
+    trimmed_starts: List[float]
+    original_starts: List[float]
+    skipped_seconds: float
+
+    def to_original(self, t: float, is_end: bool = False) -> float:
+        i = max(0, bisect.bisect_right(self.trimmed_starts, t) - 1)
+        if is_end and i > 0 and t <= self.trimmed_starts[i]:
+            i -= 1  # an end exactly on a cut belongs to the span before it
+        return round(self.original_starts[i] + t - self.trimmed_starts[i], 3)
+
+    def remap(self, result: dict) -> dict:
+        """In place: segment, word and word_segment timestamps back to original time."""
+        items = list(result.get("word_segments") or [])
+        for seg in result.get("segments", []):
+            items.append(seg)
+            items.extend(seg.get("words") or [])
+        # whisperx's word_segments holds the same dicts as the segments' words
+        for item in {id(item): item for item in items}.values():
+            if item.get("start") is not None:
+                item["start"] = self.to_original(item["start"])
+            if item.get("end") is not None:
+                item["end"] = self.to_original(item["end"], is_end=True)
+        return result
+
+def _silent_runs(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """[(first_frame, end_frame)) runs of silent frames at least SILENCE_MIN_SECONDS long."""
+    n = len(audio) // _FRAME
+    if n == 0:
+        return []
+    frames = audio[:n * _FRAME].reshape(n, _FRAME)
+    db = 20.0 * np.log10(np.sqrt(np.mean(frames * frames, axis=1)) + 1e-10)
+    threshold = min(SILENCE_THRESHOLD_DB, float(np.percentile(db, 95)) - _RELATIVE_DB)
+    edges = np.diff(np.concatenate([[0], (db < threshold).astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    min_frames = int(SILENCE_MIN_SECONDS * SAMPLE_RATE / _FRAME)
+    return [(int(s), int(e)) for s, e in zip(starts, ends) if e - s >= min_frames]
+
+def trim_silence(audio: np.ndarray) -> Tuple[np.ndarray, Optional[OffsetMap]]:
+    """
+    Blocking: (speech-only audio, offset map), or (audio, None) if nothing worth cutting.
+    SILENCE_PAD_SECONDS of each cut stretch is kept on both sides so word edges survive.
+    """
+    pad = int(SILENCE_PAD_SECONDS * SAMPLE_RATE)
+    cuts = []
+    for first, end in _silent_runs(audio):
+        cut_start = 0 if first == 0 else first * _FRAME + pad
+        cut_end = len(audio) if end * _FRAME >= len(audio) - _FRAME else end * _FRAME - pad
+        if cut_end > cut_start:
+            cuts.append((cut_start, cut_end))
+    if not cuts:
+        return audio, None
+
+    pieces, trimmed_starts, original_starts = [], [], []
+    kept = 0
+    position = 0
+    for cut_start, cut_end in cuts + [(len(audio), len(audio))]:
+        if cut_start > position:
+            pieces.append(audio[position:cut_start])
+            trimmed_starts.append(kept / SAMPLE_RATE)
+            original_starts.append(position / SAMPLE_RATE)
+            kept += cut_start - position
+        position = cut_end
+    if not pieces:
+        return audio, None  # all silence: let the pipeline return nothing as usual
+    skipped = (len(audio) - kept) / SAMPLE_RATE
+    return np.concatenate(pieces), OffsetMap(trimmed_starts, original_starts, skipped)
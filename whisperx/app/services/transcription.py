@@ -0,0 +1,436 @@
+import asyncio
+from typing import Optional, Any, AsyncIterator, List, Tuple, Union
+
+from app.core.config import (
+    SAMPLE_RATE, ADAPTIVE_BATCH_SIZE, DYNAMIC_BATCHING, STREAM_WINDOW_CHUNKS, DEVICES, DIAR_DEVICES,
+    CHECKPOINT_MIN_SECONDS, CHECKPOINT_WINDOW_CHUNKS, TRIM_SILENCE,
+)
+from app.core.logging import get_logger
+from app.core.metrics import RequestMetrics, CHECKPOINT_WINDOWS
+from app.core import tracing
+from app.services.executor import run_inference, gpu_slot, pick_device
+from app.services.model_manager import (
+    registry, torch_device, use_model, use_align, inference_mode, _model_name_from_quality, _cuda_cleanup,
+)
+from app.services.batching import get_scheduler, vad_segments, decode_chunks, whisper_lock
+from app.services.diarization import DIARIZATION_MODEL, use_diarization_pipeline
+from app.services.align_prefetch import AlignPrefetch
+from app.services.batch_size import run_with_backoff, is_oom
+from app.services.checkpoints import checkpoints, make_key as make_checkpoint_key
+from app.services.segment_store import segment_store
+from app.services.silence import OffsetMap, trim_silence
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Pipeline stages (blocking, run on the inference executor)
+# ----------------------------
+def _log_gpu_mem(req_id: str, stage: str) -> None:
+    import torch
+    if torch.cuda.is_available():
+        mem = torch.cuda.memory_allocated() / 1024**2
+        logger.info("[%s] GPU Mem before %s: %.2f MB", req_id, stage, mem)
+
+def _load_audio(path: str):
+    import whisperx
+    return whisperx.load_audio(path)
+
+def _transcribe(req_id: str, quality: str, device: str, audio, language: Optional[str]) -> dict:
+    with inference_mode(), use_model(quality, device) as model:
+        _log_gpu_mem(req_id, "transcribe")
+
+        def _run(batch_size: int) -> dict:
+            transcribe_options = {"batch_size": batch_size}
+            if language:
+                transcribe_options["language"] = language
+            # transcribe() swaps the model's tokenizer and suppress_tokens for the call
+            with whisper_lock(model):
+                return model.transcribe(audio, **transcribe_options)
+
+        n_windows = len(audio) // (30 * SAMPLE_RATE) + 1
+        return run_with_backoff(_model_name_from_quality(quality), device, n_windows, _run)
+
+def _detect_language(req_id: str, quality: str, device: str, audio) -> str:
+    """Whisper language ID on the first 30s window, the same call transcribe() makes."""
+    with inference_mode(), use_model(quality, device) as model:
+        _log_gpu_mem(req_id, "language-id")
+        return model.detect_language(audio)
+
+def _prepare_batched(req_id: str, quality: str, device: str, audio, language: Optional[str]):
+    """VAD + language detection for the batched path; decoding happens in the scheduler."""
+    with inference_mode(), use_model(quality, device) as model:
+        _log_gpu_mem(req_id, "vad")
+        segments = vad_segments(model, audio)
+        if not language:
+            language = model.detect_language(audio)
+        return segments, language
+
+async def _decode(quality: str, device: str, audio, segments: List[dict], language: str) -> List[dict]:
+    """Decode VAD chunks, through the shared batch scheduler when enabled."""
+    model_name = _model_name_from_quality(quality)
+    if DYNAMIC_BATCHING:
+        texts = await get_scheduler(model_name, device).decode(audio, segments, language)
+    else:
+        chunks = [audio[int(seg["start"] * SAMPLE_RATE):int(seg["end"] * SAMPLE_RATE)] for seg in segments]
+        async with gpu_slot(device):
+            texts = await run_inference(decode_chunks, model_name, device, language, chunks, device=device)
+    return [
+        {"text": text, "start": round(seg["start"], 3), "end": round(seg["end"], 3)}
+        for seg, text in zip(segments, texts)
+    ]
+
+async def _transcribe_batched(req_id: str, quality: str, device: str, audio, language: Optional[str]) -> dict:
+    async with gpu_slot(device):
+        segments, language = await run_inference(
+            _prepare_batched, req_id, quality, device, audio, language, device=device
+        )
+    return {"segments": await _decode(quality, device, audio, segments, language), "language": language}
+
+def _align(req_id: str, device: str, segments: list, audio, language: str) -> dict:
+    """
+    whisperx.align has no batch dimension (one segment per forward pass), so an OOM
+    here comes from memory held elsewhere: free the cache and retry once.
+    """
+    import whisperx
+    with inference_mode(), use_align(language, device) as (model_a, metadata):
+        _log_gpu_mem(req_id, "align")
+        for attempt in range(2):
+            try:
+                return whisperx.align(
+                    segments,
+                    model_a,
+                    metadata,
+                    audio,
+                    torch_device(device),
+                    return_char_alignments=False,
+                )
+            except Exception as e:
+                if attempt or not ADAPTIVE_BATCH_SIZE or not is_oom(e):
+                    raise
+                logger.warning("[%s] OOM during align; retrying after cache cleanup", req_id)
+                _cuda_cleanup()
+
+def _diarize(req_id: str, device: str, audio):
+    """Speaker turns from the raw audio; independent of the transcript."""
+    with inference_mode(), use_diarization_pipeline(device) as diarize_model:
+        _log_gpu_mem(req_id, "diarize")
+        return diarize_model(audio)
+
+def _assign_speakers(diarize_segments, aligned: dict) -> dict:
+    import whisperx
+    return whisperx.assign_word_speakers(diarize_segments, aligned)
+
+def _raw_segments(segments: List[dict]) -> List[dict]:
+    """Copies of Whisper's segments for the segment store (whisperx.align annotates its input)."""
+    return [{"text": seg["text"], "start": seg["start"], "end": seg["end"]} for seg in segments]
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+async def _decoded(source: Union[str, Any]):
+    """Samples from a pipe-ingested array, or ffmpeg-decoded from a temp file path."""
+    if isinstance(source, str):
+        return await tracing.to_thread(_load_audio, source)
+    return source
+
+def _pick_whisper_device(quality: str) -> str:
+    model_name = _model_name_from_quality(quality)
+    return pick_device(DEVICES, lambda d: registry.is_resident(("whisper", model_name, d)))
+
+def _pick_diar_device() -> str:
+    return pick_device(DIAR_DEVICES, lambda d: registry.is_resident(("diarize", DIARIZATION_MODEL, d)))
+
+async def _run_diarization(req_id: str, audio, metrics: RequestMetrics):
+    diar_device = _pick_diar_device()
+    logger.info("[%s] Diarizing device=%s", req_id, diar_device)
+    with metrics.stage("diarize"):
+        async with gpu_slot(diar_device):
+            diarize_segments = await run_inference(_diarize, req_id, diar_device, audio, device=diar_device)
+    logger.info("[%s] Diarization complete", req_id)
+    return diarize_segments
+
+def _start_diarization(req_id: str, audio, metrics: RequestMetrics) -> "asyncio.Task":
+    task = asyncio.create_task(_run_diarization(req_id, audio, metrics))
+    # If transcription fails first the task is never awaited; consume its outcome quietly
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+async def _identify_language(
+    req_id: str, quality: str, device: str, audio, language: Optional[str],
+    metrics: RequestMetrics, prefetch: AlignPrefetch,
+) -> Optional[str]:
+    """
+    Caller's language, or a language-ID pass when it lets the aligner prefetch; either way
+    the aligner starts loading now. Transcription is then given the language and skips its
+    own detection, so the pass moves work rather than adding it; it is timed as the
+    "language_id" stage. Without prefetch, None: transcription detects the language itself.
+    """
+    if not language and prefetch.active:
+        with metrics.stage("language_id"):
+            async with gpu_slot(device):
+                language = await run_inference(_detect_language, req_id, quality, device, audio, device=device)
+        logger.info("[%s] Language identified early: %s", req_id, language)
+    prefetch.start(language)
+    return language
+
+async def _single_pass(
+    req_id: str, quality: str, device: str, audio, language: Optional[str],
+    metrics: RequestMetrics, prefetch: AlignPrefetch,
+) -> Tuple[dict, List[dict]]:
+    """Transcribe the whole file, then align all segments at once; returns (aligned, raw segments)."""
+    language = await _identify_language(req_id, quality, device, audio, language, metrics, prefetch)
+    with metrics.stage("transcribe"):
+        if DYNAMIC_BATCHING:
+            result = await _transcribe_batched(req_id, quality, device, audio, language)
+        else:
+            async with gpu_slot(device):
+                result = await run_inference(_transcribe, req_id, quality, device, audio, language, device=device)
+    detected_language = result.get("language")
+    metrics.language = detected_language
+    logger.info("[%s] Transcription complete. Language detected: %s", req_id, detected_language)
+
+    raw = _raw_segments(result["segments"])
+    outcome = prefetch.finish(detected_language)
+    logger.info("[%s] Aligning detected_language=%s prefetch=%s", req_id, detected_language, outcome)
+    with metrics.stage("align"):
+        async with gpu_slot(device):
+            aligned = await run_inference(
+                _align, req_id, device, result["segments"], audio, detected_language, device=device
+            )
+    aligned["language"] = detected_language
+    return aligned, raw
+
+async def _vad_chunks(
+    req_id: str, quality: str, device: str, audio, language: Optional[str],
+    metrics: RequestMetrics, prefetch: AlignPrefetch,
+) -> Tuple[List[dict], str]:
+    """Language + VAD chunks for the windowed paths; decoding happens per window."""
+    language = await _identify_language(req_id, quality, device, audio, language, metrics, prefetch)
+    with metrics.stage("transcribe"):
+        async with gpu_slot(device):
+            segments, language = await run_inference(
+                _prepare_batched, req_id, quality, device, audio, language, device=device
+            )
+    metrics.language = language
+    if segments:
+        prefetch.finish(language)
+    return segments, language
+
+async def _aligned_windows(
+    req_id: str, quality: str, device: str, audio, segments: List[dict], language: str,
+    window_chunks: int, metrics: RequestMetrics, checkpoint_key: Optional[str] = None,
+) -> AsyncIterator[Tuple[List[dict], dict]]:
+    """
+    Decode + align window_chunks VAD chunks at a time, yielding (raw segments, whisperx.align
+    output) per window. whisperx.align treats segments independently, so windows match a
+    single-pass run. With checkpoint_key, each finished window is saved and reused by the next run.
+    """
+    for index, start in enumerate(range(0, len(segments), window_chunks)):
+        chunk_segments = segments[start:start + window_chunks]
+        bounds = [chunk_segments[0]["start"], chunk_segments[-1]["end"], len(chunk_segments)]
+        if checkpoint_key:
+            saved = await asyncio.to_thread(checkpoints.load, checkpoint_key, index, bounds)
+            if saved is not None:
+                CHECKPOINT_WINDOWS.labels("resumed").inc()
+                yield saved
+                continue
+        with metrics.stage("transcribe"):
+            window = await _decode(quality, device, audio, chunk_segments, language)
+        raw = _raw_segments(window)
+        with metrics.stage("align"):
+            async with gpu_slot(device):
+                aligned = await run_inference(_align, req_id, device, window, audio, language, device=device)
+        if checkpoint_key:
+            CHECKPOINT_WINDOWS.labels("computed").inc()
+            await asyncio.to_thread(checkpoints.save, checkpoint_key, index, bounds, raw, aligned)
+        yield raw, aligned
+
+async def _trimmed(req_id: str, audio, metrics: RequestMetrics) -> Tuple[Any, Optional[OffsetMap]]:
+    """Speech-only audio for the inference stages, plus the map back to original time."""
+    if not TRIM_SILENCE:
+        return audio, None
+    with metrics.stage("trim"):
+        trimmed, offsets = await tracing.to_thread(trim_silence, audio)
+    if offsets is not None:
+        metrics.record_trim(offsets.skipped_seconds, len(trimmed) / SAMPLE_RATE)
+        logger.info("[%s] Trimmed %.1fs of silence (%.0f%% of %.1fs)", req_id, offsets.skipped_seconds,
+                    100.0 * offsets.skipped_seconds / (len(audio) / SAMPLE_RATE), len(audio) / SAMPLE_RATE)
+    return trimmed, offsets
+
+async def _checkpointed(
+    req_id: str, quality: str, device: str, audio, language: Optional[str],
+    metrics: RequestMetrics, prefetch: AlignPrefetch, checkpoint_key: str,
+) -> Tuple[dict, List[dict]]:
+    """Windowed transcribe + align, resuming from saved windows; (merged in chunk order, raw segments)."""
+    segments, language = await _vad_chunks(req_id, quality, device, audio, language, metrics, prefetch)
+    logger.info("[%s] Checkpointed run: %d chunks, windows of %d, language=%s",
+                req_id, len(segments), CHECKPOINT_WINDOW_CHUNKS, language)
+    merged: dict = {"segments": [], "word_segments": []}
+    raw: List[dict] = []
+    async for window_raw, aligned in _aligned_windows(
+        req_id, quality, device, audio, segments, language, CHECKPOINT_WINDOW_CHUNKS, metrics, checkpoint_key
+    ):
+        raw.extend(window_raw)
+        merged["segments"].extend(aligned.get("segments", []))
+        merged["word_segments"].extend(aligned.get("word_segments", []))
+    merged["language"] = language
+    return merged, raw
+
+async def run_pipeline(
+    req_id: str,
+    source: Union[str, Any],
+    quality: str,
+    language: Optional[str],
+    enable_diarization: bool,
+    duration: float,
+    metrics: Optional[RequestMetrics] = None,
+    content_sha256: Optional[str] = None,
+) -> dict:
+    """
+    Decode -> transcribe -> align, each stage awaited on the inference executor under a
+    GPU slot, with diarization (if enabled) running alongside from the decoded audio and
+    joined at the end. Cancellation (timeout) takes effect at the next stage boundary and
+    also cancels diarization.
+    Transcribe and align share one device; diarization picks its own from DIAR_DEVICES.
+    The alignment model is prefetched as soon as the language is known.
+    Long silences are trimmed after decode (TRIM_SILENCE); every stage runs on the
+    trimmed audio and timestamps are mapped back to original time before returning.
+    Audio of CHECKPOINT_MIN_SECONDS or more with a known content hash is processed in
+    checkpointed windows, so a retry after a timeout or crash only does the missing ones.
+    With a content hash, Whisper's raw segments go to the segment store for realign_pipeline.
+    Returns the aligned whisperx result with "language" attached.
+    """
+    metrics = metrics or RequestMetrics(quality)
+    device = _pick_whisper_device(quality)
+    prefetch = AlignPrefetch(device)
+    prefetch.start(language)
+    checkpoint_key = None
+    if content_sha256 and checkpoints.enabled and duration >= CHECKPOINT_MIN_SECONDS:
+        checkpoint_key = make_checkpoint_key(
+            content_sha256, _model_name_from_quality(quality), language, CHECKPOINT_WINDOW_CHUNKS
+        )
+
+    # Load audio (CPU)
+    logger.info("[%s] Loading audio...", req_id)
+    with metrics.stage("decode"):
+        audio: Any = await _decoded(source)
+    logger.info("[%s] Audio loaded, shape=%s", req_id, audio.shape if hasattr(audio, 'shape') else 'unknown')
+    audio, offsets = await _trimmed(req_id, audio, metrics)
+
+    # Diarization only needs the audio: start it now on its own device/slot
+    diarization = _start_diarization(req_id, audio, metrics) if enable_diarization else None
+    try:
+        # STEP 1 + 2: Transcribe, align
+        logger.info(
+            "[%s] Transcribing quality=%s language=%s duration=%.1fs device=%s",
+            req_id, quality, language or "auto", duration, device,
+        )
+        if checkpoint_key:
+            aligned, raw = await _checkpointed(req_id, quality, device, audio, language, metrics, prefetch, checkpoint_key)
+        else:
+            aligned, raw = await _single_pass(req_id, quality, device, audio, language, metrics, prefetch)
+        detected_language = aligned["language"]
+        logger.info("[%s] Alignment complete", req_id)
+
+        # STEP 3: Join speaker turns (optional)
+        if diarization is not None:
+            diarize_segments = await diarization
+            with tracing.span("assign_speakers"):
+                aligned = await tracing.to_thread(_assign_speakers, diarize_segments, aligned)
+            # Re-attach language if lost
+            aligned["language"] = detected_language
+    finally:
+        if diarization is not None and not diarization.done():
+            diarization.cancel()
+
+    if offsets is not None:
+        offsets.remap(aligned)
+        offsets.remap({"segments": raw})
+        logger.info("[%s] Silence trimming saved ~%.1fs of compute", req_id, metrics.compute_saved())
+    if content_sha256 and segment_store.enabled:
+        try:
+            await asyncio.to_thread(
+                segment_store.save, content_sha256, _model_name_from_quality(quality), raw, detected_language
+            )
+        except OSError as e:
+            logger.warning("[%s] Failed to store raw segments: %s", req_id, e)
+    if checkpoint_key:
+        await asyncio.to_thread(checkpoints.clear, checkpoint_key)
+    return aligned
+
+async def realign_pipeline(
+    req_id: str,
+    source: Union[str, Any],
+    stored: dict,
+    language: Optional[str],
+    enable_diarization: bool,
+    metrics: RequestMetrics,
+) -> dict:
+    """
+    Only the stages after transcribe, on raw segments from the segment store: align them
+    against the audio again (in language, else the stored one) and, if enabled, diarize
+    alongside and join speakers. Stored segments are in original time, so the audio is not
+    silence-trimmed; alignment only reads the segments' spans anyway.
+    Returns the aligned whisperx result with "language" attached.
+    """
+    language = language or stored["language"]
+    device = pick_device(DEVICES, lambda d: registry.is_resident(("align", language, d)))
+    logger.info("[%s] Loading audio...", req_id)
+    with metrics.stage("decode"):
+        audio: Any = await _decoded(source)
+
+    diarization = _start_diarization(req_id, audio, metrics) if enable_diarization else None
+    try:
+        logger.info("[%s] Re-aligning %d stored segments (model=%s) language=%s device=%s",
+                    req_id, len(stored["segments"]), stored["model"], language, device)
+        with metrics.stage("align"):
+            async with gpu_slot(device):
+                aligned = await run_inference(
+                    _align, req_id, device, stored["segments"], audio, language, device=device
+                )
+        if diarization is not None:
+            diarize_segments = await diarization
+            with tracing.span("assign_speakers"):
+                aligned = await tracing.to_thread(_assign_speakers, diarize_segments, aligned)
+    finally:
+        if diarization is not None and not diarization.done():
+            diarization.cancel()
+    aligned["language"] = language
+    metrics.language = language
+    return aligned
+
+async def stream_pipeline(
+    req_id: str,
+    source: Union[str, Any],
+    quality: str,
+    language: Optional[str],
+    duration: float,
+    metrics: Optional[RequestMetrics] = None,
+) -> AsyncIterator[Tuple[List[dict], str]]:
+    """
+    Like run_pipeline without diarization, but decodes and aligns STREAM_WINDOW_CHUNKS
+    VAD chunks at a time and yields (aligned_segments, language) per window, in
+    original time.
+    """
+    metrics = metrics or RequestMetrics(quality)
+    device = _pick_whisper_device(quality)
+    prefetch = AlignPrefetch(device)
+    prefetch.start(language)
+
+    logger.info("[%s] Loading audio...", req_id)
+    with metrics.stage("decode"):
+        audio: Any = await _decoded(source)
+    audio, offsets = await _trimmed(req_id, audio, metrics)
+
+    segments, language = await _vad_chunks(req_id, quality, device, audio, language, metrics, prefetch)
+    logger.info(
+        "[%s] Streaming %d chunks language=%s duration=%.1fs device=%s",
+        req_id, len(segments), language, duration, device,
+    )
+
+    async for _, aligned in _aligned_windows(
+        req_id, quality, device, audio, segments, language, STREAM_WINDOW_CHUNKS, metrics
+    ):
+        if offsets is not None:
+            offsets.remap(aligned)
+        yield aligned.get("segments", []), language
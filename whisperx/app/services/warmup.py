@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import List, Optional
+from app.core.config import (
+    DEFAULT_QUALITY, DEVICES, DIAR_DEVICES, ALIGN_WARMUP_LANGUAGES, ALLOW_DIARIZATION, HF_TOKEN,
+    WARMUP_QUALITIES, WARMUP_DIARIZATION, CALIBRATE_ON_BOOT,
+)
+from app.core.logging import get_logger
+from app.services.model_manager import get_model, get_align, registry
+from app.services.diarization import get_diarization_pipeline
+from app.services.process_pool import cpu_pool, POOL_DEVICE
+from app.services.calibration import calibrate
+
+logger = get_logger("whisperx-services")
+
+# ----------------------------
+# Startup warm-up (off the event loop)
+# ----------------------------
+# Importing torch + whisperx and loading models takes tens of seconds. The server starts
+# listening first and this runs in a background thread: /livez answers immediately,
+# /readyz once the Whisper models are loaded. Requests that arrive earlier still work,
+# they just wait for the model load like a cold cache miss. With CALIBRATE_ON_BOOT,
+# models/devices missing from the calibration profile are benchmarked first.
+
+class Warmup:
+    """One pass over the configured models; state is pending -> warming -> ready | failed."""
+
+    def __init__(self):
+        self.state = "pending"
+        self.errors: List[str] = []
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self, background: bool = True) -> None:
+        if self._thread is not None or self.state != "pending":
+            return
+        if not background:
+            self.run()
+            return
+        self._thread = threading.Thread(target=self.run, name="whisperx-warmup", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        self.state = "warming"
+        self.started_at = time.time()
+        t0 = time.perf_counter()
+        qualities = WARMUP_QUALITIES or [DEFAULT_QUALITY]
+        whisper_failed = False
+        if CALIBRATE_ON_BOOT:
+            # Before any Whisper model loads: the chosen compute type decides how it is built
+            self._load("Calibration", "of missing models/devices", calibrate)
+        # One copy per device in the pool; the pooled CPU device loads its models in its workers
+        for device in DEVICES:
+            if cpu_pool.serves(device):
+                continue
+            for quality in qualities:
+                whisper_failed |= not self._load("Whisper", f"quality={quality} device={device}",
+                                                 get_model, quality, device)
+            for language in ALIGN_WARMUP_LANGUAGES:
+                self._load("Align", f"language={language} device={device}", get_align, language, device)
+        warm_diarization = ALLOW_DIARIZATION and HF_TOKEN and WARMUP_DIARIZATION
+        if warm_diarization:
+            for device in DIAR_DEVICES:
+                if not cpu_pool.serves(device):
+                    self._load("Diarization", f"device={device}", get_diarization_pipeline, device)
+        if cpu_pool.serves(POOL_DEVICE):
+            # The pooled device's models live in the workers (started by app startup)
+            for quality in qualities:
+                cpu_pool.warm(get_model, quality, POOL_DEVICE)
+            for language in ALIGN_WARMUP_LANGUAGES:
+                cpu_pool.warm(get_align, language, POOL_DEVICE)
+            if warm_diarization and POOL_DEVICE in DIAR_DEVICES:
+                cpu_pool.warm(get_diarization_pipeline, POOL_DEVICE)
+        self.seconds = time.perf_counter() - t0
+        self.state = "failed" if whisper_failed else "ready"
+        logger.info("Warm-up %s in %.1fs", self.state, self.seconds)
+
+    def _load(self, what: str, detail: str, fn, *args) -> bool:
+        try:
+            fn(*args)
+            return True
+        except Exception as e:
+            logger.warning("%s warm-up failed %s: %s", what, detail, e)
+            self.errors.append(f"{what} {detail}: {e}")
+            return False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "seconds": round(self.seconds, 2) if self.seconds is not None else None,
+            "errors": self.errors,
+            "models": [
+                {"kind": m["kind"], "name": m["name"], "device": m["device"]}
+                for m in registry.snapshot()["models"]
+            ],
+            "cpu_pool": cpu_pool.stats(),
+        }
+
+warmup = Warmup()
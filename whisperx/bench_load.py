@@ -0,0 +1,511 @@
+"""
+Offline load test: the real FastAPI app with deterministic stand-in models, on a CPU box.
+
+    python bench_load.py --requests 40 --concurrency 4 --durations 30,120 --formats wav,mp3 \\
+        --output results.json [--compare baseline.json]
+
+Generates synthetic speech-like audio (bursts of modulated noise with pauses) in each
+duration x format (ffmpeg encodes anything but wav), then installs fakes for
+whisperx.load_model, load_align_model/align and DiarizationPipeline (plus the VAD merge
+and tokenizer they rely on) before the app is imported. Fakes spend a configurable cost
+per audio second, sleeping by default (like GPU/CTranslate2 calls, which release the GIL)
+or running numpy matmuls with --busy. The app is served by uvicorn on localhost and
+driven by --concurrency closed-loop clients.
+
+Reports throughput, latency percentiles, per-stage seconds from /metrics, peak RSS
+(server process + children) and peak temp disk use, and writes them as JSON.
+Every upload is unique (per-request seed) and the disk result cache is off, so runs
+measure the pipeline rather than cache hits.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+_VOCAB = "okay so the next item on the agenda is budget for the quarter we need to review numbers".split()
+
+# ----------------------------
+# Synthetic audio
+# ----------------------------
+def synth_speech(seconds: float, seed: int, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Bursts of 4 Hz-modulated band noise (1.5-6s) separated by pauses (0.3-3s), int16."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    audio = (rng.standard_normal(n) * 30).astype(np.float32)  # room noise floor
+    t = 0.0
+    while t < seconds:
+        burst = rng.uniform(1.5, 6.0)
+        start, end = int(t * sample_rate), min(n, int((t + burst) * sample_rate))
+        if end > start:
+            k = np.arange(end - start) / sample_rate
+            envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3.0, 5.0) * k) ** 2
+            noise = np.convolve(rng.standard_normal(end - start), np.ones(8) / 8, mode="same")
+            audio[start:end] += (noise * envelope * rng.uniform(2000, 6000)).astype(np.float32)
+        t += burst + rng.uniform(0.3, 3.0)
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+def write_audio(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+    """WAV directly; other extensions through ffmpeg (codec picked from the extension)."""
+    wav_path = path if path.endswith(".wav") else path + ".wav"
+    with wave.open(wav_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    if wav_path != path:
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", wav_path, path], check=True)
+        os.remove(wav_path)
+    return path
+
+# ----------------------------
+# Stand-in models
+# ----------------------------
+class Costs:
+    """Seconds of model work per second of audio (at batch size 1), and load behaviour."""
+
+    def __init__(self, args):
+        self.transcribe = args.transcribe_rtf
+        self.align = args.align_rtf
+        self.diarize = args.diarize_rtf
+        self.vad = args.vad_rtf
+        self.batch_efficiency = args.batch_efficiency
+        self.load_seconds = args.load_seconds
+        self.model_bytes = int(args.model_mb * 1024 * 1024)
+        self.busy = args.busy
+        self.language = args.language
+
+    def work(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        if not self.busy:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        a = np.ones((128, 128), dtype=np.float32)
+        while time.perf_counter() < deadline:
+            a = a @ a * 1e-3  # BLAS releases the GIL, like real inference kernels
+
+    def batch(self, audio_seconds: float, batch_size: int) -> float:
+        """A batch of n costs n^-efficiency of running its items one by one."""
+        return self.transcribe * audio_seconds * max(1, batch_size) ** -self.batch_efficiency
+
+    def weights(self) -> np.ndarray:
+        """Resident, touched memory standing in for model weights."""
+        time.sleep(self.load_seconds)
+        return np.ones(self.model_bytes // 4 or 1, dtype=np.float32)
+
+def _words_for(seconds: float, seed: int) -> str:
+    """Deterministic text at ~2.5 words per second."""
+    rng = random.Random(seed)
+    return " " + " ".join(rng.choice(_VOCAB) for _ in range(max(1, int(seconds * 2.5))))
+
+class FakeVad:
+    def __init__(self, costs: Costs):
+        self.costs = costs
+
+    def __call__(self, inputs: dict) -> List[Tuple[float, float]]:
+        """Speech regions from 100 ms frame energy (what fake_merge_chunks consumes)."""
+        waveform = inputs["waveform"].numpy()[0]
+        sr = inputs["sample_rate"]
+        self.costs.work(self.costs.vad * len(waveform) / sr)
+        frame = sr // 10
+        n = len(waveform) // frame
+        if n == 0:
+            return []
+        rms = np.sqrt(np.mean(waveform[:n * frame].reshape(n, frame) ** 2, axis=1))
+        voiced = rms > max(1e-4, 0.1 * float(np.percentile(rms, 95)))
+        regions, start = [], None
+        for i, v in enumerate(voiced):
+            if v and start is None:
+                start = i
+            elif not v and start is not None:
+                regions.append((start / 10, i / 10))
+                start = None
+        if start is not None:
+            regions.append((start / 10, n / 10))
+        return regions
+
+def fake_merge_chunks(segments, chunk_size, onset: float = 0.5, offset: Optional[float] = None) -> List[dict]:
+    """whisperx.vad.merge_chunks over FakeVad regions: chunks of at most chunk_size seconds."""
+    merged: List[dict] = []
+    for start, end in segments:
+        pieces = []
+        while end - start > chunk_size:  # overlong regions are cut, like Binarize(max_duration)
+            pieces.append((start, start + chunk_size))
+            start += chunk_size
+        pieces.append((start, end))
+        for s, e in pieces:
+            if merged and e - merged[-1]["start"] <= chunk_size:
+                merged[-1]["end"] = e
+                merged[-1]["segments"].append((s, e))
+            else:
+                merged.append({"start": s, "end": e, "segments": [(s, e)]})
+    return merged
+
+class FakeTokenizer:
+    def __init__(self, hf_tokenizer, multilingual: bool, task: Optional[str] = None, language: Optional[str] = None):
+        self.task = task
+        self.language_code = language
+
+class FakeWhisperPipeline:
+    """The parts of whisperx's FasterWhisperPipeline the service uses."""
+
+    def __init__(self, name: str, costs: Costs):
+        self.name = name
+        self.costs = costs
+        self._weights = costs.weights()
+        self._vad_params = {"vad_onset": 0.5, "vad_offset": 0.363}
+        self.vad_model = FakeVad(costs)
+        self.tokenizer = None
+        self.model = SimpleNamespace(hf_tokenizer=None, model=SimpleNamespace(is_multilingual=True))
+
+    def detect_language(self, audio) -> str:
+        self.costs.work(self.costs.transcribe * min(30.0, len(audio) / SAMPLE_RATE) * 0.1)
+        return self.costs.language
+
+    def transcribe(self, audio, batch_size: Optional[int] = None, language: Optional[str] = None, **kwargs) -> dict:
+        regions = fake_merge_chunks(self.vad_model({"waveform": _Tensor(audio), "sample_rate": SAMPLE_RATE}), 30)
+        batch_size = batch_size or 1
+        segments = []
+        for i in range(0, len(regions), batch_size):
+            batch = regions[i:i + batch_size]
+            self.costs.work(self.costs.batch(sum(r["end"] - r["start"] for r in batch), len(batch)))
+            segments += [{"start": r["start"], "end": r["end"], "text": _words_for(r["end"] - r["start"], int(r["start"] * 1000))}
+                         for r in batch]
+        return {"segments": segments, "language": language or self.costs.language}
+
+    def __call__(self, inputs, batch_size: int = 1, num_workers: int = 0):
+        """Decode {"inputs": chunk} items in batches, yielding {"text": ...} per chunk."""
+        pending = []
+        for item in inputs:
+            pending.append(item["inputs"])
+            if len(pending) == batch_size:
+                yield from self._decode(pending)
+                pending = []
+        if pending:
+            yield from self._decode(pending)
+
+    def _decode(self, chunks: list):
+        seconds = [len(c) / SAMPLE_RATE for c in chunks]
+        self.costs.work(self.costs.batch(sum(seconds), len(chunks)))
+        for c, s in zip(chunks, seconds):
+            yield {"text": _words_for(s, int(np.abs(c[:160]).sum() * 1000))}
+
+class _Tensor:
+    """Minimal torch-like wrapper for the fake VAD input."""
+
+    def __init__(self, array):
+        self._array = np.asarray(array)
+
+    def numpy(self):
+        return self._array[None, :]
+
+def fake_align(transcript, model, align_model_metadata, audio, device, interpolate_method="nearest",
+               return_char_alignments=False, print_progress=False, combined_progress=False) -> dict:
+    """Words spread evenly over each segment, at align cost per segment second."""
+    costs = model.costs
+    segments, word_segments = [], []
+    for seg in transcript:
+        start, end = float(seg["start"]), float(seg["end"])
+        costs.work(costs.align * (end - start))
+        tokens = seg["text"].split() or [""]
+        step = (end - start) / len(tokens)
+        words = [{"word": w, "start": round(start + i * step, 3), "end": round(start + (i + 0.8) * step, 3),
+                  "score": 0.9} for i, w in enumerate(tokens)]
+        segments.append({"start": start, "end": end, "text": seg["text"], "words": words})
+        word_segments += words
+    return {"segments": segments, "word_segments": word_segments}
+
+class FakeAligner:
+    def __init__(self, costs: Costs):
+        self.costs = costs
+        self._weights = costs.weights()
+
+class FakeDiarizationPipeline:
+    costs: Costs = None  # set by install_fakes
+
+    def __init__(self, model_name=None, use_auth_token=None, device="cpu"):
+        self._weights = self.costs.weights()
+
+    def __call__(self, audio, num_speakers=None, min_speakers=None, max_speakers=None):
+        import pandas as pd
+        seconds = len(audio) / SAMPLE_RATE
+        self.costs.work(self.costs.diarize * seconds)
+        turns = np.arange(0.0, seconds, 7.0)
+        return pd.DataFrame({
+            "start": turns, "end": np.minimum(turns + 7.0, seconds),
+            "speaker": [f"SPEAKER_0{i % 2}" for i in range(len(turns))],
+        })
+
+def install_fakes(costs: Costs) -> None:
+    """Patch whisperx (and its tokenizer/VAD helpers) before any app module imports them."""
+    import whisperx
+    import whisperx.diarize
+    import whisperx.vad
+    import faster_whisper.tokenizer
+
+    whisperx.load_model = lambda name, device, *args, **kwargs: FakeWhisperPipeline(name, costs)
+    whisperx.load_align_model = lambda language_code, device, *args, **kwargs: (
+        FakeAligner(costs), {"language": language_code, "dictionary": {}, "type": "fake"})
+    whisperx.align = fake_align
+    FakeDiarizationPipeline.costs = costs
+    whisperx.DiarizationPipeline = whisperx.diarize.DiarizationPipeline = FakeDiarizationPipeline
+    whisperx.vad.merge_chunks = fake_merge_chunks
+    faster_whisper.tokenizer.Tokenizer = FakeTokenizer
+
+# ----------------------------
+# Sampling: RSS and temp disk
+# ----------------------------
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _children(pid: int) -> List[int]:
+    found = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                found += [int(c) for c in f.read().split()]
+    except OSError:
+        pass
+    return found
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+class Sampler(threading.Thread):
+    """Peak RSS of this process + its children (CPU pool) and peak bytes under temp_dir."""
+
+    def __init__(self, temp_dir: str, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.temp_dir = temp_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_temp = 0
+        self._stop = threading.Event()
+
+    def run(self) -> None:
+        pid = os.getpid()
+        while not self._stop.wait(self.interval):
+            rss = _rss_bytes(pid) + sum(_rss_bytes(c) for c in _children(pid))
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_temp = max(self.peak_temp, _tree_size(self.temp_dir))
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.join()
+
+# ----------------------------
+# Load generation and report
+# ----------------------------
+_STAGE_LINE = re.compile(r'^whisperx_stage_seconds_(sum|count)\{([^}]*)\}\s+([0-9.eE+-]+)$')
+
+def scrape_stages(base_url: str) -> Dict[str, Dict[str, float]]:
+    """{stage: {"sum": seconds, "count": n}} summed over quality/language labels."""
+    import requests
+    stages: Dict[str, Dict[str, float]] = {}
+    for line in requests.get(base_url + "/metrics", timeout=10).text.splitlines():
+        match = _STAGE_LINE.match(line)
+        if match:
+            kind, labels, value = match.groups()
+            stage = re.search(r'stage="([^"]*)"', labels).group(1)
+            stages.setdefault(stage, {"sum": 0.0, "count": 0.0})[kind] += float(value)
+    return stages
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+def make_workload(args, input_dir: str) -> List[dict]:
+    rng = random.Random(args.seed)
+    durations = [float(d) for d in args.durations.split(",")]
+    formats = [f.strip().lstrip(".") for f in args.formats.split(",")]
+    specs = []
+    for i in range(args.warmup + args.requests):
+        duration, fmt = rng.choice(durations), rng.choice(formats)
+        path = write_audio(os.path.join(input_dir, f"req{i:05d}.{fmt}"), synth_speech(duration, args.seed * 100003 + i))
+        specs.append({"path": path, "duration": duration, "format": fmt,
+                      "diarize": rng.random() < args.diarize_fraction, "warmup": i < args.warmup})
+    return specs
+
+def send(base_url: str, endpoint: str, spec: dict, quality: str) -> dict:
+    import requests
+    data = {"quality": quality}
+    if endpoint == "transcribe" and spec["diarize"]:
+        data["enable_diarization"] = "true"
+    url = base_url + ("/transcribe" if endpoint == "transcribe" else "/transcribe/stream")
+    t = time.perf_counter()
+    with open(spec["path"], "rb") as f:
+        resp = requests.post(url, files={"file": (os.path.basename(spec["path"]), f)}, data=data, timeout=3600)
+    status = resp.status_code
+    if endpoint == "stream" and status == 200:
+        last = json.loads(resp.text.strip().splitlines()[-1])
+        if last.get("type") == "error":  # failures after the stream started
+            status = last["status"]
+    return {"latency": time.perf_counter() - t, "status": status, "bytes": len(resp.content)}
+
+def run(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="whisperx-bench-")
+    input_dir = os.path.join(work_dir, "inputs")
+    app_tmp = os.path.join(work_dir, "tmp")
+    os.makedirs(input_dir)
+    os.makedirs(app_tmp)
+
+    # Environment for the app, set before it is imported
+    os.environ["TMPDIR"] = app_tmp
+    tempfile.tempdir = app_tmp
+    os.environ.setdefault("RESULT_CACHE_MAX_MB", "0")
+    os.environ.setdefault("HF_TOKEN", "offline-benchmark")
+    os.environ.setdefault("JOB_WORKERS", "0")
+    os.environ.setdefault("DEVICE", "cpu")
+
+    print(f"Generating {args.warmup + args.requests} inputs in {input_dir} ...", file=sys.stderr)
+    specs = make_workload(args, input_dir)
+
+    install_fakes(Costs(args))
+    import uvicorn
+    from app.main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+
+    for spec in (s for s in specs if s["warmup"]):
+        send(base_url, args.endpoint, spec, args.quality)
+    measured = [s for s in specs if not s["warmup"]]
+    before = scrape_stages(base_url)
+    sampler = Sampler(app_tmp)
+    sampler.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda spec: send(base_url, args.endpoint, spec, args.quality), measured))
+    wall = time.perf_counter() - t0
+    sampler.stop()
+    after = scrape_stages(base_url)
+    server.should_exit = True
+
+    ok = [r for r, s in zip(results, measured) if r["status"] == 200]
+    latencies = [r["latency"] for r in ok]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    stages = {}
+    for stage, totals in after.items():
+        seconds = totals["sum"] - before.get(stage, {}).get("sum", 0.0)
+        if seconds > 0:
+            stages[stage] = {"seconds": round(seconds, 3), "per_request": round(seconds / max(1, len(ok)), 4)}
+    audio_seconds = sum(s["duration"] for r, s in zip(results, measured) if r["status"] == 200)
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "requests": len(measured),
+        "statuses": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3),
+        "audio_seconds_per_second": round(audio_seconds / wall, 2),
+        "latency_seconds": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies, default=0.0), 3),
+        },
+        "stages": stages,
+        "peak_rss_mb": round(sampler.peak_rss / 1024**2, 1),
+        "peak_temp_mb": round(sampler.peak_temp / 1024**2, 1),
+    }
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+def _flatten(report: dict) -> Dict[str, float]:
+    flat = {
+        "throughput_rps": report["throughput_rps"],
+        "audio_seconds_per_second": report["audio_seconds_per_second"],
+        "peak_rss_mb": report["peak_rss_mb"],
+        "peak_temp_mb": report["peak_temp_mb"],
+    }
+    flat.update({f"latency_{k}": v for k, v in report["latency_seconds"].items()})
+    flat.update({f"stage_{k}_per_request": v["per_request"] for k, v in report["stages"].items()})
+    return flat
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    print(f"requests={report['requests']} statuses={report['statuses']} wall={report['wall_seconds']}s")
+    current = _flatten(report)
+    previous = _flatten(baseline) if baseline else {}
+    print(f"{'metric':<36} {'value':>12}" + (f" {'baseline':>12} {'change':>8}" if baseline else ""))
+    for name, value in current.items():
+        line = f"{name:<36} {value:>12}"
+        if name in previous:
+            old = previous[name]
+            change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+            line += f" {old:>12} {change:>8}"
+        print(line)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4, help="closed-loop clients")
+    parser.add_argument("--warmup", type=int, default=2, help="requests sent first and not measured")
+    parser.add_argument("--durations", default="30,120", help="audio seconds, comma-separated")
+    parser.add_argument("--formats", default="wav", help="file extensions, e.g. wav,mp3,flac,ogg,m4a")
+    parser.add_argument("--endpoint", choices=("transcribe", "stream"), default="transcribe")
+    parser.add_argument("--quality", default="balanced")
+    parser.add_argument("--diarize-fraction", type=float, default=0.0, help="share of /transcribe calls with diarization")
+    parser.add_argument("--language", default="en", help="what the fake language ID returns")
+    parser.add_argument("--transcribe-rtf", type=float, default=0.02, help="decode seconds per audio second (batch 1)")
+    parser.add_argument("--batch-efficiency", type=float, default=0.5, help="batch of n costs n^-e of n singles")
+    parser.add_argument("--vad-rtf", type=float, default=0.002)
+    parser.add_argument("--align-rtf", type=float, default=0.01)
+    parser.add_argument("--diarize-rtf", type=float, default=0.02)
+    parser.add_argument("--load-seconds", type=float, default=0.5, help="per fake model load")
+    parser.add_argument("--model-mb", type=float, default=64, help="resident memory per fake model")
+    parser.add_argument("--busy", action="store_true", help="burn CPU (numpy) instead of sleeping")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--compare", help="earlier JSON report to print changes against")
+    parser.add_argument("--keep", action="store_true", help="keep generated inputs and app temp dir")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
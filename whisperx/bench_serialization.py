@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of /transcribe response building and encoding on a synthetic transcript.
+
+    python bench_serialization.py --segments 10000 --words-per-segment 12
+
+Compares the previous path (one pydantic SegmentResponse per segment, jsonable_encoder,
+then FastAPI validating response_model and JSON-encoding again) with the plain-dict
+builder in JSON (orjson if installed), the columnar layout, and MessagePack, each with
+and without word timestamps. Prints best-of-N time per format and encoded size.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas import SegmentResponse, TranscriptionResponse
+from app.services.responses import build_response
+from app.services.serialization import MSGPACK_MEDIA, JSON_MEDIA, encode, orjson, msgpack, shape
+
+_VOCAB = "the a meeting agenda budget quarter we should follow up next week review numbers team".split()
+
+def make_aligned(n_segments: int, words_per_segment: int, seed: int) -> dict:
+    """whisperx-shaped aligned result: segments with words (numpy-free, like after JSON)."""
+    rng = random.Random(seed)
+    t = 0.0
+    segments = []
+    for i in range(n_segments):
+        words = []
+        for _ in range(words_per_segment):
+            start = t + rng.uniform(0.0, 0.1)
+            t = start + rng.uniform(0.1, 0.5)
+            words.append({"word": rng.choice(_VOCAB), "start": start, "end": t, "score": rng.random(),
+                          "speaker": f"SPEAKER_0{i % 3}"})
+        segments.append({
+            "start": words[0]["start"], "end": words[-1]["end"], "speaker": f"SPEAKER_0{i % 3}",
+            "text": " " + " ".join(w["word"] for w in words), "words": words,
+        })
+    return {"segments": segments, "language": "en"}
+
+def _legacy(aligned: dict, enable_diarization: bool) -> bytes:
+    """The pre-change path, including the response_model round trip FastAPI did."""
+    segments, parts = [], []
+    for seg in aligned["segments"]:
+        segment = SegmentResponse(
+            text=(seg.get("text") or "").strip(),
+            startSeconds=float(seg.get("start") or 0.0),
+            endSeconds=float(seg.get("end") or 0.0),
+            speaker=seg.get("speaker") if enable_diarization else None,
+        )
+        if segment.text:
+            parts.append(segment.text)
+        segments.append(segment)
+    payload = jsonable_encoder(TranscriptionResponse(
+        fullTranscript=" ".join(parts), detectedLanguage=aligned["language"], segments=segments, chapters=[],
+    ))
+    validated = TranscriptionResponse(**payload)  # response_model validation
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+def _best(fn: Callable[[], bytes], repeat: int) -> Tuple[float, int]:
+    best, size = float("inf"), 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        size = len(fn())
+        best = min(best, time.perf_counter() - t)
+    return best, size
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segments", type=int, default=10000)
+    parser.add_argument("--words-per-segment", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    aligned = make_aligned(args.segments, args.words_per_segment, args.seed)
+    cases: List[Tuple[str, Callable[[], bytes]]] = [
+        ("legacy pydantic", lambda: _legacy(aligned, True)),
+    ]
+    for words in (False, True):
+        suffix = " +words" if words else ""
+        cases.append((f"json{suffix}", lambda w=words: encode(
+            shape(build_response(aligned, True), words=w), JSON_MEDIA).body))
+        cases.append((f"columnar json{suffix}", lambda w=words: encode(
+            shape(build_response(aligned, True), words=w, layout="columnar"), JSON_MEDIA).body))
+        if msgpack is not None:
+            cases.append((f"msgpack{suffix}", lambda w=words: encode(
+                shape(build_response(aligned, True), words=w), MSGPACK_MEDIA).body))
+            cases.append((f"columnar msgpack{suffix}", lambda w=words: encode(
+                shape(build_response(aligned, True), words=w, layout="columnar"), MSGPACK_MEDIA).body))
+
+    print(f"{args.segments} segments x {args.words_per_segment} words; json encoder: "
+          f"{'orjson' if orjson is not None else 'stdlib'}; msgpack: {'yes' if msgpack is not None else 'not installed'}")
+    baseline = None
+    print(f"{'format':<26} {'ms':>9} {'x faster':>9} {'bytes':>12}")
+    for name, fn in cases:
+        seconds, size = _best(fn, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:<26} {seconds * 1000:>9.1f} {baseline / seconds:>9.1f} {size:>12,}")
+
+if __name__ == "__main__":
+    main()
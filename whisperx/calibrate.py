@@ -0,0 +1,71 @@
+"""
+Benchmark Whisper compute types and batch sizes on this machine and save the fastest
+setting that fits in memory and passes the quality guard to the calibration profile,
+which the server reads on model load (COMPUTE_TYPE / BATCH_SIZE set explicitly still win).
+
+    python calibrate.py [--models small,medium] [--devices cuda:0] [--force]
+        [--profile /data/whisperx-calibration.json] [--audio speech.wav] [--seconds 20]
+        [--batch-sizes 1,2,4,8,16] [--max-wer 0.1]
+
+Without --audio a synthetic clip is used, which only checks that settings agree with
+each other; pass a short real speech recording for a meaningful quality check.
+Run it while the server is stopped (or on a spare device): it loads every candidate.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", help="comma-separated Whisper models (default: every model in MODEL_MAP)")
+    parser.add_argument("--devices", help="comma-separated devices (default: DEVICES)")
+    parser.add_argument("--force", action="store_true", help="recalibrate entries already in the profile")
+    parser.add_argument("--profile", help="profile path (default: CALIBRATION_PROFILE)")
+    parser.add_argument("--audio", help="speech clip for the quality guard (default: synthetic)")
+    parser.add_argument("--seconds", type=float, help="clip length (default: CALIBRATION_SECONDS)")
+    parser.add_argument("--batch-sizes", help="comma-separated batch sizes (default: CALIBRATION_BATCH_SIZES)")
+    parser.add_argument("--max-wer", type=float, help="quality guard threshold (default: CALIBRATION_MAX_WER)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    # Settings are read from the environment when the app modules are imported
+    for option, name in [("profile", "CALIBRATION_PROFILE"), ("audio", "CALIBRATION_AUDIO"),
+                         ("seconds", "CALIBRATION_SECONDS"), ("batch_sizes", "CALIBRATION_BATCH_SIZES"),
+                         ("max_wer", "CALIBRATION_MAX_WER")]:
+        if getattr(args, option) is not None:
+            os.environ[name] = str(getattr(args, option))
+    from app.core.config import CALIBRATION_PROFILE
+    from app.services.calibration import calibrate
+
+    if not CALIBRATION_PROFILE:
+        logger.error("CALIBRATION_PROFILE is empty; nowhere to save the results.")
+        sys.exit(1)
+    results = calibrate(
+        models=args.models.split(",") if args.models else None,
+        devices=args.devices.split(",") if args.devices else None,
+        force=args.force,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for device, models in results.items():
+        for model_name, entry in models.items():
+            if entry is None:
+                print(f"{device:8} {model_name:10} no setting passed (defaults stay)")
+                continue
+            print(f"{device:8} {model_name:10} compute_type={entry['compute_type']:13} "
+                  f"batch_size={entry['batch_size']:<3} {entry['seconds_per_chunk']:.3f}s/chunk")
+            for c in entry.get("candidates", []):
+                timing = f"{c['seconds_per_chunk']:.3f}s/chunk wer={c['wer']:.3f}" if "seconds_per_chunk" in c else ""
+                print(f"{'':20} {c['compute_type']:13} batch_size={str(c['batch_size']):4} {c['status']:8} {timing}")
+    print(f"Saved to {CALIBRATION_PROFILE}")
+
+if __name__ == "__main__":
+    main()
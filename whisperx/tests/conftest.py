@@ -0,0 +1,217 @@
+"""
+Shared setup for the API tests. Config is read from the environment at import time,
+so everything writable points at a temp dir before app is imported, and Whisper is
+replaced by FakeWhisperX: no model is downloaded or loaded. The app itself is only
+imported by the fixtures that need it, so pure-logic tests stay light.
+"""
+import io
+import os
+import sys
+import time
+import wave
+import types
+import tempfile
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="whisperx-tests-")
+os.environ.update({
+    "DEVICE": "cpu",
+    "CPU_PROCESSES": "0",
+    "DYNAMIC_BATCHING": "false",
+    "TRIM_SILENCE": "false",
+    "INGEST_MODE": "pipe",
+    "JOB_WORKERS": "0",
+    "RESULT_CACHE_MAX_MB": "0",
+    "CHECKPOINT_DIR": "",
+    "SEGMENT_STORE_DIR": "",
+    "CALIBRATION_PROFILE": "",
+    "JOBS_DIR": os.path.join(_TMP, "jobs"),
+    "PROFILE_DIR": os.path.join(_TMP, "profiles"),
+    "RESULT_CACHE_DIR": os.path.join(_TMP, "result-cache"),
+})
+for _name in ("API_KEY", "ADMIN_API_KEY", "HF_TOKEN", "DEVICES", "COMPUTE_TYPE", "BATCH_SIZE"):
+    os.environ.pop(_name, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_RATE = 16000
+
+class _FakePipeline:
+    """Stands in for whisperx's FasterWhisperPipeline: one segment covering the clip."""
+
+    def __init__(self, fake: "FakeWhisperX"):
+        self.fake = fake
+
+    def transcribe(self, audio, batch_size=None, language=None, **kwargs):
+        time.sleep(self.fake.transcribe_delay)
+        return {
+            "segments": [{"text": " hello world", "start": 0.0, "end": round(len(audio) / SAMPLE_RATE, 3)}],
+            "language": language or "en",
+        }
+
+    def detect_language(self, audio):
+        return "en"
+
+class FakeWhisperX:
+    """The parts of the whisperx module the pipeline calls, with adjustable delays."""
+
+    def __init__(self):
+        self.load_delay = 0.0
+        self.transcribe_delay = 0.0
+        self.loading = threading.Event()  # set once load_model() has started
+        self.loads = 0
+
+    def load_model(self, name, device, **kwargs):
+        self.loads += 1
+        self.loading.set()
+        time.sleep(self.load_delay)
+        return _FakePipeline(self)
+
+    def load_align_model(self, language_code, device):
+        return object(), {"language": language_code}
+
+    def align(self, segments, model, metadata, audio, device, return_char_alignments=False):
+        aligned = []
+        for seg in segments:
+            words = seg["text"].split()
+            step = (seg["end"] - seg["start"]) / max(1, len(words))
+            aligned.append({**seg, "words": [
+                {"word": w, "start": round(seg["start"] + i * step, 3),
+                 "end": round(seg["start"] + (i + 1) * step, 3), "score": 0.9}
+                for i, w in enumerate(words)
+            ]})
+        return {"segments": aligned, "word_segments": [w for seg in aligned for w in seg["words"]]}
+
+    def module(self) -> types.ModuleType:
+        module = types.ModuleType("whisperx")
+        module.load_model = self.load_model
+        module.load_align_model = self.load_align_model
+        module.align = self.align
+        return module
+
+@pytest.fixture
+def fake_whisperx(monkeypatch) -> FakeWhisperX:
+    """Install FakeWhisperX as `whisperx` with an empty model cache."""
+    from app.services.model_manager import registry
+    fake = FakeWhisperX()
+    monkeypatch.setitem(sys.modules, "whisperx", fake.module())
+    monkeypatch.setattr(registry, "_entries", {})
+    monkeypatch.setattr(registry, "_known_sizes", {})
+    return fake
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient with startup/shutdown run, minus the model warm-up."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services import executor
+    from app.services.warmup import warmup
+    monkeypatch.setattr(warmup, "start", lambda background=True: None)
+    monkeypatch.setattr(executor, "_slots", {})  # semaphores bind to the loop they first wait on
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def make_wav():
+    """16 kHz mono int16 WAV bytes (decoded in-process, no ffmpeg); seed keeps uploads distinct."""
+    def _make(seconds: float = 1.0, seed: int = 0) -> bytes:
+        rng = np.random.default_rng(seed)
+        samples = (rng.normal(0, 0.1, int(seconds * SAMPLE_RATE)) * 32767).astype("<i2")
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(SAMPLE_RATE)
+            w.writeframes(samples.tobytes())
+        return buf.getvalue()
+    return _make
+
+# whisperx 3.1's FasterWhisperPipeline down to the decode: VAD, tokenizer and generate are
+# fakes, transcribe() and the per-chunk texts follow the real control flow.
+_Options = namedtuple("_Options", "suppress_tokens")
+
+class _Tokenizer:
+    """faster_whisper's Tokenizer, as far as decoding here reads it; ids below 10 are digits."""
+    eot = 20
+
+    def __init__(self, hf_tokenizer, multilingual, task, language):
+        self.task = task
+        self.language_code = language
+
+    def decode(self, ids):
+        return str(ids[0]) if ids[0] < 10 else f"<{ids[0]}>"
+
+def _find_numeral_symbol_tokens(tokenizer):
+    return [i for i in range(tokenizer.eot) if tokenizer.decode([i]).isdigit()]
+
+class _Generator:
+    """The CTranslate2 side: each text depends on the chunk, the language and the suppressed tokens."""
+    hf_tokenizer = None
+    model = types.SimpleNamespace(is_multilingual=True)
+
+    def generate_segment_batched(self, features, tokenizer, options):
+        return [f"{tokenizer.language_code}:{float(f[0]):.3f}:{len(options.suppress_tokens)}" for f in features]
+
+class _Pipeline:
+    """FasterWhisperPipeline with whisperx 3.1's transcribe(), including its in-place tokenizer swap."""
+
+    def __init__(self, vad: list):
+        self.model = _Generator()
+        self.tokenizer = None
+        self.preset_language = None
+        self.suppress_numerals = True
+        self.options = _Options(suppress_tokens=[-1])
+        self._vad = vad
+        self._vad_params = {"vad_onset": 0.5, "vad_offset": 0.363}
+
+    def vad_model(self, inputs):
+        return self._vad
+
+    def preprocess(self, inputs):
+        audio = inputs["inputs"]
+        return {"inputs": np.array([audio.mean(), len(audio)], dtype=np.float32)}
+
+    def detect_language(self, audio):
+        return "fr"
+
+    def transcribe(self, audio, batch_size=None, language=None, **kwargs):
+        import torch
+        segments = sys.modules["whisperx.vad"].merge_chunks(self._vad, 30, **{
+            "onset": self._vad_params["vad_onset"], "offset": self._vad_params["vad_offset"]})
+        language = language or self.detect_language(audio)
+        self.tokenizer = _Tokenizer(None, True, task="transcribe", language=language)
+        previous = self.options.suppress_tokens
+        suppress = list(set(_find_numeral_symbol_tokens(self.tokenizer) + previous))
+        self.options = self.options._replace(suppress_tokens=suppress)
+        chunks = [audio[int(s["start"] * SAMPLE_RATE):int(s["end"] * SAMPLE_RATE)] for s in segments]
+        texts = []
+        for i in range(0, len(chunks), batch_size or 1):
+            features = torch.stack([self.preprocess({"inputs": c})["inputs"] for c in chunks[i:i + (batch_size or 1)]])
+            texts += self.model.generate_segment_batched(features, self.tokenizer, self.options)
+        self.tokenizer = None
+        self.options = self.options._replace(suppress_tokens=previous)
+        return {"segments": [{"text": t, "start": round(s["start"], 3), "end": round(s["end"], 3)}
+                             for s, t in zip(segments, texts)], "language": language}
+
+@pytest.fixture
+def pipeline(fake_whisperx, monkeypatch):
+    """A _Pipeline served for every Whisper load, with the whisperx/faster_whisper modules decoding imports."""
+    pytest.importorskip("torch")
+    pipe = _Pipeline([{"start": 0.0, "end": 0.5}, {"start": 0.75, "end": 1.25}, {"start": 1.5, "end": 2.0},
+                      {"start": 2.25, "end": 3.0}, {"start": 3.25, "end": 3.875}])
+    monkeypatch.setattr(sys.modules["whisperx"], "load_model", lambda *a, **k: pipe)
+    for name, attrs in (
+        ("whisperx.asr", {"find_numeral_symbol_tokens": _find_numeral_symbol_tokens}),
+        ("whisperx.vad", {"merge_chunks": lambda segments, chunk_size, onset, offset: segments}),
+        ("faster_whisper", {}),
+        ("faster_whisper.tokenizer", {"Tokenizer": _Tokenizer}),
+    ):
+        monkeypatch.setitem(sys.modules, name, types.SimpleNamespace(**attrs))
+    from app.services import batching, executor
+    monkeypatch.setattr(batching, "_schedulers", {})
+    monkeypatch.setattr(executor, "_slots", {})
+    return pipe
@@ -0,0 +1,84 @@
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from app.services import audio
+from app.services.audio_headers import parse_header
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+SAMPLE_RATE = 16000
+
+def _signal() -> np.ndarray:
+    """2 s of noise and tone, plus the edge cases of float -> int16 conversion."""
+    rng = np.random.default_rng(7)
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    x = 0.4 * np.sin(2 * np.pi * 440 * t) + rng.normal(0, 0.1, len(t))
+    edges = np.array([
+        0.0, 1.0, -1.0, 1.5, -1.5,               # full scale and beyond (clipped)
+        0.5 / 32768, 1.5 / 32768, -2.5 / 32768,  # exact halves (round half to even)
+        32767.5 / 32768, -32768.5 / 32768,
+    ])
+    return np.concatenate([edges, x]).astype(np.float32)
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", *args], check=True)
+
+def _ffmpeg_load(path: str, *input_args: str) -> np.ndarray:
+    """whisperx.load_audio's ffmpeg command, with optional input options (raw .f32 has no header)."""
+    out = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", *input_args, "-i", path,
+         "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"],
+        capture_output=True, check=True,
+    ).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+@pytest.fixture(scope="module")
+def fixtures(tmp_path_factory):
+    """
+    The same signal as raw float32, int16 WAV, float32 WAV and 16-bit FLAC; stereo_* files
+    pair it with an independent second channel (odd L + R sums exercise the downmix rounding).
+    """
+    directory = tmp_path_factory.mktemp("audio")
+    raw = str(directory / "clip.f32")
+    _signal().tofile(raw)
+    left = _signal()
+    right = np.random.default_rng(8).permutation(left)
+    raw_stereo = str(directory / "stereo.f32")
+    np.stack([left, right], axis=1).tofile(raw_stereo)
+    paths = {"f32": raw}
+    for channels, source in ((1, raw), (2, raw_stereo)):
+        raw_input = ("-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", str(channels), "-i", source)
+        prefix = "" if channels == 1 else "stereo_"
+        for name, options in (
+            ("int16.wav", ["-c:a", "pcm_s16le"]),
+            ("float32.wav", ["-c:a", "pcm_f32le"]),
+            ("int16.flac", ["-c:a", "flac", "-sample_fmt", "s16"]),
+        ):
+            paths[prefix + name] = str(directory / (prefix + name))
+            _ffmpeg(*raw_input, *options, paths[prefix + name])
+    return paths
+
+@pytest.mark.parametrize("name", [
+    "int16.wav", "float32.wav", "int16.flac", "stereo_int16.wav", "stereo_float32.wav", "stereo_int16.flac",
+])
+def test_decode_pcm_matches_whisperx_load_audio(fixtures, name):
+    whisperx = pytest.importorskip("whisperx")
+    if name.endswith(".flac") and audio.soundfile is None:
+        pytest.skip("soundfile not installed")
+    data = bytearray(open(fixtures[name], "rb").read())
+    header = parse_header(bytes(data[:64 * 1024]), len(data))
+    assert header is not None and audio._fast_path_eligible(header)
+
+    fast = audio._decode_pcm(data, header)
+    expected = whisperx.load_audio(fixtures[name])
+    assert fast.dtype == expected.dtype == np.float32
+    np.testing.assert_array_equal(fast, expected)
+
+def test_decode_raw_float32_matches_ffmpeg(fixtures):
+    data = bytearray(open(fixtures["f32"], "rb").read())
+    fast = audio._decode_pcm(data, None)
+    expected = _ffmpeg_load(fixtures["f32"], "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1")
+    np.testing.assert_array_equal(fast, expected)
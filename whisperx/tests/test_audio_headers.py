@@ -0,0 +1,76 @@
+import shutil
+import subprocess
+
+import pytest
+
+from app.services.audio import _ESTIMATE_MARGIN
+from app.services.audio_headers import parse_header
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+SECONDS = 12.0
+HEAD = 64 * 1024  # what the upload pre-check reads at most
+
+# name -> ffmpeg output options for 12 s of stereo 44.1 kHz noise (keeps VBR codecs near their nominal bitrate)
+ENCODINGS = {
+    "clip.wav": ["-c:a", "pcm_s16le"],
+    "clip.flac": ["-c:a", "flac"],
+    "vbr.mp3": ["-c:a", "libmp3lame", "-q:a", "4"],             # Xing header, behind an ID3v2 tag
+    "cbr.mp3": ["-c:a", "libmp3lame", "-b:a", "128k", "-write_xing", "0"],
+    "faststart.m4a": ["-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart"],
+    "tail.m4a": ["-c:a", "aac", "-b:a", "96k"],                 # moov after mdat
+    "clip.ogg": ["-c:a", "libvorbis", "-b:a", "96k"],
+    "clip.opus": ["-c:a", "libopus", "-b:a", "64k"],
+}
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("headers")
+    paths = {}
+    for name, options in ENCODINGS.items():
+        paths[name] = str(directory / name)
+        subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-f", "lavfi",
+             "-i", f"anoisesrc=sample_rate=44100:amplitude=0.1:duration={SECONDS}", "-ac", "2",
+             *options, paths[name]],
+            check=True,
+        )
+    return paths
+
+def _parse(files, name):
+    with open(files[name], "rb") as f:
+        data = f.read()
+    return parse_header(data[:HEAD], len(data))
+
+@pytest.mark.parametrize("name, container", [("clip.wav", "wav"), ("clip.flac", "flac")])
+def test_lossless_headers_count_samples(files, name, container):
+    header = _parse(files, name)
+    assert (header.container, header.sample_rate, header.channels) == (container, 44100, 2)
+    assert header.total_samples == SECONDS * 44100 and not header.estimated
+
+def test_mp3_frame_count_from_xing_header(files):
+    header = _parse(files, "vbr.mp3")
+    assert (header.container, header.sample_rate, header.channels) == ("mp3", 44100, 2)
+    assert not header.estimated and SECONDS <= header.duration < SECONDS + 0.1  # encoder delay/padding
+
+def test_cbr_mp3_without_xing_is_estimated(files):
+    header = _parse(files, "cbr.mp3")
+    assert header.estimated and header.duration == pytest.approx(SECONDS, rel=0.02)
+
+def test_mp4_duration_needs_moov_first(files):
+    header = _parse(files, "faststart.m4a")
+    assert header.container == "mp4" and header.duration == pytest.approx(SECONDS, abs=0.1)
+    header = _parse(files, "tail.m4a")
+    assert header.container == "mp4" and header.duration is None
+
+def test_ogg_identification_packets(files):
+    vorbis = _parse(files, "clip.ogg")
+    assert (vorbis.container, vorbis.sample_rate, vorbis.channels) == ("ogg", 44100, 2)
+    # Nominal bitrate: rough, but must not overshoot by more than the pre-check's margin
+    assert vorbis.estimated and SECONDS / 2 < vorbis.duration < SECONDS * _ESTIMATE_MARGIN
+    opus = _parse(files, "clip.opus")
+    assert (opus.container, opus.sample_rate, opus.channels, opus.duration) == ("ogg", 48000, 2, None)
+
+@pytest.mark.parametrize("head", [b"", b"RIFF", b"not audio at all" * 100, b"ID3\x04\x00\x00\x00\x00\x00\x10" + b"\x00" * 32])
+def test_unrecognised_or_truncated_heads(head):
+    assert parse_header(head, len(head)) is None
@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import batching, transcription
+
+SAMPLE_RATE = 16000
+
+def _audio(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, 0.1, 4 * SAMPLE_RATE).astype(np.float32)
+
+@pytest.mark.parametrize("dynamic", [False, True])
+@pytest.mark.parametrize("language", ["de", None])
+def test_batched_matches_transcribe(pipeline, monkeypatch, dynamic, language):
+    monkeypatch.setattr(transcription, "DYNAMIC_BATCHING", dynamic)
+    audio = _audio(1)
+    expected = pipeline.transcribe(audio, batch_size=2, language=language)
+    result = asyncio.run(transcription._transcribe_batched("req", "fast", "cpu", audio, language))
+    assert result == expected
+    # Decoding built its own tokenizer/options; the shared model is as transcribe() leaves it
+    assert pipeline.tokenizer is None and pipeline.options.suppress_tokens == [-1]
+
+def test_concurrent_languages_keep_their_own_tokens(pipeline, monkeypatch):
+    monkeypatch.setattr(transcription, "DYNAMIC_BATCHING", True)
+    audios = {"de": _audio(2), "en": _audio(3), "es": _audio(4)}
+    expected = {lang: pipeline.transcribe(a, batch_size=2, language=lang) for lang, a in audios.items()}
+
+    async def _all():
+        return await asyncio.gather(*(
+            transcription._transcribe_batched(f"req-{lang}", "fast", "cpu", a, lang) for lang, a in audios.items()
+        ))
+    assert dict(zip(audios, asyncio.run(_all()))) == expected
+
+def test_scheduler_scatters_each_requests_chunks_in_order(monkeypatch):
+    calls = []
+
+    def fake_decode(model_name, device, language, chunks):
+        calls.append((language, len(chunks)))
+        return [f"{language}:{int(c[0])}" for c in chunks]
+
+    monkeypatch.setattr(batching, "decode_chunks", fake_decode)
+    monkeypatch.setattr(batching, "BATCH_WAIT_MS", 200.0)
+    # Chunk i of request r is one second of the value 10 * r + i
+    requests = [("en", 3), ("de", 2), ("en", 4), ("en", 1)]
+    audio = {r: np.repeat(np.arange(10 * r, 10 * r + n, dtype=np.float32), SAMPLE_RATE) for r, (_, n) in enumerate(requests)}
+    segments = {r: [{"start": float(i), "end": float(i + 1)} for i in range(n)] for r, (_, n) in enumerate(requests)}
+
+    async def _all():
+        scheduler = batching.BatchScheduler("tiny", "cpu")
+        return await asyncio.gather(*(
+            scheduler.decode(audio[r], segments[r], language) for r, (language, _) in enumerate(requests)
+        ))
+    results = asyncio.run(_all())
+
+    for r, (language, n) in enumerate(requests):
+        assert results[r] == [f"{language}:{10 * r + i}" for i in range(n)]
+    # One shared decode per language
+    assert sorted(calls) == [("de", 2), ("en", 8)]
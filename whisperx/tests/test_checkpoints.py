@@ -0,0 +1,65 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import transcription
+from app.services.checkpoints import CheckpointStore
+
+SAMPLE_RATE = 16000
+SHA = "ab" * 32
+
+@pytest.fixture
+def windowed(pipeline, monkeypatch, tmp_path):
+    """Checkpoints in tmp_path for anything over 2 s, 2 VAD chunks per window; records decoded windows."""
+    monkeypatch.setattr(transcription, "checkpoints", CheckpointStore(str(tmp_path), 3600))
+    monkeypatch.setattr(transcription, "CHECKPOINT_MIN_SECONDS", 2.0)
+    monkeypatch.setattr(transcription, "CHECKPOINT_WINDOW_CHUNKS", 2)
+    decoded = []
+    decode_chunks = transcription.decode_chunks
+
+    def recording(model_name, device, language, chunks):
+        decoded.append(len(chunks))
+        return decode_chunks(model_name, device, language, chunks)
+
+    monkeypatch.setattr(transcription, "decode_chunks", recording)
+    return decoded
+
+def _run(audio, content_sha256=None, language="en") -> dict:
+    return asyncio.run(transcription.run_pipeline(
+        "req", audio, "fast", language, False, len(audio) / SAMPLE_RATE, content_sha256=content_sha256,
+    ))
+
+def _audio() -> np.ndarray:
+    return np.random.default_rng(5).normal(0, 0.1, 4 * SAMPLE_RATE).astype(np.float32)
+
+@pytest.mark.parametrize("language", ["en", None])
+def test_checkpointed_run_matches_single_pass(windowed, language):
+    audio = _audio()
+    single = _run(audio, language=language)
+    assert windowed == []  # no content hash: one transcribe() call
+    checkpointed = _run(audio, SHA, language=language)
+    assert windowed == [2, 2, 1]
+    assert checkpointed == single
+    starts = [seg["start"] for seg in checkpointed["segments"]]
+    assert starts == sorted(starts) and len(starts) == 5
+
+def test_resume_recomputes_only_missing_windows(windowed, monkeypatch):
+    audio = _audio()
+    single = _run(audio)
+    decode_chunks = transcription.decode_chunks
+
+    def fail_third(*args):
+        if len(windowed) == 2:
+            raise RuntimeError("worker lost")
+        return decode_chunks(*args)
+
+    monkeypatch.setattr(transcription, "decode_chunks", fail_third)
+    with pytest.raises(RuntimeError):
+        _run(audio, SHA)
+    assert windowed == [2, 2]
+
+    monkeypatch.setattr(transcription, "decode_chunks", decode_chunks)
+    windowed.clear()
+    assert _run(audio, SHA) == single
+    assert windowed == [1]  # windows 0 and 1 came from their checkpoints
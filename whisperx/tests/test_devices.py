@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.core.config import MAX_CONCURRENT, _parse_devices
+from app.core.metrics import RequestMetrics
+from app.services import executor, transcription
+from app.services.model_manager import registry
+
+# Three simulated CPU devices ("cpu" repeated would be one device: entries are keyed by name)
+DEVICES = ["cpu:0", "cpu:1", "cpu:2"]
+
+@pytest.fixture
+def load(monkeypatch):
+    """DEVICES=cpu:0,cpu:1,cpu:2 with one slot each; load(in_use, waiting) sets each device's held + waiting stages."""
+    monkeypatch.setattr(executor, "DEVICE_SLOTS", _parse_devices("cpu:0=1,cpu:1=1,cpu:2=1"))
+    monkeypatch.setattr(executor, "_slots", {})
+    monkeypatch.setattr(executor, "_in_use", {})
+    monkeypatch.setattr(executor, "_waiting", {})
+    monkeypatch.setattr(transcription, "DEVICES", DEVICES)
+
+    def set_load(in_use: dict, waiting: dict = None):
+        executor._in_use.update(in_use)
+        executor._waiting.update(waiting or {})
+    return set_load
+
+def test_parse_devices_keeps_repeated_cpu_entries_apart():
+    assert _parse_devices("cpu:0,cpu:1=2, cpu:2") == {"cpu:0": MAX_CONCURRENT, "cpu:1": 2,
+                                                       "cpu:2": MAX_CONCURRENT}
+    assert list(_parse_devices("cpu,cpu,cpu")) == ["cpu"]
+
+def test_prefers_the_device_holding_the_model_within_one_slot(load):
+    assert executor.pick_device(DEVICES, lambda d: d == "cpu:2") == "cpu:2"
+    load({"cpu:2": 1})
+    # Busier than the idle devices by a full slot: the least loaded wins
+    assert executor.pick_device(DEVICES, lambda d: d == "cpu:2") == "cpu:0"
+
+def test_partial_slot_backlog_keeps_the_warm_device(load, monkeypatch):
+    monkeypatch.setitem(executor.DEVICE_SLOTS, "cpu:2", 2)
+    load({"cpu:2": 1})  # half of its slots
+    assert executor.pick_device(DEVICES, lambda d: d == "cpu:2") == "cpu:2"
+
+def test_without_a_warm_device_picks_the_least_loaded(load):
+    load({"cpu:0": 1, "cpu:2": 1}, {"cpu:0": 2})
+    assert executor.pick_device(DEVICES, lambda d: False) == "cpu:1"
+    assert executor.load_snapshot()["cpu:0"] == {"slots": 1, "in_use": 1, "waiting": 2}
+
+def test_whisper_follows_the_resident_model(load, monkeypatch):
+    model_name = transcription._model_name_from_quality("fast")
+    monkeypatch.setattr(registry, "is_resident", lambda key: key == ("whisper", model_name, "cpu:1"))
+    assert transcription._pick_whisper_device("fast") == "cpu:1"
+    assert transcription._pick_whisper_device("accurate") == "cpu:0"
+
+def test_diarization_runs_on_diar_devices(load, monkeypatch):
+    monkeypatch.setattr(transcription, "DIAR_DEVICES", ["cpu:1", "cpu:2"])
+    monkeypatch.setattr(registry, "is_resident", lambda key: key[0] == "diarize" and key[2] == "cpu:2")
+    ran_on = []
+    monkeypatch.setattr(transcription, "_diarize", lambda req_id, device, audio: ran_on.append(device) or "turns")
+    result = asyncio.run(transcription._run_diarization("req", None, RequestMetrics("fast")))
+    assert result == "turns" and ran_on == ["cpu:2"]
+
+    load({"cpu:2": 1})
+    asyncio.run(transcription._run_diarization("req", None, RequestMetrics("fast")))
+    assert ran_on == ["cpu:2", "cpu:1"]  # never DEVICES' idle cpu:0
@@ -0,0 +1,28 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Generous for shared CI runners; a blocked event loop would take the full load delay
+HEALTH_BUDGET_SECONDS = 0.25
+LOAD_DELAY_SECONDS = 2.0
+
+def test_health_answers_while_a_transcription_runs(client, fake_whisperx, make_wav):
+    fake_whisperx.load_delay = LOAD_DELAY_SECONDS
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(
+            client.post, "/transcribe",
+            files={"file": ("clip.wav", make_wav(seed=1), "audio/wav")},
+            data={"language": "en", "quality": "fast"},
+        )
+        assert fake_whisperx.loading.wait(timeout=10), "model load never started"
+
+        for _ in range(5):
+            t0 = time.perf_counter()
+            resp = client.get("/health")
+            elapsed = time.perf_counter() - t0
+            assert resp.status_code == 200
+            assert elapsed < HEALTH_BUDGET_SECONDS, f"/health took {elapsed * 1000:.0f} ms during a job"
+        assert not pending.done(), "the job finished before /health was checked"
+
+        result = pending.result(timeout=30)
+    assert result.status_code == 200
+    assert result.json()["fullTranscript"].strip() == "hello world"
@@ -0,0 +1,49 @@
+from prometheus_client.parser import text_string_to_metric_families
+
+def _samples(client) -> dict:
+    """{(sample name, sorted label items): value} from GET /metrics."""
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    return {
+        (s.name, tuple(sorted(s.labels.items()))): s.value
+        for family in text_string_to_metric_families(resp.text)
+        for s in family.samples
+    }
+
+def _count(samples: dict, name: str, **labels) -> float:
+    wanted = set(labels.items())
+    return sum(v for (n, items), v in samples.items() if n == name and wanted <= set(items))
+
+def test_pipeline_run_shows_up_in_metrics(client, fake_whisperx, make_wav):
+    before = _samples(client)
+    resp = client.post(
+        "/transcribe",
+        files={"file": ("clip.wav", make_wav(seed=2), "audio/wav")},
+        data={"language": "en", "quality": "fast"},
+    )
+    assert resp.status_code == 200
+    after = _samples(client)
+
+    for stage in ("decode", "transcribe", "align"):
+        name, labels = "whisperx_stage_seconds_count", {"stage": stage, "quality": "fast", "language": "en"}
+        assert _count(after, name, **labels) == _count(before, name, **labels) + 1, stage
+    assert ("whisperx_gpu_slot_waiters", (("device", "cpu"),)) in after
+    assert _count(after, "whisperx_model_cache_misses_total", kind="whisper") >= 1
+    assert _count(after, "whisperx_request_seconds_count", quality="fast", status="ok") >= 1
+
+def _language_id_runs(client, make_wav, seed: int) -> float:
+    before = _samples(client)
+    resp = client.post("/transcribe", files={"file": ("clip.wav", make_wav(seed=seed), "audio/wav")},
+                       data={"quality": "fast"})
+    assert resp.status_code == 200
+    after, name = _samples(client), "whisperx_stage_seconds_count"
+    # Detected either way: early, or by transcribe itself
+    assert _count(after, name, stage="transcribe", language="en") == _count(before, name, stage="transcribe", language="en") + 1
+    return _count(after, name, stage="language_id") - _count(before, name, stage="language_id")
+
+def test_early_language_id_only_runs_for_prefetch(client, fake_whisperx, make_wav, monkeypatch):
+    from app.services import align_prefetch
+    monkeypatch.setattr(align_prefetch, "ALIGN_PREFETCH", True)
+    assert _language_id_runs(client, make_wav, seed=3) == 1
+    monkeypatch.setattr(align_prefetch, "ALIGN_PREFETCH", False)
+    assert _language_id_runs(client, make_wav, seed=4) == 0
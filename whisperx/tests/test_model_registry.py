@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from app.services import model_manager
+from app.services.model_manager import ModelRegistry
+
+MB = 1024 * 1024
+
+@pytest.fixture
+def registry(monkeypatch) -> ModelRegistry:
+    """A fresh registry on "cpu" with a 100 MB budget; device memory grows by what loaders allocate."""
+    used = {"bytes": 0}
+    monkeypatch.setattr(model_manager, "_used_bytes", lambda device: used["bytes"])
+    monkeypatch.setattr(model_manager, "_budget_bytes", lambda device: 100 * MB)
+    registry = ModelRegistry()
+    registry.allocate = lambda size_mb: used.__setitem__("bytes", used["bytes"] + size_mb * MB)
+    return registry
+
+def _key(name: str, kind: str = "whisper"):
+    return (kind, name, "cpu")
+
+def _load(registry, name: str, size_mb: int, idle: float = 0.0, load_seconds: float = 1.0,
+          kind: str = "whisper", pinned: bool = False):
+    """Load a model of size_mb, then age it: idle seconds since last use, load_seconds to reload."""
+    key = _key(name, kind)
+    registry.acquire(key, lambda: registry.allocate(size_mb) or name)
+    if not pinned:
+        registry.release(key)
+    entry = registry._entries[key]
+    entry.last_used = time.monotonic() - idle
+    entry.load_seconds = load_seconds
+
+def _resident(registry):
+    return sorted(k[1] for k in registry._entries)
+
+def test_idlest_model_goes_first(registry):
+    _load(registry, "a", 40, idle=60)
+    _load(registry, "b", 40, idle=5)
+    _load(registry, "c", 40)
+    assert _resident(registry) == ["b", "c"] and registry.evictions == 1
+
+def test_larger_model_goes_first_when_equally_idle(registry):
+    _load(registry, "small", 20, idle=30)
+    _load(registry, "large", 50, idle=30)
+    _load(registry, "c", 40)
+    assert _resident(registry) == ["c", "small"]
+
+def test_expensive_to_reload_model_stays(registry):
+    _load(registry, "slow", 40, idle=30, load_seconds=60)
+    _load(registry, "quick", 40, idle=30, load_seconds=1)
+    _load(registry, "c", 40)
+    assert _resident(registry) == ["c", "slow"]
+
+def test_pinned_models_are_never_evicted(registry):
+    _load(registry, "pinned", 40, idle=600, pinned=True)
+    _load(registry, "b", 40, idle=5)
+    _load(registry, "c", 40)
+    assert _resident(registry) == ["c", "pinned"]
+
+    # Everything pinned: over budget is tolerated rather than pulling a model from a running stage
+    registry.acquire(_key("c"), lambda: None)
+    _load(registry, "d", 40, pinned=True)
+    assert _resident(registry) == ["c", "d", "pinned"]
+    registry.release(_key("pinned"))
+    _load(registry, "e", 10)
+    assert "pinned" not in _resident(registry)
+
+def test_known_size_makes_room_before_loading(registry):
+    _load(registry, "a", 60, idle=60)
+    registry._entries.pop(_key("a"))  # as if evicted earlier; its size is remembered
+    _load(registry, "b", 50, idle=30)
+    seen = []
+    registry.acquire(_key("a"), lambda: seen.append(_resident(registry)) or registry.allocate(60))
+    assert seen == [[]]  # b was gone before a's load started
+    assert _resident(registry) == ["a"]
+
+def test_align_models_are_capped_by_count(registry, monkeypatch):
+    monkeypatch.setattr(model_manager, "ALIGN_CACHE_MAX", 2)
+    _load(registry, "align-0", 1, idle=30, kind="align")
+    _load(registry, "align-1", 1, idle=60, kind="align")
+    _load(registry, "whisper", 1, idle=600)
+    _load(registry, "align-2", 1, kind="align")
+    # Well under budget: only the idlest aligner goes, not the idler Whisper model
+    assert _resident(registry) == ["align-0", "align-2", "whisper"]
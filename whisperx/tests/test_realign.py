@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import responses, transcription
+from app.services.segment_store import SegmentStore
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """A segment store in tmp_path; counts transcribe passes in calls["transcribe"]."""
+    segments = SegmentStore(str(tmp_path), 3600)
+    monkeypatch.setattr(responses, "segment_store", segments)
+    monkeypatch.setattr(transcription, "segment_store", segments)
+    calls = {"transcribe": 0, "align": []}
+    transcribe, align = transcription._transcribe, transcription._align
+
+    def counting_transcribe(*args):
+        calls["transcribe"] += 1
+        return transcribe(*args)
+
+    def recording_align(req_id, device, segs, audio, language):
+        calls["align"].append(language)
+        return align(req_id, device, segs, audio, language)
+
+    monkeypatch.setattr(transcription, "_transcribe", counting_transcribe)
+    monkeypatch.setattr(transcription, "_align", recording_align)
+    return calls
+
+def _post(client, path, wav, **data):
+    return client.post(path, files={"file": ("clip.wav", wav, "audio/wav")}, data=data)
+
+@pytest.mark.parametrize("path", ["/realign", "/rediarize"])
+def test_unknown_audio_is_404(client, fake_whisperx, make_wav, store, path):
+    resp = _post(client, path, make_wav(seed=20))
+    assert resp.status_code == 404
+    assert store == {"transcribe": 0, "align": []}
+
+def test_realign_reuses_stored_segments(client, fake_whisperx, make_wav, store):
+    wav = make_wav(seconds=2.0, seed=21)
+    first = _post(client, "/transcribe", wav, language="en", quality="fast")
+    assert first.status_code == 200 and store["transcribe"] == 1
+
+    resp = _post(client, "/realign", wav, language="de", words="true")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert store["transcribe"] == 1 and store["align"] == ["en", "de"]
+    assert body["detectedLanguage"] == "de"
+    assert [(s["text"], s["startSeconds"], s["endSeconds"]) for s in body["segments"]] == \
+        [(s["text"], s["startSeconds"], s["endSeconds"]) for s in first.json()["segments"]]
+    assert [w["word"] for w in body["segments"][0]["words"]] == ["hello", "world"]
+
+    # A different model's segments were never stored
+    assert _post(client, "/realign", wav, quality="accurate").status_code == 404
+
+def test_rediarize_adds_speakers_without_transcribing(client, fake_whisperx, make_wav, store, monkeypatch):
+    monkeypatch.setattr(transcription, "_diarize", lambda req_id, device, audio: "turns")
+
+    def assign(turns, aligned):
+        for seg in aligned["segments"]:
+            seg["speaker"] = "SPEAKER_01"
+        return aligned
+    monkeypatch.setattr(transcription, "_assign_speakers", assign)
+
+    wav = make_wav(seconds=2.0, seed=22)
+    assert _post(client, "/transcribe", wav, language="en", quality="fast").status_code == 200
+    resp = _post(client, "/rediarize", wav)
+    assert resp.status_code == 200
+    assert store["transcribe"] == 1 and store["align"] == ["en", "en"]
+    assert [s["speaker"] for s in resp.json()["segments"]] == ["SPEAKER_01"]
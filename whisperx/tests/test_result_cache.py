@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.result_cache import ResultCache
+
+KEY = "k" * 64
+
+@pytest.fixture
+def cache(tmp_path) -> ResultCache:
+    return ResultCache(str(tmp_path), 1024 * 1024, 3600)
+
+def _compute(calls: list, name: str, delay: float = 0.05, error: Exception = None):
+    """compute() for get_or_compute: records name in calls, then returns {"by": name} or raises error."""
+    async def compute() -> dict:
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return {"by": name}
+    return compute
+
+def test_concurrent_requests_share_one_computation(cache):
+    calls = []
+
+    async def _all():
+        return await asyncio.gather(*(cache.get_or_compute(KEY, _compute(calls, f"r{i}")) for i in range(5)))
+    assert asyncio.run(_all()) == [{"by": "r0"}] * 5
+    assert calls == ["r0"] and cache.coalesced == 4
+
+    # Later requests read the stored payload
+    assert asyncio.run(cache.get_or_compute(KEY, _compute(calls, "late"))) == {"by": "r0"}
+    assert calls == ["r0"] and cache.stats()["hits"] == 1
+
+async def _leader_and_follower(cache, leader, follower, follower_timeout=None):
+    first = asyncio.ensure_future(cache.get_or_compute(KEY, leader))
+    await asyncio.sleep(0.01)  # the leader registers before the follower arrives
+    second = asyncio.ensure_future(cache.get_or_compute(KEY, follower, timeout=follower_timeout))
+    return await asyncio.gather(first, second, return_exceptions=True)
+
+def test_follower_takes_over_after_the_leaders_429(cache):
+    calls = []
+    busy = HTTPException(status_code=429, detail="Server busy")
+    first, second = asyncio.run(_leader_and_follower(cache, _compute(calls, "leader", error=busy),
+                                                     _compute(calls, "follower")))
+    assert first is busy and second == {"by": "follower"}
+    assert calls == ["leader", "follower"]
+
+def test_follower_takes_over_after_the_leaders_timeout(cache):
+    calls = []
+
+    async def leader() -> dict:
+        calls.append("leader")
+        return await asyncio.wait_for(asyncio.sleep(1.0), timeout=0.05)
+    first, second = asyncio.run(_leader_and_follower(cache, leader, _compute(calls, "follower"), follower_timeout=5.0))
+    assert isinstance(first, asyncio.TimeoutError) and second == {"by": "follower"}
+    assert calls == ["leader", "follower"]
+
+def test_follower_takes_over_when_the_leader_is_cancelled(cache):
+    calls = []
+
+    async def _run():
+        leader = asyncio.ensure_future(cache.get_or_compute(KEY, _compute(calls, "leader", delay=1.0)))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get_or_compute(KEY, _compute(calls, "follower")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+    assert asyncio.run(_run()) == {"by": "follower"}
+    assert calls == ["leader", "follower"]
+
+def test_follower_gives_up_on_its_own_budget_only(cache):
+    calls = []
+    first, second = asyncio.run(_leader_and_follower(cache, _compute(calls, "leader", delay=0.2),
+                                                     _compute(calls, "follower"), follower_timeout=0.05))
+    assert first == {"by": "leader"} and isinstance(second, asyncio.TimeoutError)
+    assert calls == ["leader"]
+
+def test_other_failures_are_shared_not_retried(cache):
+    calls = []
+    broken = RuntimeError("decoder crashed")
+    first, second = asyncio.run(_leader_and_follower(cache, _compute(calls, "leader", error=broken),
+                                                     _compute(calls, "follower")))
+    assert first is broken and second is broken
+    assert calls == ["leader"] and cache.stats()["entries"] == 0
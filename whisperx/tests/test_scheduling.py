@@ -0,0 +1,21 @@
+from app.services.scheduling import POLICIES, make_trace, simulate
+
+# Fixed inputs, independent of this machine's config: GPU-like tiers, equal wfq weights
+RTF = {"fast": 0.03, "balanced": 0.06, "accurate": 0.12}
+WEIGHTS = {"fast": 1.0, "balanced": 1.0, "accurate": 1.0}
+AGING = 0.05
+
+def test_sjf_beats_fifo_at_p95():
+    # 2000 jobs at 90% load, 10% long recordings; no 429s, so both policies run every job
+    trace = make_trace(n=2000, load=0.9, slots=1, long_fraction=0.1, seed=0, rtf=RTF)
+    sjf = simulate(trace, "sjf", slots=1, aging=AGING, timeout=0.0, weights=WEIGHTS)
+    fifo = simulate(trace, "fifo", slots=1, aging=AGING, timeout=0.0, weights=WEIGHTS)
+    assert sjf["done"] == fifo["done"] == 2000
+    assert sjf["p95"] < 0.5 * fifo["p95"], (sjf["p95"], fifo["p95"])
+    assert sjf["short_p95"] < fifo["short_p95"]
+
+def test_replay_leaves_the_trace_reusable():
+    trace = make_trace(n=200, load=0.9, slots=2, long_fraction=0.1, seed=3, rtf=RTF)
+    first = [simulate(trace, p, slots=2, aging=AGING, timeout=0.0, weights=WEIGHTS) for p in POLICIES]
+    again = [simulate(trace, p, slots=2, aging=AGING, timeout=0.0, weights=WEIGHTS) for p in POLICIES]
+    assert first == again
@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.services.silence import OffsetMap, trim_silence
+
+SAMPLE_RATE = 16000
+
+def _offsets() -> OffsetMap:
+    # Kept: original [1, 3) -> trimmed [0, 2), original [10, 13) -> [2, 5), original [20, ...) -> [5, ...)
+    return OffsetMap(trimmed_starts=[0.0, 2.0, 5.0], original_starts=[1.0, 10.0, 20.0], skipped_seconds=8.0)
+
+def test_to_original_shifts_by_span():
+    offsets = _offsets()
+    assert [offsets.to_original(t) for t in (0.0, 1.5, 2.0, 4.25, 5.0, 6.5)] == [1.0, 2.5, 10.0, 12.25, 20.0, 21.5]
+    # An end on a cut closes the span before it; a start there opens the next one
+    assert offsets.to_original(2.0, is_end=True) == 3.0
+    assert offsets.to_original(5.0, is_end=True) == 13.0
+
+def test_remap_moves_segments_and_words_once():
+    word = {"word": "hello", "start": 1.9, "end": 2.0}
+    unaligned = {"word": "42"}  # whisperx leaves numerals without times
+    result = {
+        "segments": [
+            {"start": 1.5, "end": 2.0, "words": [word, unaligned]},
+            {"start": 2.0, "end": 5.0, "words": [{"word": "world", "start": 4.5, "end": 5.0}]},
+        ],
+        "word_segments": [word, unaligned],  # the same dicts as in the segments
+    }
+    _offsets().remap(result)
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(2.5, 3.0), (10.0, 13.0)]
+    assert (word["start"], word["end"]) == (2.9, 3.0)
+    assert unaligned == {"word": "42"}
+    assert result["segments"][1]["words"][0] == {"word": "world", "start": 12.5, "end": 13.0}
+
+def test_trimmed_time_maps_back_to_the_same_sample():
+    rng = np.random.default_rng(11)
+    speech = lambda seconds: rng.normal(0, 0.1, int(seconds * SAMPLE_RATE))
+    silence = lambda seconds: np.zeros(int(seconds * SAMPLE_RATE))
+    audio = np.concatenate([silence(3.0), speech(2.0), silence(4.0), speech(1.5), silence(2.5), speech(1.0)])
+    audio = audio.astype(np.float32)
+
+    trimmed, offsets = trim_silence(audio)
+    assert offsets is not None and len(offsets.trimmed_starts) == 3
+    assert abs(offsets.skipped_seconds - (len(audio) - len(trimmed)) / SAMPLE_RATE) < 1e-9
+    assert 8.0 < offsets.skipped_seconds < 9.5  # the three silences, minus padding around speech
+
+    # Speech samples are unique, so each one's original position can be looked up
+    position = {value: index for index, value in enumerate(audio.tolist()) if value != 0.0}
+    checked = 0
+    for k in range(0, len(trimmed), 97):
+        if trimmed[k] == 0.0:
+            continue  # kept padding
+        original = offsets.to_original(k / SAMPLE_RATE) * SAMPLE_RATE
+        assert abs(original - position[float(trimmed[k])]) <= 0.0005 * SAMPLE_RATE  # ms rounding
+        checked += 1
+    assert checked > 400
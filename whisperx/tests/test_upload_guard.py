@@ -0,0 +1,110 @@
+import io
+import wave
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.api import upload_guard
+from app.api.upload_guard import UploadGuard
+from app.services import audio
+
+BOUNDARY = "guardtest"
+CHUNK = 8 * 1024
+
+def _wav(seconds: float) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(np.random.default_rng(0).integers(-3000, 3000, int(seconds * 16000), dtype="<i2").tobytes())
+    return buf.getvalue()
+
+def _multipart(data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"quality\"\r\n\r\nfast\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"clip.wav\"\r\n"
+        f"Content-Type: audio/wav\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+class _Inner:
+    """The wrapped app: reads the whole body, then answers 200."""
+
+    def __init__(self):
+        self.body = b""
+        self.messages = []
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            self.messages.append(message)
+            if message["type"] != "http.request":
+                return
+            self.body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+def _post(body: bytes, content_length: bool = True, content_type: str = None):
+    """(status, chunks the client got to send, inner app) for body POSTed in CHUNK-sized pieces."""
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)]
+    sent = 0
+    responses = []
+    inner = _Inner()
+
+    async def receive():
+        nonlocal sent
+        if sent == len(chunks):
+            return {"type": "http.disconnect"}
+        sent += 1
+        return {"type": "http.request", "body": chunks[sent - 1], "more_body": sent < len(chunks)}
+
+    async def send(message):
+        responses.append(message)
+
+    headers = [(b"content-type", (content_type or f"multipart/form-data; boundary={BOUNDARY}").encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    scope = {"type": "http", "method": "POST", "path": "/transcribe", "headers": headers}
+    asyncio.run(UploadGuard(inner)(scope, receive, send))
+    return responses[0]["status"], sent, inner
+
+@pytest.fixture(autouse=True)
+def precheck(monkeypatch):
+    monkeypatch.setattr(upload_guard, "UPLOAD_PRECHECK", True)
+
+def test_content_length_over_limit_is_rejected_before_reading(monkeypatch):
+    monkeypatch.setattr(upload_guard, "MAX_BYTES", 100 * 1024)
+    status, sent, inner = _post(_multipart(_wav(10.0)))
+    assert (status, sent, inner.messages) == (413, 0, [])
+
+def test_overlong_audio_is_rejected_in_the_first_chunks(monkeypatch):
+    monkeypatch.setattr(audio, "MAX_AUDIO_DURATION", 5.0)
+    body = _multipart(_wav(30.0))
+    status, sent, inner = _post(body)
+    assert status == 400 and inner.messages == []
+    assert sent <= 2 and len(body) // CHUNK > 100
+
+def test_oversized_body_without_content_length_is_cut_off(monkeypatch):
+    monkeypatch.setattr(upload_guard, "MAX_BYTES", 100 * 1024)
+    body = _multipart(_wav(20.0))
+    status, sent, inner = _post(body, content_length=False)
+    assert status == 413
+    assert sent * CHUNK <= 100 * 1024 + upload_guard._MULTIPART_OVERHEAD + CHUNK < len(body)
+    assert inner.messages[-1] == {"type": "http.disconnect"}
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_accepted_upload_is_replayed_unchanged(content_length):
+    body = _multipart(_wav(3.0))
+    status, sent, inner = _post(body, content_length=content_length)
+    assert status == 200 and inner.body == body
+    assert sent == len(inner.messages) == -(-len(body) // CHUNK)
+    assert [m["more_body"] for m in inner.messages] == [True] * (sent - 1) + [False]
+
+def test_other_requests_pass_through(monkeypatch):
+    monkeypatch.setattr(upload_guard, "MAX_BYTES", 1024)
+    body = b"x" * (64 * 1024)
+    status, _, inner = _post(body, content_type="application/octet-stream")
+    assert status == 200 and inner.body == body